@@ -0,0 +1,134 @@
+import asyncio
+from concurrent.futures import Executor
+from logging import getLogger
+from typing import Any, AsyncIterable, AsyncIterator, NamedTuple
+
+from dataformats.jsonschema.budget import ValidationBudget, ValidationBudgetExceeded
+from dataformats.jsonschema.mixins.validations_mixin import Draft4Validator, ValidationErrors
+
+logger = getLogger("async_pipeline")
+
+
+class ValidationResult(NamedTuple):
+    """The errors of an instance (empty when it is valid) and its position in the stream
+
+    When the validation hit its budget, the `ValidationBudgetExceeded` is reported as the error of the instance (like
+    `MessageRouter.validate_batch` does) and is also set as `exceeded`.
+    """
+
+    index: int
+    instance: Any
+    errors: ValidationErrors
+    exceeded: ValidationBudgetExceeded | None = None
+
+
+class ValidationStage:
+    """Pipeline stage validating the instances of an async stream on an executor, so the event loop is not blocked
+
+    At most `max_in_flight` instances are taken from the source that have not been yielded yet: the instances being
+    validated and, when results are yielded in order, the results waiting for an earlier one. While that many are
+    queued the source is not read, so a slow consumer or slow validations apply backpressure to the producer.
+
+    Usage:
+        async for result in ValidationStage(validator, max_in_flight=32).run(messages):
+            ...
+    """
+
+    def __init__(
+        self,
+        validator: Draft4Validator,
+        executor: Executor | None = None,
+        max_in_flight: int = 16,
+        ordered: bool = True,
+        budget: ValidationBudget | None = None,
+    ):
+        """
+        Args:
+            validator: The compiled schema to validate against
+            executor: Executor the validations run on, the default executor of the event loop when None. Process
+                pools need the validator to be picklable
+            max_in_flight: Maximum amount of instances taken from the source that have not been yielded yet
+            ordered: Yield the results in the order of the source, otherwise as soon as they are complete
+            budget: Limits on the work done per validation, see `Draft4Validator.validate`
+        """
+        if max_in_flight < 1:
+            raise ValueError(f"max_in_flight should be at least 1, not {max_in_flight}")
+        self.validator = validator
+        self.executor = executor
+        self.max_in_flight = max_in_flight
+        self.ordered = ordered
+        self.budget = budget
+        self._queued = 0
+        self._validating = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Instances taken from the source whose results have not been yielded yet"""
+        return self._queued
+
+    @property
+    def in_flight(self) -> int:
+        """Instances being validated"""
+        return self._validating
+
+    def _validate(self, index: int, instance: Any) -> ValidationResult:
+        try:
+            return ValidationResult(index, instance, self.validator.validate(instance, budget=self.budget))
+        except ValidationBudgetExceeded as e:
+            logger.warning(f"Validation of instance {index} exceeded its budget: {e}")
+            return ValidationResult(index, instance, {"non lazy": [e]}, e)
+
+    async def run(self, instances: AsyncIterable[Any]) -> AsyncIterator[ValidationResult]:
+        """Validate the instances, yielding their results in order or as they complete"""
+        loop = asyncio.get_running_loop()
+        source: AsyncIterator[Any] | None = aiter(instances)
+        next_instance: asyncio.Future | None = None
+        validations: set[asyncio.Future] = set()
+        # complete results waiting for an earlier one, when ordered
+        waiting: dict[int, ValidationResult] = {}
+        # the counts of this run, a stage may run several streams at once
+        submitted = yielded = queued = 0
+        try:
+            while True:
+                if next_instance is None and source is not None and queued < self.max_in_flight:
+                    next_instance = asyncio.ensure_future(anext(source))
+                if next_instance is None and not validations:
+                    break
+                awaited = set(validations) if next_instance is None else {next_instance, *validations}
+                done, _ = await asyncio.wait(awaited, return_when=asyncio.FIRST_COMPLETED)
+
+                if next_instance in done:
+                    try:
+                        instance = next_instance.result()  # type: ignore[union-attr]
+                    except StopAsyncIteration:
+                        source = None
+                    else:
+                        validations.add(loop.run_in_executor(self.executor, self._validate, submitted, instance))
+                        submitted += 1
+                        queued += 1
+                        self._queued += 1
+                        self._validating += 1
+                    next_instance = None
+
+                for validation in done & validations:
+                    validations.remove(validation)
+                    self._validating -= 1
+                    result: ValidationResult = validation.result()
+                    if not self.ordered:
+                        queued -= 1
+                        self._queued -= 1
+                        yield result
+                        continue
+                    waiting[result.index] = result
+                    while yielded in waiting:
+                        queued -= 1
+                        self._queued -= 1
+                        yield waiting.pop(yielded)
+                        yielded += 1
+        finally:
+            if next_instance is not None:
+                next_instance.cancel()
+            for validation in validations:
+                validation.cancel()
+            self._queued -= queued
+            self._validating -= len(validations)
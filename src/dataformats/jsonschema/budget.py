@@ -0,0 +1,85 @@
+from contextvars import ContextVar
+from dataclasses import dataclass
+from time import monotonic
+from typing import Any
+
+from dataformats.jsonschema.json_pointer import Location, materialize
+
+
+class ValidationBudgetExceeded(RuntimeError):
+    """Validation was aborted because a limit of its budget was hit, the instance is neither valid nor invalid"""
+
+    def __init__(self, *args, limit: str):
+        super().__init__(*args)
+        self.limit = limit
+
+
+@dataclass(frozen=True)
+class ValidationBudget:
+    """Limits on the work a single validation call may do
+
+    Attributes:
+        max_instance_depth: Maximum nesting depth of the instance
+        max_nodes: Maximum amount of (sub)schema validations
+        max_pattern_input_length: Maximum length of a string matched against `pattern` or `patternProperties`
+        timeout: Maximum wall-clock time in seconds, checked before every (sub)schema validation
+    """
+
+    max_instance_depth: int | None = None
+    max_nodes: int | None = None
+    max_pattern_input_length: int | None = None
+    timeout: float | None = None
+
+
+# budget of the validation that is running in the current context, used by the checks that match patterns
+active_budget: ContextVar[ValidationBudget | None] = ContextVar("active_budget", default=None)
+
+
+class BudgetTracker:
+    """Work spent by a single validation call, raises `ValidationBudgetExceeded` once the budget is exhausted"""
+
+    def __init__(self, budget: ValidationBudget, instance: Any):
+        self.budget = budget
+        self.deadline = None if budget.timeout is None else monotonic() + budget.timeout
+        self.nodes = 1
+        self._instances = [instance]
+        self._depths = [0]
+
+    def enter(self, instance: Any, location: Location):
+        """Account for a subschema validation of the instance at the location"""
+        budget = self.budget
+        self.nodes += 1
+        if budget.max_nodes is not None and self.nodes > budget.max_nodes:
+            raise ValidationBudgetExceeded(
+                f"Validation exceeded the maximum of {budget.max_nodes} nodes at {materialize(location)}",
+                limit="max_nodes",
+            )
+        # applicators (allOf, not, dependencies, ...) validate the same instance again
+        depth = self._depths[-1] + (instance is not self._instances[-1])
+        if budget.max_instance_depth is not None and depth > budget.max_instance_depth:
+            raise ValidationBudgetExceeded(
+                f"Instance exceeds the maximum depth of {budget.max_instance_depth} at {materialize(location)}",
+                limit="max_instance_depth",
+            )
+        if self.deadline is not None and monotonic() > self.deadline:
+            raise ValidationBudgetExceeded(
+                f"Validation exceeded its timeout of {budget.timeout}s at {materialize(location)}", limit="timeout"
+            )
+        self._instances.append(instance)
+        self._depths.append(depth)
+
+    def exit(self):
+        self._instances.pop()
+        self._depths.pop()
+
+
+def check_pattern_input(value: str):
+    """Refuse to match strings longer than the active budget allows, backtracking patterns may take exponential time"""
+    budget = active_budget.get()
+    if budget is not None and budget.max_pattern_input_length is not None:
+        if len(value) > budget.max_pattern_input_length:
+            raise ValidationBudgetExceeded(
+                f"String of length {len(value)} exceeds the maximum pattern input length of "
+                f"{budget.max_pattern_input_length}",
+                limit="max_pattern_input_length",
+            )
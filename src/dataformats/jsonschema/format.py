@@ -1,18 +1,134 @@
 import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable
 
-ipv4_pattern = re.compile(r"^(?:[0-9]{1,3}\.){3}[0-9]{1,3}$")
+FormatChecker = Callable[[str], bool]
 
-# from https://stackoverflow.com/questions/53497/regular-expression-that-matches-valid-ipv6-addresses
-ipv6_pattern = re.compile(
-    r"(([0-9a-fA-F]{1,4}:){7,7}[0-9a-fA-F]{1,4}|([0-9a-fA-F]{1,4}:){1,7}:|([0-9a-fA-F]{1,4}:){1,6}:[0-9a-fA-F]{1,4}|([0-9a-fA-F]{1,4}:){1,5}(:[0-9a-fA-F]{1,4}){1,2}|([0-9a-fA-F]{1,4}:){1,4}(:[0-9a-fA-F]{1,4}){1,3}|([0-9a-fA-F]{1,4}:){1,3}(:[0-9a-fA-F]{1,4}){1,4}|([0-9a-fA-F]{1,4}:){1,2}(:[0-9a-fA-F]{1,4}){1,5}|[0-9a-fA-F]{1,4}:((:[0-9a-fA-F]{1,4}){1,6})|:((:[0-9a-fA-F]{1,4}){1,7}|:)|fe80:(:[0-9a-fA-F]{0,4}){0,4}%[0-9a-zA-Z]{1,}|::(ffff(:0{1,4}){0,1}:){0,1}((25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9])\.){3,3}(25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9])|([0-9a-fA-F]{1,4}:){1,4}:((25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9])\.){3,3}(25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9]))"
+_date_time_pattern = re.compile(
+    r"(\d{4})-(\d{2})-(\d{2})[Tt](\d{2}):(\d{2}):(\d{2})(?:\.\d+)?(?:[Zz]|([+-])(\d{2}):(\d{2}))", re.ASCII
 )
+_ipv6_group_pattern = re.compile(r"[0-9A-Fa-f]{1,4}")
+_hostname_label_pattern = re.compile(r"[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?")
+_email_local_part_pattern = re.compile(r"[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+)*")
+_uri_pattern = re.compile(r"[A-Za-z][A-Za-z0-9+.-]*:(?:[A-Za-z0-9\-._~:/?#\[\]@!$&'()*+,;=]|%[0-9A-Fa-f]{2})*")
+
+
+def is_date_time(value: str) -> bool:
+    """RFC 3339 date-time, e.g. 2023-05-01T12:30:00.5+02:00"""
+    if (match := _date_time_pattern.fullmatch(value)) is None:
+        return False
+    if match[6] != "60":
+        try:
+            datetime.fromisoformat(value.upper())  # the pattern is stricter, this checks the ranges
+        except ValueError:
+            return False
+        return True
+    # leap seconds are inserted at 23:59:60 UTC
+    try:
+        datetime.fromisoformat(value[: match.start(6)].upper() + "59")
+    except ValueError:
+        return False
+    utc_minutes = int(match[4]) * 60 + int(match[5])
+    if match[7] is not None:
+        offset_minutes = int(match[8]) * 60 + int(match[9])
+        utc_minutes -= offset_minutes if match[7] == "+" else -offset_minutes
+    return utc_minutes % (24 * 60) == 23 * 60 + 59
+
+
+def is_ipv4(value: str) -> bool:
+    """Dotted quad ipv4 address, without leading zeroes"""
+    parts = value.split(".")
+    if len(parts) != 4:
+        return False
+    for part in parts:
+        if not (part.isascii() and part.isdigit()) or len(part) > 3 or (part[0] == "0" and len(part) > 1):
+            return False
+        if int(part) > 255:
+            return False
+    return True
+
+
+def is_ipv6(value: str) -> bool:
+    """Ipv6 address, possibly compressed and/or ending in an ipv4 address (without zone id)"""
+    if "." in value:
+        head, _, ipv4 = value.rpartition(":")
+        if not head or not is_ipv4(ipv4):
+            return False
+        value = f"{head}:0:0"
+    head, compressed, tail = value.partition("::")
+    groups = (head.split(":") if head else []) + (tail.split(":") if tail else [])
+    if not all(_ipv6_group_pattern.fullmatch(group) for group in groups):
+        return False
+    return len(groups) < 8 if compressed else len(groups) == 8
+
+
+def is_hostname(value: str) -> bool:
+    """RFC 1123 hostname"""
+    if len(value) > 253 or not value.isascii():
+        return False
+    return all(_hostname_label_pattern.fullmatch(label) for label in value.split("."))
+
+
+def is_email(value: str) -> bool:
+    """Email address with a dot-atom local part and a hostname (RFC 5321, without quoted local parts)"""
+    local_part, at, domain = value.rpartition("@")
+    if not at or len(local_part) > 64:
+        return False
+    return _email_local_part_pattern.fullmatch(local_part) is not None and is_hostname(domain)
+
+
+def is_uri(value: str) -> bool:
+    """Absolute RFC 3986 uri, only the characters and percent-encodings are checked"""
+    return _uri_pattern.fullmatch(value) is not None
+
+
+def is_regex(value: str) -> bool:
+    try:
+        re.compile(value)
+    except re.error:
+        return False
+    return True
+
+
+class FormatRegistry:
+    """Checkers by format name, looked up once when a schema is compiled
+
+    Formats without a checker are not validated, as allowed by the specification.
+    """
+
+    def __init__(self, checkers: dict[str, FormatChecker] | None = None):
+        self._checkers: dict[str, FormatChecker] = {} if checkers is None else dict(checkers)
+
+    def register(self, name: str, checker: FormatChecker, cache_size: int = 0):
+        """Register (or replace) the checker of a format
+
+        Args:
+            name: Name of the format as used in the `format` keyword
+            checker: Function returning whether a string is valid for the format
+            cache_size: Amount of recent results to memoize, for formats that are expensive to check and often repeat
+        """
+        self._checkers[name] = lru_cache(maxsize=cache_size)(checker) if cache_size else checker
+
+    def unregister(self, name: str):
+        self._checkers.pop(name, None)
+
+    def get(self, name: str) -> FormatChecker | None:
+        return self._checkers.get(name)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._checkers
 
-# https://stackoverflow.com/questions/201323/how-can-i-validate-an-email-address-using-a-regular-expression
-email_pattern = re.compile(
-    r"""(?:[a-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*|"(?:[\x01-\x08\x0b\x0c\x0e-\x1f\x21\x23-\x5b\x5d-\x7f]|\\[\x01-\x09\x0b\x0c\x0e-\x7f])*")@(?:(?:[a-z0-9](?:[a-z0-9-]*[a-z0-9])?\.)+[a-z0-9](?:[a-z0-9-]*[a-z0-9])?|\[(?:(?:(2(5[0-5]|[0-4][0-9])|1[0-9][0-9]|[1-9]?[0-9]))\.){3}(?:(2(5[0-5]|[0-4][0-9])|1[0-9][0-9]|[1-9]?[0-9])|[a-z0-9-]*[a-z0-9]:(?:[\x01-\x08\x0b\x0c\x0e-\x1f\x21-\x5a\x53-\x7f]|\\[\x01-\x09\x0b\x0c\x0e-\x7f])+)\])"""
-)
 
-# https://stackoverflow.com/questions/10306690/what-is-a-regular-expression-which-will-match-a-valid-domain-name-without-a-subd
-hostname_pattern = re.compile(
-    r""" ^(((?!-))(xn--|_)?[a-z0-9-]{0,61}[a-z0-9]{1,1}\.)*(xn--)?([a-z0-9][a-z0-9\-]{0,60}|[a-z0-9-]{1,30}\.[a-z]{2,})$"""
+# checkers of the formats defined by draft 4, used by validators compiled afterwards
+format_registry = FormatRegistry(
+    {
+        "date-time": is_date_time,
+        "email": is_email,
+        "hostname": is_hostname,
+        "ipv4": is_ipv4,
+        "ipv6": is_ipv6,
+        "uri": is_uri,
+        "regex": is_regex,
+    }
 )
@@ -0,0 +1,35 @@
+import hashlib
+import json
+from typing import Any, Generic, TypeVar
+
+from dataformats.jsonschema.custom_types import JsonType
+
+V = TypeVar("V")
+
+
+def canonical_json(json_object: JsonType) -> str:
+    """Serialize to a canonical form, structurally identical objects give the same string"""
+    return json.dumps(json_object, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def content_hash(json_object: JsonType) -> str:
+    """Hash of the canonical form of the object"""
+    return hashlib.sha256(canonical_json(json_object).encode()).hexdigest()
+
+
+class IdentityCache(dict[int, tuple[Any, V]], Generic[V]):
+    """Values cached by the identity of an object, for objects that are not hashable or should not be hashed by content
+
+    Entries are kept as `id(key) -> (key, value)`, the key is referenced by its entry so its id is not reused by another
+    object while the value is cached. Hot loops may look up `cache.get(id(key))` directly instead of calling `entry`.
+    """
+
+    __slots__ = ()
+
+    def entry(self, key: Any) -> tuple[Any, V] | None:
+        """The (key, value) entry of the object, None when nothing is cached for it"""
+        return self.get(id(key))
+
+    def store(self, key: Any, value: V) -> V:
+        self[id(key)] = (key, value)
+        return value
@@ -0,0 +1,267 @@
+import copy
+from logging import getLogger
+from typing import Any, Callable
+
+from dataformats.jsonschema.custom_types import JsonType
+from dataformats.jsonschema.hashing import IdentityCache
+from dataformats.jsonschema.json_pointer import Pointer
+from dataformats.jsonschema.mixins.validations_mixin import (
+    MAX_VALIDATION_DEPTH,
+    Draft4Validator,
+    ValidationDepthError,
+    ValidationErrors,
+)
+
+logger = getLogger("incremental")
+
+JsonPatch = list[dict[str, Any]]
+
+_missing = object()
+
+
+class JsonPatchError(ValueError):
+    """A json patch could not be applied, the document is left unchanged"""
+
+
+def parse_patch_pointer(path: Any) -> Pointer:
+    """Parse a json pointer of a patch operation, these are not url encoded (unlike pointers in a `$ref`)"""
+    if not isinstance(path, str) or (path and not path.startswith("/")):
+        raise JsonPatchError(f"Invalid json pointer {path!r}")
+    pointer = Pointer()
+    for part in path.split("/")[1:]:
+        pointer = pointer._child(part.replace("~1", "/").replace("~0", "~"))
+    return pointer
+
+
+def json_equal(first: JsonType, second: JsonType) -> bool:
+    """Equality of json values, unlike in python booleans are not numbers"""
+    if isinstance(first, bool) or isinstance(second, bool):
+        return first is second
+    if isinstance(first, dict) and isinstance(second, dict):
+        return first.keys() == second.keys() and all(json_equal(first[key], second[key]) for key in first)
+    if isinstance(first, list) and isinstance(second, list):
+        return len(first) == len(second) and all(json_equal(a, b) for a, b in zip(first, second))
+    if isinstance(first, (dict, list)) or isinstance(second, (dict, list)):
+        return False
+    return first == second
+
+
+def restore_property(dict_object: dict, key: str, value: JsonType, position: int):
+    """Add a removed property back at its original position"""
+    items = list(dict_object.items())
+    items.insert(position, (key, value))
+    dict_object.clear()
+    dict_object.update(items)
+
+
+class ValidatedDocument:
+    """A document that changes through json patches (RFC 6902), revalidated incrementally
+
+    The result of every (sub)schema validation is kept by the location of the instance it validated. A patch only
+    invalidates the results at the locations it touched: the changed values themselves, everything below them, the
+    array items that shifted and all their ancestors (whose `required`, `maxProperties`, `uniqueItems`, `oneOf`, ...
+    depend on them). Revalidation starts at the root again, but every subschema validation of an untouched location is
+    answered from the kept results, so the work is proportional to the size of the ancestors instead of the document.
+
+    The document should only be modified through `apply`.
+    """
+
+    def __init__(self, validator: Draft4Validator, document: JsonType, max_depth: int = MAX_VALIDATION_DEPTH):
+        self.validator = validator
+        self.document = document
+        self.max_depth = max_depth
+        # instance location -> validator -> errors
+        self._results: dict[Pointer, IdentityCache[ValidationErrors]] = {}
+        self._children: dict[Pointer, set[Pointer]] = {}
+        self.revalidated = 0
+        self.errors = self._validate()
+
+    def apply(self, patch: JsonPatch) -> ValidationErrors:
+        """Apply the patch and revalidate the document
+
+        The patch is applied atomically: when one of its operations fails, `JsonPatchError` is raised and the document
+        is left unchanged.
+
+        Returns:
+            The errors of the patched document, empty when it is valid
+        """
+        if not isinstance(patch, list):
+            raise JsonPatchError(f"A json patch should be an array of operations, not {type(patch).__name__}")
+        undo: list[Callable[[], None]] = []
+        changed: list[tuple[Pointer, int | None]] = []
+        try:
+            for operation in patch:
+                self._apply_operation(operation, undo, changed)
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            for undo_operation in reversed(undo):
+                undo_operation()
+            if isinstance(e, JsonPatchError):
+                raise
+            raise JsonPatchError(f"Could not apply {operation}: {e}") from e
+
+        for pointer, shifted_from in changed:
+            self._invalidate(pointer, shifted_from)
+        self.errors = self._validate()
+        logger.debug(f"Revalidated {self.revalidated} subschemas after a patch of {len(patch)} operations")
+        return self.errors
+
+    # validation
+
+    def _validate(self) -> ValidationErrors:
+        """Validate the document, reusing the results that are kept"""
+        self.revalidated = 0
+        root = self.validator
+        if (results := self._results.get(Pointer())) is not None and (cached := results.entry(root)) is not None:
+            return cached[1]
+        self.revalidated += 1
+        stack = [(root, Pointer(), self.document, root.validation_steps(self.document, Pointer()))]
+        errors: ValidationErrors | None = None
+        while stack:
+            validator, pointer, instance, steps = stack[-1]
+            try:
+                subvalidator, subinstance, sublocation = steps.send(errors)  # type: ignore[arg-type]
+            except StopIteration as stop:
+                stack.pop()
+                errors = stop.value
+                self._store(pointer, validator, errors)  # type: ignore[arg-type]
+                continue
+            # applicators validate the same instance again, container checks validate a child
+            subpointer = pointer if subinstance is instance else pointer._child(sublocation[1])  # type: ignore[index]
+            if (cached := self._results.get(subpointer, {}).get(id(subvalidator))) is not None:
+                errors = cached[1]
+                continue
+            if len(stack) >= self.max_depth:
+                raise ValidationDepthError(
+                    f"Validation exceeded the maximum depth of {self.max_depth} at {subpointer}", limit="max_depth"
+                )
+            self.revalidated += 1
+            steps = subvalidator.validation_steps(subinstance, sublocation)
+            stack.append((subvalidator, subpointer, subinstance, steps))
+            errors = None
+        return errors  # type: ignore[return-value]
+
+    def _store(self, pointer: Pointer, validator: Draft4Validator, errors: ValidationErrors):
+        if (results := self._results.get(pointer)) is None:
+            results = self._results[pointer] = IdentityCache()
+            if pointer._parent is not None:
+                self._children.setdefault(pointer._parent, set()).add(pointer)
+        results.store(validator, errors)
+
+    def _invalidate(self, pointer: Pointer, shifted_from: int | None):
+        """Forget the results at the pointer, below it and at its ancestors, and at the array items that shifted"""
+        stack = [pointer]
+        if shifted_from is not None:
+            stack.extend(
+                sibling
+                for sibling in self._children.get(pointer._parent, ())  # type: ignore[arg-type]
+                if sibling._part.isdigit() and int(sibling._part) >= shifted_from  # type: ignore[union-attr]
+            )
+        while stack:
+            descendant = stack.pop()
+            self._results.pop(descendant, None)
+            stack.extend(self._children.pop(descendant, ()))
+        ancestor = pointer._parent
+        while ancestor is not None:
+            self._results.pop(ancestor, None)
+            ancestor = ancestor._parent
+
+    # json patch
+
+    def _resolve(self, pointer: Pointer) -> JsonType:
+        try:
+            return pointer.follow_pointer(self.document)
+        except ValueError as e:
+            raise JsonPatchError(str(e)) from e
+
+    def _array_index(self, array: list, part: str, pointer: Pointer, insert: bool = False) -> int:
+        if insert and part == "-":
+            return len(array)
+        if not part.isdigit() or (part != "0" and part.startswith("0")):
+            raise JsonPatchError(f"Invalid array index {part!r} in {pointer}")
+        index = int(part)
+        if index > len(array) or (index == len(array) and not insert):
+            raise JsonPatchError(f"Array index {index} is out of bounds in {pointer}")
+        return index
+
+    def _add(self, pointer: Pointer, value: JsonType, undo: list, changed: list):
+        if pointer._parent is None:
+            old_document = self.document
+            self.document = value
+            undo.append(lambda: setattr(self, "document", old_document))
+            changed.append((pointer, None))
+            return
+        parent = self._resolve(pointer._parent)
+        part: str = pointer._part  # type: ignore[assignment]
+        if isinstance(parent, dict):
+            old = parent.get(part, _missing)
+            parent[part] = value
+            undo.append(lambda: parent.pop(part) if old is _missing else parent.__setitem__(part, old))
+            changed.append((pointer, None))
+        elif isinstance(parent, list):
+            index = self._array_index(parent, part, pointer, insert=True)
+            parent.insert(index, value)
+            undo.append(lambda: parent.pop(index))
+            changed.append((pointer._parent._child(str(index)), index))
+        else:
+            raise JsonPatchError(f"Cannot add to {pointer}, its parent is not an object or array")
+
+    def _remove(self, pointer: Pointer, undo: list, changed: list) -> JsonType:
+        if pointer._parent is None:
+            raise JsonPatchError("Cannot remove the whole document")
+        parent = self._resolve(pointer._parent)
+        part: str = pointer._part  # type: ignore[assignment]
+        if isinstance(parent, dict):
+            if part not in parent:
+                raise JsonPatchError(f"Cannot remove {pointer}, it does not exist")
+            position = next(index for index, key in enumerate(parent) if key == part)
+            old = parent.pop(part)
+            undo.append(lambda: restore_property(parent, part, old, position))
+            changed.append((pointer, None))
+        elif isinstance(parent, list):
+            index = self._array_index(parent, part, pointer)
+            old = parent.pop(index)
+            undo.append(lambda: parent.insert(index, old))
+            changed.append((pointer, index))
+        else:
+            raise JsonPatchError(f"Cannot remove {pointer}, its parent is not an object or array")
+        return old
+
+    def _replace(self, pointer: Pointer, value: JsonType, undo: list, changed: list):
+        old = self._resolve(pointer)  # the target has to exist
+        if pointer._parent is None:
+            self.document = value
+            undo.append(lambda: setattr(self, "document", old))
+        else:
+            parent = self._resolve(pointer._parent)
+            key: str | int = pointer._part if isinstance(parent, dict) else int(pointer._part)  # type: ignore[arg-type]
+            parent[key] = value
+            undo.append(lambda: parent.__setitem__(key, old))
+        changed.append((pointer, None))
+
+    def _apply_operation(self, operation: dict[str, Any], undo: list, changed: list):
+        if not isinstance(operation, dict):
+            raise JsonPatchError(f"Patch operation {operation!r} is not an object")
+        op = operation.get("op")
+        pointer = parse_patch_pointer(operation.get("path"))
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise JsonPatchError(f"Operation {op} at {pointer} has no value")
+        if op == "add":
+            self._add(pointer, operation["value"], undo, changed)
+        elif op == "remove":
+            self._remove(pointer, undo, changed)
+        elif op == "replace":
+            self._replace(pointer, operation["value"], undo, changed)
+        elif op == "move":
+            from_pointer = parse_patch_pointer(operation.get("from"))
+            if from_pointer.is_parent_of(pointer):
+                raise JsonPatchError(f"Cannot move {from_pointer} into its own child {pointer}")
+            if from_pointer != pointer:
+                self._add(pointer, self._remove(from_pointer, undo, changed), undo, changed)
+        elif op == "copy":
+            from_pointer = parse_patch_pointer(operation.get("from"))
+            self._add(pointer, copy.deepcopy(self._resolve(from_pointer)), undo, changed)
+        elif op == "test":
+            if not json_equal(self._resolve(pointer), operation["value"]):
+                raise JsonPatchError(f"Test of {pointer} failed")
+        else:
+            raise JsonPatchError(f"Unknown patch operation {op!r}")
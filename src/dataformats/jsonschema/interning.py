@@ -0,0 +1,134 @@
+import hashlib
+from logging import getLogger
+
+from dataformats.jsonschema.custom_types import JsonType, SchemaType
+from dataformats.jsonschema.hashing import IdentityCache, canonical_json
+from dataformats.jsonschema.mixins.validations_mixin import Draft4Validator
+from dataformats.jsonschema.regex_risk import RegexRiskMode, check_regex_risk_mode, check_schema_patterns
+
+logger = getLogger("interning")
+
+
+class SchemaInterner:
+    """Interning table for (sub)schemas
+
+    Subschemas are hashed bottom-up from their canonical form: the hash of a container is derived from the hashes of its
+    children, so every node is serialized only once. Structurally identical subschemas are replaced by a single
+    canonical instance and share a single compiled validator.
+
+    Subschemas that are part of a cycle (recursive schemas after dereferencing) cannot be hashed by content, they are
+    kept as they are and get a validator per instance.
+    """
+
+    def __init__(self):
+        self._schemas: dict[str, JsonType] = {}  # content hash -> canonical instance
+        self._hashes: dict[int, str] = {}  # id of a canonical instance -> content hash
+        self._validators: dict[str, Draft4Validator] = {}  # content hash -> validator
+        self._cyclic_validators: IdentityCache[Draft4Validator] = IdentityCache()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._schemas)
+
+    def _intern(self, node: JsonType, path: set[int], seen: dict[int, tuple[JsonType, str | None]]):
+        if not isinstance(node, (dict, list)):
+            return node, canonical_json(node)
+        if id(node) in self._hashes:
+            return node, self._hashes[id(node)]
+        if id(node) in seen:
+            return seen[id(node)]
+        if id(node) in path:
+            return node, None  # a cycle, hashed by neither the node nor its ancestors
+
+        path.add(id(node))
+        keys = node.keys() if isinstance(node, dict) else range(len(node))
+        child_hashes: dict = {}
+        for key in keys:
+            child = node[key]  # type: ignore[index]
+            canonical_child, child_hash = self._intern(child, path, seen)
+            if canonical_child is not child:
+                node[key] = canonical_child  # type: ignore[index]
+            child_hashes[key] = child_hash
+        path.remove(id(node))
+
+        if None in child_hashes.values():
+            seen[id(node)] = (node, None)
+            return seen[id(node)]
+
+        form = {"object": child_hashes} if isinstance(node, dict) else {"array": list(child_hashes.values())}
+        node_hash = hashlib.sha256(canonical_json(form).encode()).hexdigest()
+        if node_hash in self._schemas:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self._schemas[node_hash] = node
+            self._hashes[id(node)] = node_hash
+        seen[id(node)] = (self._schemas[node_hash], node_hash)
+        return seen[id(node)]
+
+    def intern(self, schema: SchemaType) -> SchemaType:
+        """Canonical instance of the schema
+
+        Subschemas of the given schema are replaced in place by their canonical instances, so the schema should not be
+        modified afterwards.
+        """
+        canonical, _ = self._intern(schema, set(), {})
+        return canonical  # type: ignore[return-value]
+
+    def schema_hash(self, schema: SchemaType) -> str | None:
+        """Content hash of an interned schema, None for schemas that are part of a cycle"""
+        return self._hashes.get(id(schema))
+
+    def validator(self, schema: SchemaType) -> Draft4Validator:
+        """The single compiled validator shared by every schema structurally identical to the given one"""
+        if (cached := self._cyclic_validators.get(id(schema))) is not None:
+            return cached[1]
+        canonical = self.intern(schema)
+        schema_hash = self._hashes.get(id(canonical))
+        if schema_hash is None:
+            if (cached := self._cyclic_validators.entry(canonical)) is None:
+                return self._cyclic_validators.store(canonical, Draft4Validator(__interner__=self, **canonical))
+            return cached[1]
+        if (validator := self._validators.get(schema_hash)) is None:
+            validator = self._validators[schema_hash] = Draft4Validator(__interner__=self, **canonical)
+        return validator
+
+
+class SchemaRegistry:
+    """Named contracts compiled with a shared interning table
+
+    Every subschema that is repeated across the contracts of a registry (timestamps, money, paging, ...) is stored and
+    compiled once. Schemas are expected to be dereferenced (or bundled and dereferenced) before they are added.
+
+    With `regex_risk` the patterns of every added schema are checked for catastrophic backtracking before it is
+    compiled, see `check_schema_patterns`.
+    """
+
+    def __init__(self, interner: SchemaInterner | None = None, regex_risk: RegexRiskMode | None = None):
+        check_regex_risk_mode(regex_risk)
+        self.interner = SchemaInterner() if interner is None else interner
+        self.regex_risk = regex_risk
+        self._validators: dict[str, Draft4Validator] = {}
+
+    def add(self, name: str, schema: SchemaType) -> Draft4Validator:
+        """Intern and compile the schema, the schema is modified in place"""
+        if name in self._validators:
+            raise ValueError(f"A schema is already registered as {name}")
+        check_schema_patterns(schema, self.regex_risk)
+        self._validators[name] = self.interner.validator(schema)
+        logger.debug(f"Registered {name}, {len(self.interner)} unique subschemas in the registry")
+        return self._validators[name]
+
+    def __getitem__(self, name: str) -> Draft4Validator:
+        return self._validators[name]
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._validators
+
+    def __len__(self) -> int:
+        return len(self._validators)
+
+    def validate(self, name: str, instance: JsonType):
+        """Validate the instance against the named schema, see `Draft4Validator.validate`"""
+        return self._validators[name].validate(instance)
@@ -1,19 +1,67 @@
 import urllib.parse
+from functools import lru_cache
 from logging import getLogger
-from typing import Any, Self
+from typing import Any, Self, TypeAlias, Union
 
 from dataformats.jsonschema.custom_types import JsonType
 
 logger = getLogger("json pointer resolver")
 
+POINTER_CACHE_SIZE = 4096
+
 class Pointer:
-    def __init__(self, *parts: str):
-        self.parts: list[str] = list(parts)
-        if not self.parts or self.parts[0] != "":
-            self.parts = ["", *self.parts]
+    """Immutable json pointer
+
+    A pointer is linked to its parent, so `extended_copy` shares the parent's prefix instead of copying it. The parts,
+    the string form and the hash are computed once, on first use.
+    """
+
+    __slots__ = ("_parent", "_part", "_length", "_parts", "_string", "_hash")
+
+    _parent: "Pointer | None"
+    _part: str | None
+    _length: int
+    _parts: tuple[str, ...] | None
+    _string: str | None
+    _hash: int | None
+
+    def __new__(cls, *parts: str):
+        if parts and parts[0] == "":
+            parts = parts[1:]
+        pointer = cls._root()
+        for part in parts:
+            pointer = pointer._child(part)
+        return pointer
 
     @classmethod
+    def _root(cls) -> Self:
+        # the root pointer is shared by every pointer (of the same class)
+        root = cls.__dict__.get("_root_pointer")
+        if root is None:
+            root = object.__new__(cls)
+            root._parent = None
+            root._part = None
+            root._length = 0
+            root._parts = ("",)
+            root._string = ""
+            root._hash = None
+            type.__setattr__(cls, "_root_pointer", root)
+        return root
+
+    def _child(self, part: str) -> Self:
+        child = object.__new__(self.__class__)
+        child._parent = self
+        child._part = part
+        child._length = self._length + 1
+        child._parts = None
+        child._string = None
+        child._hash = None
+        return child
+
+    @classmethod
+    @lru_cache(maxsize=POINTER_CACHE_SIZE)
     def from_string(cls, pointer_string):
+        """Parse a (possibly url encoded) json pointer, memoized since pointers are immutable"""
         #pointers may be url encoded
         pointer_string = urllib.parse.unquote(pointer_string)
         # if pointer_string and pointer_string[0] == "/":
@@ -37,19 +85,35 @@ class Pointer:
         part = part.replace("/", "~1")
         return part
 
-    def __iter__(self):
-        return self.parts.__iter__()
+    @property
+    def parts(self) -> list[str]:
+        """The parts of the pointer, starting with the empty root part"""
+        return list(self._tuple())
 
-    def add_part(self, part: str):
-        # This is the only place where parts are escaped
-        part = self._unescape_part(part)
-        self.parts.append(part)
+    def _tuple(self) -> tuple[str, ...]:
+        if self._parts is None:
+            # walk up to the nearest ancestor with known parts, deep pointers should not hit the recursion limit
+            missing_parts = []
+            ancestor = self
+            while ancestor._parts is None:
+                missing_parts.append(ancestor._part)
+                ancestor = ancestor._parent  # type: ignore[assignment]
+            self._parts = (*ancestor._parts, *reversed(missing_parts))  # type: ignore[misc]
+        return self._parts
+
+    def __iter__(self):
+        return self._tuple().__iter__()
 
     def extended_copy(self, part: str):
-        """Convenience method to create a copy and add a part"""
-        p = Pointer(*self.parts)
-        p.add_part(part)
-        return p
+        """Create a child pointer with the given part added, the parts of this pointer are shared"""
+        return self._child(self._unescape_part(part))
+
+    def joined(self, other: "Pointer") -> Self:
+        """Create a pointer to the location of `other` relative to this pointer"""
+        pointer = self
+        for part in other._tuple()[1:]:
+            pointer = pointer._child(part)
+        return pointer
 
     def follow_pointer(self, object: JsonType) -> JsonType:
         """Descend into the given object following this json pointer
@@ -57,69 +121,174 @@ class Pointer:
         Returns reference of the pointer within the object or raises a ValueError
         """
         current_location: Any = object
-        logger.info(f"Resolving {self} in {object}")
-
-        for idx, pointer_part in enumerate(self.parts):
-            processed_pointer = Pointer(*self.parts[:idx + 1])
-            try:
-                if isinstance(current_location, dict):
-                    try:
-                        current_location = current_location[pointer_part]
-                    except KeyError as e:
-                        raise ValueError(
-                            f"Could not descend any further for pointer {self} at {processed_pointer}. "
-                            f"key '{pointer_part}' is not contained in the dict object with keys {list(current_location.keys())}"
-                        ) from e
-                elif isinstance(current_location, list):
-                    if not pointer_part.isdigit():
-                        raise ValueError(
-                            f"Could not descend any further for pointer {self} at {processed_pointer}"
-                            f" index of list is non numeric: {pointer_part}"
-                        )
-                    try:
-                        current_location = current_location[int(pointer_part)]
-                    except IndexError as e:
-                        raise ValueError(
-                            f"Could not descend any further for pointer {self} at {processed_pointer}"
-                            f" the given index {pointer_part} is out of bound for the given "
-                            f"list of len {len(current_location)}"
-                        ) from e
-                else:
-                    raise ValueError(
-                        f"Could not descend any further for pointer {self} at {processed_pointer}"
-                        f" with next part {pointer_part} because the current object is of type {type(current_location)}"
+
+        for idx, pointer_part in enumerate(self._tuple()):
+            if isinstance(current_location, dict):
+                if pointer_part in current_location:
+                    current_location = current_location[pointer_part]
+                    continue
+                reason = (
+                    f". key '{pointer_part}' is not contained in the dict object with keys {list(current_location.keys())}"
+                )
+            elif isinstance(current_location, list):
+                if not pointer_part.isdigit():
+                    reason = f" index of list is non numeric: {pointer_part}"
+                elif int(pointer_part) >= len(current_location):
+                    reason = (
+                        f" the given index {pointer_part} is out of bound for the given "
+                        f"list of len {len(current_location)}"
                     )
-            except ValueError:
-                if pointer_part == "":
+                else:
+                    current_location = current_location[int(pointer_part)]
                     continue
-                raise
+            else:
+                reason = (
+                    f" with next part {pointer_part} because the current object is of type {type(current_location)}"
+                )
+
+            if pointer_part == "":
+                continue
+            # the diagnostics are only built when resolving failed, formatting large documents is expensive
+            processed_pointer = Pointer(*self._tuple()[: idx + 1])
+            raise ValueError(f"Could not descend any further for pointer {self} at {processed_pointer}{reason}")
 
         return current_location
 
     @property
     def parent(self) -> Self:
-        if len(self) == 0:
+        if self._parent is None:
             raise ValueError("root pointer has no parent")
-        return self.__class__(*self.parts[:-1])
+        return self._parent
 
     def is_parent_of(self, other: Self):
-        return self.parts == other.parts[:len(self) + 1] and len(self) != len(other)
+        return self._length < other._length and self._tuple() == other._tuple()[:self._length + 1]
 
     def is_child_of(self, other: Self):
-        return self.parts[:len(other) + 1] == other.parts and len(self) != len(other)
+        return other._length < self._length and self._tuple()[:other._length + 1] == other._tuple()
 
     def __str__(self):
-        return "".join(f"/{self._escape_part(part)}" for part in self.parts[1:])
+        if self._string is None:
+            parent_string = self._parent._string  # type: ignore[union-attr]
+            if parent_string is not None:
+                self._string = f"{parent_string}/{self._escape_part(self._part)}"  # type: ignore[arg-type]
+            else:
+                self._string = "".join(f"/{self._escape_part(part)}" for part in self._tuple()[1:])
+        return self._string
 
     def __repr__(self):
-        args = ', '.join(f'"{self._escape_part(part)}"' for part in self.parts[1:])
+        args = ', '.join(f'"{self._escape_part(part)}"' for part in self._tuple()[1:])
         return f"Pointer({args})"
 
     def __eq__(self, other):
-        return self.parts == other.parts
+        if self is other:
+            return True
+        if not isinstance(other, Pointer):
+            return NotImplemented
+        return self._length == other._length and self._tuple() == other._tuple()
 
     def __len__(self):
-        return len(self.parts[1:])
+        return self._length
 
     def __hash__(self):
-        return hash(str(self))
+        if self._hash is None:
+            self._hash = hash(self._tuple())
+        return self._hash
+
+    def __reduce__(self):
+        return self.__class__, self._tuple()
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class PointerIndex:
+    """Index of the nodes of a single document by pointer
+
+    The document is walked once up front, after that `follow_pointer` is a dict lookup. Pointers that were not indexed
+    (e.g. into a subtree that was replaced) are resolved from their nearest indexed ancestor and indexed on the way.
+    Replacing a node (like dereferencing a `$ref` in place) has to go through `replace` to keep the index valid.
+    """
+
+    def __init__(self, document: JsonType):
+        self.document = document
+        self._nodes: dict[Pointer, JsonType] = {}
+        self._children: dict[Pointer, list[Pointer]] = {}
+        self._walk(Pointer(), document)
+
+    def _index(self, pointer: Pointer, node: JsonType):
+        self._nodes[pointer] = node
+        if pointer._parent is not None:
+            self._children.setdefault(pointer._parent, []).append(pointer)
+
+    def _walk(self, pointer: Pointer, node: JsonType):
+        stack: list[tuple[Pointer, JsonType]] = [(pointer, node)]
+        seen: set[int] = set()
+        while stack:
+            pointer, node = stack.pop()
+            self._index(pointer, node)
+            if not isinstance(node, (dict, list)) or id(node) in seen:
+                continue  # do not walk into the same container twice, documents can be recursive after dereferencing
+            seen.add(id(node))
+            if isinstance(node, dict):
+                stack.extend((pointer._child(key), value) for key, value in node.items())
+            else:
+                stack.extend((pointer._child(str(idx)), value) for idx, value in enumerate(node))
+
+    def __contains__(self, pointer: Pointer):
+        return pointer in self._nodes
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def follow_pointer(self, pointer: Pointer) -> JsonType:
+        """Resolve the pointer within the indexed document, raises a ValueError like `Pointer.follow_pointer`"""
+        if pointer in self._nodes:
+            return self._nodes[pointer]
+
+        missing: list[Pointer] = []
+        ancestor = pointer
+        while ancestor not in self._nodes:
+            missing.append(ancestor)
+            ancestor = ancestor.parent
+        node = self._nodes[ancestor]
+
+        for child in reversed(missing):
+            part: str = child._part  # type: ignore[assignment]
+            if isinstance(node, dict) and part in node:
+                node = node[part]
+            elif isinstance(node, list) and part.isdigit() and int(part) < len(node):
+                node = node[int(part)]
+            else:
+                return pointer.follow_pointer(self.document)  # raises with the full diagnostics
+            self._index(child, node)
+        return node
+
+    def replace(self, pointer: Pointer, node: JsonType):
+        """Register that the node at the pointer was replaced, forgetting everything indexed below it"""
+        stack = self._children.pop(pointer, [])
+        while stack:
+            descendant = stack.pop()
+            self._nodes.pop(descendant, None)
+            stack.extend(self._children.pop(descendant, []))
+        self._nodes[pointer] = node
+        if pointer == Pointer():
+            self.document = node
+
+
+# A location is either a Pointer or a (parent location, part) pair. Pairs are cheap to create for every visited child
+# and only turned into a Pointer when the location is actually needed, e.g. to report an error.
+Location: TypeAlias = Union[Pointer, tuple["Location", str]]
+
+
+def materialize(location: Location) -> Pointer:
+    """Turn a location into a Pointer"""
+    parts = []
+    while not isinstance(location, Pointer):
+        location, part = location
+        parts.append(part)
+    for part in reversed(parts):
+        location = location.extended_copy(part)
+    return location
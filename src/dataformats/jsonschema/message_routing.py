@@ -0,0 +1,166 @@
+from collections import defaultdict
+from logging import getLogger
+from threading import Lock
+from time import perf_counter
+from typing import Hashable, Iterable, NamedTuple
+
+from dataformats.jsonschema.budget import ValidationBudget, ValidationBudgetExceeded
+from dataformats.jsonschema.custom_types import JsonType, SchemaType
+from dataformats.jsonschema.interning import SchemaRegistry
+from dataformats.jsonschema.mixins.validations_mixin import Draft4Validator, ValidationErrors
+
+logger = getLogger("message_routing")
+
+
+class UnknownMessageType(ValueError):
+    """A message without a discriminator, or with a discriminator no schema is registered for"""
+
+
+class MessageTypeStats(NamedTuple):
+    validated: int
+    invalid: int
+    seconds: float
+
+
+class RoutedResult(NamedTuple):
+    """The errors of a message (empty when it is valid) and its discriminator value (None when it has none)"""
+
+    message_type: Hashable | None
+    errors: ValidationErrors
+
+
+def route_key(message_type: Hashable) -> Hashable:
+    """The key a message type is routed by, booleans are told apart from the numbers they are equal to in python"""
+    return (bool, message_type) if isinstance(message_type, bool) else message_type
+
+
+class MessageRouter:
+    """Validate messages of many types, each against the schema of its type only
+
+    The type of a message is the value of its `discriminator` property (e.g. "type" or "$schema"). The schemas are
+    compiled in a shared registry and indexed by the discriminator values they accept, so routing a message is a
+    dictionary lookup instead of trying every schema until one passes. Messages of an unknown type are reported with
+    an `UnknownMessageType` error.
+
+    Message types are compared like json values: `true` is not the message type `1`, `1.0` is. Statistics are kept per
+    `route_key` of the message types, messages without a known type are counted under None.
+    """
+
+    def __init__(
+        self,
+        discriminator: str = "type",
+        registry: SchemaRegistry | None = None,
+        budget: ValidationBudget | None = None,
+    ):
+        self.discriminator = discriminator
+        self.registry = SchemaRegistry() if registry is None else registry
+        self.budget = budget
+        # route key -> message type as it was registered, validator
+        self._validators: dict[Hashable, tuple[Hashable, Draft4Validator]] = {}
+        self._lock = Lock()
+        # statistics by route key
+        self._validated: dict[Hashable | None, int] = defaultdict(int)
+        self._invalid: dict[Hashable | None, int] = defaultdict(int)
+        self._seconds: dict[Hashable | None, float] = defaultdict(float)
+
+    def message_types(self, schema: SchemaType) -> list[Hashable]:
+        """The discriminator values of a schema: the enum of its discriminator property or, when routing on
+        "$schema", its id"""
+        discriminator_schema = (schema.get("properties") or {}).get(self.discriminator)
+        if isinstance(discriminator_schema, dict) and isinstance(discriminator_schema.get("enum"), list):
+            return discriminator_schema["enum"]
+        if self.discriminator == "$schema" and isinstance(schema.get("id"), str):
+            return [schema["id"]]
+        raise ValueError(
+            f"The message types of the schema could not be derived from properties/{self.discriminator}/enum, "
+            "pass them explicitly"
+        )
+
+    def add(self, schema: SchemaType, message_types: Iterable[Hashable] | None = None) -> Draft4Validator:
+        """Compile the schema for the given message types, or for the types derived from it (see `message_types`)"""
+        message_types = self.message_types(schema) if message_types is None else list(message_types)
+        if not message_types:
+            raise ValueError("A schema should be added for at least one message type")
+        for message_type in message_types:
+            if (registered := self._validators.get(route_key(message_type))) is not None:
+                raise ValueError(
+                    f"A schema is already registered for message type {message_type!r} (as {registered[0]!r})"
+                )
+        validator = self.registry.add(f"message {', '.join(map(str, message_types))}", schema)
+        for message_type in message_types:
+            self._validators[route_key(message_type)] = (message_type, validator)
+        return validator
+
+    def __len__(self) -> int:
+        return len(self._validators)
+
+    def route(self, message: JsonType) -> tuple[Hashable | None, Draft4Validator | None]:
+        """The registered type of the message and its validator, or the discriminator value and None when no schema
+        is registered for it (None when the message has none, or it is not a scalar)"""
+        if not isinstance(message, dict):
+            return None, None
+        message_type = message.get(self.discriminator)
+        if isinstance(message_type, (dict, list)):
+            return None, None
+        if (registered := self._validators.get(route_key(message_type))) is None:  # type: ignore[arg-type]
+            return message_type, None  # type: ignore[return-value]
+        return registered
+
+    def validate(self, message: JsonType) -> RoutedResult:
+        """Validate a message against the schema of its type"""
+        return self.validate_batch([message])[0]
+
+    def validate_batch(self, messages: Iterable[JsonType]) -> list[RoutedResult]:
+        """Validate messages against the schemas of their types, the results are in the order of the messages
+
+        A message whose validation exceeds the budget gets the `ValidationBudgetExceeded` as its error and is counted
+        as invalid, the other messages of the batch are still validated. The statistics are updated once per batch.
+        """
+        results = []
+        validated: dict[Hashable | None, int] = defaultdict(int)
+        invalid: dict[Hashable | None, int] = defaultdict(int)
+        seconds: dict[Hashable | None, float] = defaultdict(float)
+        budget = self.budget
+        for message in messages:
+            message_type, validator = self.route(message)
+            if validator is None:
+                if not isinstance(message, dict) or self.discriminator not in message:
+                    error = UnknownMessageType(f"Message has no {self.discriminator}")
+                elif isinstance(value := message[self.discriminator], (dict, list)):
+                    error = UnknownMessageType(
+                        f"The {self.discriminator} of a message should be a scalar, not {value!r}"
+                    )
+                else:
+                    error = UnknownMessageType(f"No schema is registered for message type {message_type!r}")
+                results.append(RoutedResult(message_type, {"non lazy": [error]}))
+                validated[None] += 1
+                invalid[None] += 1
+                continue
+            start = perf_counter()
+            try:
+                errors = validator.validate(message, budget=budget)
+            except ValidationBudgetExceeded as e:
+                logger.warning(f"Validation of a {message_type!r} message exceeded its budget: {e}")
+                errors = {"non lazy": [e]}
+            key = route_key(message_type)
+            seconds[key] += perf_counter() - start
+            validated[key] += 1
+            if errors:
+                invalid[key] += 1
+            results.append(RoutedResult(message_type, errors))
+
+        with self._lock:
+            for key, count in validated.items():
+                self._validated[key] += count
+                self._invalid[key] += invalid[key]
+                self._seconds[key] += seconds[key]
+        return results
+
+    def stats(self) -> dict[Hashable | None, MessageTypeStats]:
+        """Messages validated, invalid messages and validation time by message type, booleans are keyed by their
+        `route_key` so they are not merged with the numbers they are equal to"""
+        with self._lock:
+            return {
+                key: MessageTypeStats(count, self._invalid[key], self._seconds[key])
+                for key, count in self._validated.items()
+            }
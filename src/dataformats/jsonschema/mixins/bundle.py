@@ -0,0 +1,158 @@
+import json
+from collections import deque
+from copy import deepcopy
+from logging import getLogger
+from pathlib import Path, PurePosixPath
+from urllib.parse import quote, urldefrag, urljoin, urlparse
+
+from dataformats.jsonschema.custom_types import SchemaType
+from dataformats.jsonschema.hashing import content_hash
+from dataformats.jsonschema.json_pointer import Pointer, PointerIndex
+from dataformats.jsonschema.mixins.dereference_mixin import (
+    analyze_ref,
+    base_uri_for_ref,
+    retrieve_schema,
+)
+from dataformats.jsonschema.mixins.schema_parsing import absolute_id_map, find_schemas, is_absolute, ref_map
+from dataformats.jsonschema.protocols import Retriever
+
+logger = getLogger("bundle")
+
+
+def _definition_name(uri: str, definitions: dict) -> str:
+    name = PurePosixPath(urlparse(uri).path).stem or "schema"
+    unique_name = name
+    counter = 1
+    while unique_name in definitions:
+        counter += 1
+        unique_name = f"{name}_{counter}"
+    return unique_name
+
+
+def _ref_to(pointer: Pointer) -> str:
+    return f"#{quote(str(pointer), safe='/~')}"
+
+
+def _depends_on_location(document: SchemaType, id_key: str, ref_key: str) -> bool:
+    """Whether the refs of a document resolve against the uri it was retrieved from, i.e. it has no absolute id but
+    has relative ids or refs to other documents"""
+    if isinstance(document.get(id_key), str) and is_absolute(document[id_key]):
+        return False
+    if any(not ref.startswith("#") and not is_absolute(ref) for ref in ref_map(document, ref_key=ref_key).values()):
+        return True
+    return any(
+        isinstance(schema.get(id_key), str) and not is_absolute(schema[id_key])
+        for schema in find_schemas(document).values()
+    )
+
+
+def bundle(
+    schema: SchemaType,
+    retriever: Retriever | None = None,
+    base_uri: str | None = None,
+    id_key="id",
+    ref_key="$ref",
+) -> SchemaType:
+    """Bundle a schema and every document it references into a single self-contained schema
+
+    Referenced documents are embedded under `definitions` and every ref is rewritten to a fragment pointer into the
+    bundle, documents with the same content are only embedded once when their relative refs resolve the same way.
+    Since refs no longer depend on base uris, the ids below the root are dropped. The given schema is not modified.
+
+    Args:
+        schema: The root schema
+        retriever: Backend used to retrieve the referenced documents, defaults to the shared file/http retriever
+        base_uri: Uri of the root schema, used when the schema has no id of its own
+
+    Returns:
+        The bundled schema, its refs can be resolved without any retrieval
+    """
+    root = deepcopy(schema)
+    if base_uri is not None and not isinstance(root.get(id_key), str):
+        root[id_key] = base_uri
+    root_uri = urldefrag(root[id_key])[0] if isinstance(root.get(id_key), str) else None
+    definitions = root.setdefault("definitions", {})
+    if not isinstance(definitions, dict):
+        raise ValueError(f"Cannot bundle into definitions of type {type(definitions)}")
+
+    # absolute uris (documents and ids) -> their location in the bundle
+    locations: dict[str, Pointer] = {}
+    # (base uri of location dependent documents, content hash) -> location in the bundle
+    locations_by_content: dict[tuple[str | None, str], Pointer] = {}
+    id_pointers: list[tuple[SchemaType, list[Pointer]]] = []
+    pending: deque[tuple[SchemaType, str | None, Pointer, dict[Pointer, str]]] = deque()
+
+    def register(document: SchemaType, document_uri: str | None, document_location: Pointer):
+        # ids are registered as soon as a document is known, refs may point into it by one of its nested ids
+        if document_uri is not None and not isinstance(document.get(id_key), str):
+            document[id_key] = document_uri
+        absolute_ids = absolute_id_map(document, id_key=id_key)
+        for id_pointer, absolute_id in absolute_ids.items():
+            locations.setdefault(urldefrag(absolute_id)[0], document_location.joined(id_pointer))
+        id_pointers.append((document, [pointer for pointer in absolute_ids if document is not root or len(pointer) > 0]))
+        pending.append((document, document_uri, document_location, absolute_ids))
+
+    def embed(uri: str) -> Pointer:
+        document = retrieve_schema(uri, download=True, retriever=retriever)
+        content_key = (
+            urljoin(uri, ".") if _depends_on_location(document, id_key, ref_key) else None,
+            content_hash(document),
+        )
+        if content_key in locations_by_content:
+            logger.debug(f"{uri} has the same content as {locations_by_content[content_key]}")
+            locations[uri] = locations_by_content[content_key]
+            return locations[uri]
+        name = _definition_name(uri, definitions)
+        definitions[name] = document
+        location = Pointer("definitions", name)
+        locations[uri] = locations_by_content[content_key] = location
+        register(document, uri, location)
+        return location
+
+    register(root, root_uri, Pointer())
+    while pending:
+        document, document_uri, document_location, absolute_ids = pending.popleft()
+        rewritten_refs: dict[Pointer, str] = {}
+        for ref_pointer, ref in ref_map(document, ref_key=ref_key).items():
+            try:
+                ref_base_uri: str | None = base_uri_for_ref(ref, ref_pointer, absolute_ids)  # type: ignore
+            except ValueError:
+                ref_base_uri = document_uri
+            absolute_uri, fragment = analyze_ref(ref, ref_base_uri)  # type: ignore
+            if fragment and not fragment.startswith("/"):
+                raise ValueError(f"Cannot bundle ref {ref} at {ref_pointer}, only json pointer fragments are supported")
+
+            if absolute_uri is None and ref.startswith("#"):
+                target_location = document_location  # fragment only ref in a document without id
+            elif absolute_uri is None:
+                raise ValueError(f"Cannot bundle ref {ref} at {ref_pointer}, its base uri is unknown")
+            elif absolute_uri in locations:
+                target_location = locations[absolute_uri]
+            else:
+                target_location = embed(absolute_uri)
+            rewritten_refs[ref_pointer] = _ref_to(target_location.joined(Pointer.from_string(fragment or "")))
+
+        index = PointerIndex(document)
+        for ref_pointer, rewritten_ref in rewritten_refs.items():
+            index.follow_pointer(ref_pointer)[ref_key] = rewritten_ref  # type: ignore[index]
+
+    # refs are fragments of the bundle now, ids would only change the base uri they are resolved against
+    for document, pointers in id_pointers:
+        index = PointerIndex(document)
+        for id_pointer in pointers:
+            index.follow_pointer(id_pointer).pop(id_key)  # type: ignore[union-attr]
+
+    if not definitions:
+        root.pop("definitions")
+    return root
+
+
+def write_bundle(path: Path | str, schema: SchemaType, retriever: Retriever | None = None, base_uri: str | None = None):
+    """Bundle the schema and write it as compact json"""
+    bundled = bundle(schema, retriever=retriever, base_uri=base_uri)
+    Path(path).write_text(json.dumps(bundled, separators=(",", ":")))
+
+
+def load_bundle(path: Path | str) -> SchemaType:
+    """Load a bundle written by `write_bundle`, a single file read without any retrieval"""
+    return json.loads(Path(path).read_text())
@@ -1,22 +1,22 @@
 # TODO base uri changesobjects_with_id
-import json
+from functools import lru_cache
 from logging import getLogger
-from pathlib import Path
 from typing import Iterable
 from urllib.parse import ParseResult, urldefrag, urljoin, urlparse
-from urllib.request import url2pathname
 
-import requests
 from dataformats.jsonschema.custom_types import (
     JsonType,
     SchemaType,
 )
-from dataformats.jsonschema.json_pointer import Pointer
+from dataformats.jsonschema.json_pointer import Pointer, PointerIndex
 from dataformats.jsonschema.mixins.schema_parsing import (
+    URI_CACHE_SIZE,
     absolute_id_map,
+    normalize,
     ref_map,
 )
-from rfc3986 import URIReference
+from dataformats.jsonschema.protocols import Retriever
+from dataformats.jsonschema.retrievers import default_retriever
 
 logger = getLogger("dereference")
 
@@ -69,8 +69,13 @@ logger = getLogger("dereference")
 #     return None, scopes[0]
 
 
+@lru_cache(maxsize=URI_CACHE_SIZE)
 def analyze_ref(ref: str, base_uri: str | None) -> tuple[str | None, str | None]:
-    normalized_uri = URIReference.from_string(ref).normalize().unsplit()
+    """Split a ref in the absolute uri of the document it refers to and the fragment within that document
+
+    Memoized on (ref, base_uri), the same refs are analyzed over and over for every schema they appear in.
+    """
+    normalized_uri = normalize(ref)
     uri_parts: ParseResult = urlparse(normalized_uri)
 
     is_absolute = uri_parts.scheme or uri_parts.hostname
@@ -82,27 +87,29 @@ def analyze_ref(ref: str, base_uri: str | None) -> tuple[str | None, str | None]
     elif is_relative:
         if base_uri:
             absolute_uri = urljoin(f"{base_uri}/", f"../{uri_parts.path}")
+    elif base_uri:
+        absolute_uri = base_uri  # fragment only, the ref points into the document of the base uri
     if absolute_uri:
         absolute_uri, _ = urldefrag(absolute_uri)
 
     return absolute_uri, uri_parts.fragment
 
 
-# TODO split up and park in a better place
-def retrieve_schema(uri, download: bool) -> SchemaType:
+def retrieve_schema(uri, download: bool, retriever: Retriever | None = None) -> SchemaType:
+    """Retrieve the schema document behind an absolute uri
+
+    Args:
+        uri: Absolute uri of the document
+        download: When False remote (http) documents are not retrieved and an empty schema is returned instead
+        retriever: Backend to retrieve the document with, defaults to the shared file/http retriever
+    """
     uri_parts: ParseResult = urlparse(uri)
     logger.debug(f"{uri_parts=}")
-    if uri_parts.scheme == "file":
-        return json.loads(Path(url2pathname(uri_parts.path)).read_text())
-    elif uri_parts.scheme.startswith("http"):
-        if download:
-            response = requests.get(uri)
-            response.raise_for_status()
-            return response.json()
-        else:
-            return {}
-    else:
-        raise ValueError(f"Encountered a ref with a unsupported scheme ({uri_parts.scheme})")
+    if retriever is None:
+        retriever = default_retriever
+    if uri_parts.scheme.startswith("http") and not download:
+        return {}
+    return retriever.retrieve(uri)
 
 
 # def get_target_ref_for(*, ref: str, scopes: SchemaArray, download: bool, id_key) -> SchemaType:
@@ -217,27 +224,48 @@ def replace_schema_in_place(old_schema: SchemaType, new_schema: SchemaType):
 ###############
 ## ATTEMPT 3 ##
 ###############
-def get_target_for_ref(top_level_schema: SchemaType, ref: str, ref_pointer: Pointer, absolute_ids: dict[Pointer, str], download: bool) -> SchemaType:
+def base_uri_for_ref(ref: str, ref_pointer: Pointer, absolute_ids: dict[Pointer, str]) -> str:
+    """The absolute id of the nearest parent of the ref, which is the base uri the ref is resolved against"""
     parent_pointers: list[Pointer] = [x for x in absolute_ids.keys() if ref_pointer.is_child_of(x)]
     parent_pointers.sort(key=len)
     if not parent_pointers:
         raise ValueError(f"Cannot determine the base uri of ref {ref=} because it has no parents with id key specified")
-    ref_base_uri = absolute_ids[parent_pointers[-1]]
+    return absolute_ids[parent_pointers[-1]]
+
+
+def get_target_for_ref(
+    top_level_schema: SchemaType,
+    ref: str,
+    ref_pointer: Pointer,
+    absolute_ids: dict[Pointer, str],
+    download: bool,
+    retriever: Retriever | None = None,
+    index: PointerIndex | None = None,
+    id_pointers: dict[str, Pointer] | None = None,
+) -> SchemaType:
+    if index is None:
+        index = PointerIndex(top_level_schema)
+    if id_pointers is None:
+        id_pointers = {id_val: pointer for pointer, id_val in absolute_ids.items()}
+    ref_base_uri = base_uri_for_ref(ref, ref_pointer, absolute_ids)
 
-    absolute_id_to_schema: dict[str, JsonType] = {id_val: pointer.follow_pointer(top_level_schema) for pointer, id_val in absolute_ids.items()}
     absolute_uri, fragment = analyze_ref(ref, ref_base_uri)
     if absolute_uri is None:
         raise RuntimeError("You should have an absolute uri here")
-    if absolute_uri in absolute_ids.values():
-        target_schema = absolute_id_to_schema[absolute_uri]
+    if absolute_uri in id_pointers:
+        # within this document, the index resolves the fragment without descending from the root again
+        target_pointer = id_pointers[absolute_uri]
+        if fragment:
+            target_pointer = target_pointer.joined(Pointer.from_string(fragment))
+        resolved_pointer = index.follow_pointer(target_pointer)
     else:
-        target_schema = retrieve_schema(absolute_uri, download=download)
-        dereference(schema=target_schema, download=download)  # TODO two or more schemas referencing eachother bounce infinitely # TODO more parms from dereference
+        target_schema = retrieve_schema(absolute_uri, download=download, retriever=retriever)
+        dereference(schema=target_schema, download=download, retriever=retriever)  # TODO two or more schemas referencing eachother bounce infinitely # TODO more parms from dereference
 
-    if fragment:
-        resolved_pointer = Pointer.from_string(fragment).follow_pointer(target_schema)
-    else:
-        resolved_pointer = target_schema
+        if fragment:
+            resolved_pointer = Pointer.from_string(fragment).follow_pointer(target_schema)
+        else:
+            resolved_pointer = target_schema
 
     if not isinstance(resolved_pointer, dict):
         raise ValueError("Ref is not a schema ")
@@ -254,24 +282,37 @@ def dereference(
     id_key: str = "id",
     ref_key: str = "$ref",
     exclude: Iterable[str] = ("enum", "default"),
+    retriever: Retriever | None = None,
 ):
 
     if absolute_ids is None:
         absolute_ids = absolute_id_map(schema, id_key=id_key)
+    id_pointers = {id_val: pointer for pointer, id_val in absolute_ids.items()}
+    index = PointerIndex(schema)
 
     refs = ref_map(schema, ref_key=ref_key, exclude=exclude)
-    while refs and (ref_pointer := next(iter(refs))):
-        ref: str = refs[ref_pointer]  # type: ignore
-        target_schema = get_target_for_ref(top_level_schema=schema, ref=ref, ref_pointer=ref_pointer, absolute_ids=absolute_ids, download=download)
+    while refs:
+        ref_pointer = next(iter(refs))
+        ref: str = refs.pop(ref_pointer)  # type: ignore
+        target_schema = get_target_for_ref(
+            top_level_schema=schema,
+            ref=ref,
+            ref_pointer=ref_pointer,
+            absolute_ids=absolute_ids,
+            download=download,
+            retriever=retriever,
+            index=index,
+            id_pointers=id_pointers,
+        )
 
 
         # in place replacement for $ref at top level
         if len(ref_pointer) == 0:
             replace_schema_in_place(schema, target_schema)
-            dereference(schema=schema, download=download)  # ugly :(
+            dereference(schema=schema, download=download, retriever=retriever)  # ugly :(
             return
 
-        ref_parent = ref_pointer.parent.follow_pointer(schema)
+        ref_parent = index.follow_pointer(ref_pointer.parent)
         key_or_index = ref_pointer.parts[-1]
         if isinstance(ref_parent, list):
             ref_parent[int(key_or_index)] = target_schema
@@ -279,3 +320,4 @@ def dereference(
             ref_parent[key_or_index] = target_schema
         else:
             raise RuntimeError(f"ref parent is not a container type {ref_parent=} {key_or_index=}")
+        index.replace(ref_pointer, target_schema)
@@ -0,0 +1,90 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from logging import getLogger
+from urllib.parse import urldefrag
+
+from dataformats.jsonschema.custom_types import SchemaType
+from dataformats.jsonschema.mixins.dereference_mixin import (
+    analyze_ref,
+    base_uri_for_ref,
+)
+from dataformats.jsonschema.mixins.schema_parsing import absolute_id_map, ref_map
+from dataformats.jsonschema.protocols import Retriever
+from dataformats.jsonschema.retrievers import MemoryRetriever, default_retriever
+
+logger = getLogger("prefetch")
+
+
+def remote_uris(schema: SchemaType, base_uri: str | None = None, id_key="id", ref_key="$ref") -> set[str]:
+    """Find the documents referenced by the given schema that are not contained in the schema itself
+
+    Args:
+        schema: The schema to scan for refs
+        base_uri: Uri the schema was retrieved from, used when the schema has no id of its own
+
+    Returns:
+        The absolute uris (without fragment) of the referenced documents
+    """
+    if base_uri is not None and not isinstance(schema.get(id_key), str):
+        schema = {**schema, id_key: base_uri}
+    absolute_ids = absolute_id_map(schema, id_key=id_key)
+    local_uris = {urldefrag(absolute_id)[0] for absolute_id in absolute_ids.values()}
+
+    uris = set()
+    for ref_pointer, ref in ref_map(schema, ref_key=ref_key).items():
+        try:
+            ref_base_uri: str | None = base_uri_for_ref(ref, ref_pointer, absolute_ids)  # type: ignore
+        except ValueError:
+            ref_base_uri = None  # only absolute refs can be prefetched
+        absolute_uri, _ = analyze_ref(ref, ref_base_uri)  # type: ignore
+        if absolute_uri is not None and absolute_uri not in local_uris:
+            uris.add(absolute_uri)
+    return uris
+
+
+def prefetch(
+    schema: SchemaType,
+    retriever: Retriever | None = None,
+    max_workers: int = 8,
+    base_uri: str | None = None,
+) -> MemoryRetriever:
+    """Concurrently retrieve every document the schema references, directly or through other retrieved documents
+
+    Every uri is requested once, at most `max_workers` requests are in flight at the same time. The returned retriever
+    serves the retrieved documents from memory and falls back on the given retriever, so it can be passed on to
+    `dereference` to resolve the schema without any further round trips.
+
+    Args:
+        schema: The schema to prefetch the remote refs for
+        retriever: Backend used to retrieve the documents, defaults to the shared file/http retriever
+        max_workers: Maximum amount of concurrent retrievals
+        base_uri: Uri the schema was retrieved from, used when the schema has no id of its own
+    """
+    if retriever is None:
+        retriever = default_retriever
+    prefetched = MemoryRetriever(fallback=retriever)
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch") as executor:
+        in_flight: dict[Future, str] = {}
+        seen: set[str] = set()
+
+        def submit_unseen(uris: set[str]):
+            for uri in uris - seen:
+                seen.add(uri)
+                in_flight[executor.submit(retriever.retrieve, uri)] = uri  # type: ignore[union-attr]
+
+        submit_unseen(remote_uris(schema, base_uri=base_uri))
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                uri = in_flight.pop(future)
+                try:
+                    document = future.result()
+                except Exception:
+                    for pending in in_flight:
+                        pending.cancel()
+                    raise
+                logger.debug(f"Prefetched {uri}")
+                prefetched.add(uri, document)
+                submit_unseen(remote_uris(document, base_uri=uri))
+
+    return prefetched
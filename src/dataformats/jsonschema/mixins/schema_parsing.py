@@ -1,4 +1,5 @@
 import logging
+from functools import lru_cache
 from urllib.parse import ParseResult, urldefrag, urljoin, urlparse
 
 from dataformats.jsonschema.custom_types import JsonType, SchemaType
@@ -10,6 +11,9 @@ from rfc3986 import URIReference
 
 logger = logging.getLogger()
 
+# bound for the memoized uri helpers, refs and ids repeat a lot within (and across) schemas
+URI_CACHE_SIZE = 4096
+
 
 def find_schemas(schema: SchemaType) -> dict[Pointer, SchemaType]:
     """Find schemas in the given json object, this function assumes that the given json object is a schema
@@ -40,11 +44,13 @@ def find_parent_pointers(current_pointer: Pointer, pointers: list[Pointer]):
         if current_pointer.is_child_of(pointer):
             yield pointer
 
+@lru_cache(maxsize=URI_CACHE_SIZE)
 def normalize(uri: str, defrag=False):
     if defrag:
         uri, _ = urldefrag(uri)
     return URIReference.from_string(uri).normalize().unsplit()
 
+@lru_cache(maxsize=URI_CACHE_SIZE)
 def is_absolute(uri: str):
     normalized_uri = normalize(uri, defrag=True)
     uri_parts: ParseResult = urlparse(normalized_uri)
@@ -52,6 +58,11 @@ def is_absolute(uri: str):
     is_absolute = uri_parts.scheme or uri_parts.hostname
     return is_absolute
 
+@lru_cache(maxsize=URI_CACHE_SIZE)
+def join_relative_id(parent_id: str, relative_id: str) -> str:
+    """Resolve a relative id against the id of its parent"""
+    return urljoin(f"{normalize(parent_id, defrag=True)}/", f"../{normalize(relative_id, defrag=True)}")
+
 
 def absolute_id_map(root_object: SchemaType, id_key="id") -> dict[Pointer, str]:
     """Find absolute ids for the given object
@@ -77,7 +88,7 @@ def absolute_id_map(root_object: SchemaType, id_key="id") -> dict[Pointer, str]:
             parent_pointer = parents.pop(0)
             parent_id = pointer_id_map[parent_pointer]
 
-            new_id = urljoin(f"{normalize(parent_id, defrag=True)}/", f"../{normalize(new_id, defrag=True)}")
+            new_id = join_relative_id(parent_id, new_id)
 
         pointer_absolute_id_map[pointer] = new_id
     return pointer_absolute_id_map
@@ -2,33 +2,40 @@ import json
 import logging
 import re
 from collections import defaultdict
-from datetime import datetime
+from collections.abc import Iterator, Mapping
+from functools import lru_cache
 from math import isclose
-from typing import Any, Tuple
-
+from typing import TYPE_CHECKING, Any, Callable, Generator, NamedTuple, Tuple
+
+from dataformats.jsonschema.budget import (
+    BudgetTracker,
+    ValidationBudget,
+    ValidationBudgetExceeded,
+    active_budget,
+    check_pattern_input,
+)
 from dataformats.jsonschema.custom_types import (
     JsonType,
     Number,
     SchemaArray,
     SchemaDict,
+    SchemaType,
     SimpleTypeString,
     json_to_python_type,
 )
-from dataformats.jsonschema.format import (
-    email_pattern,
-    hostname_pattern,
-    ipv4_pattern,
-    ipv6_pattern,
-)
-from dataformats.jsonschema.json_pointer import Pointer
-from dataformats.jsonschema.mixins.dereference_mixin import (
-    derefence_from_above,
-    dereference,
-)
-from rfc3986 import is_valid_uri
+from dataformats.jsonschema.format import FormatChecker, format_registry
+from dataformats.jsonschema.hashing import IdentityCache
+from dataformats.jsonschema.json_pointer import Location, Pointer, materialize
+
+if TYPE_CHECKING:
+    from dataformats.jsonschema.interning import SchemaInterner
 
 logger = logging.getLogger(__name__)
 
+# shared schemas for the implicit defaults, so their compiled validators are shared as well
+ALWAYS_VALID: SchemaDict = {}
+NEVER_VALID: SchemaDict = {"not": ALWAYS_VALID}
+
 
 class MultipleValidationErrors(ValueError):
     def __init__(self, *args, errors: dict[str, list[ValueError]], json_pointer: str):
@@ -91,8 +98,107 @@ def retieve_and_check_type(container: Any, name: str, types: Tuple[SimpleTypeStr
     return value
 
 
+CheckType = Callable[..., Any]
+ValidationErrors = dict[str, list[ValueError | MultipleValidationErrors]]
+# subschema validations requested by a check, the errors of each are sent back into the check
+ValidationSteps = Generator[tuple["Draft4Validator", Any, Location], ValidationErrors, None]
+
+# nesting of subschema validations at which validation is aborted, independent of the interpreter's recursion limit
+MAX_VALIDATION_DEPTH = 10_000
+
+
+class ValidationDepthError(ValidationBudgetExceeded, RecursionError):
+    """Subschema validations are nested deeper than the configured maximum depth"""
+
+
+def flatten_errors(errors: ValidationErrors, location: str = "") -> list[tuple[str, str]]:
+    """The innermost errors as (json pointer, message) pairs, for reporting outside of python
+
+    Errors that are not keyed by a location ("non lazy") are reported at the location of their parent.
+    """
+    flat = []
+    for key, exceptions in errors.items():
+        key_location = location if key == "non lazy" else key
+        for exception in exceptions:
+            if isinstance(exception, MultipleValidationErrors) and exception.errors:
+                flat.extend(flatten_errors(exception.errors, key_location))  # type: ignore[arg-type]
+            else:
+                flat.append((key_location, str(exception)))
+    return flat
+
+
+class ValidationPlan(NamedTuple):
+    """Checks for the keywords present in a schema by the type of instance they apply to, each with a flag telling
+    whether the check validates subschemas (and yields them as `ValidationSteps`)"""
+
+    any: tuple[tuple[CheckType, bool], ...]
+    object: tuple[tuple[CheckType, bool], ...]
+    array: tuple[tuple[CheckType, bool], ...]
+    string: tuple[tuple[CheckType, bool], ...]
+    number: tuple[tuple[CheckType, bool], ...]
+
+
+# (keywords, check, validates subschemas) in the order they are checked, a check only applies when any keyword is present
+CHECKS_BY_INSTANCE_TYPE: dict[str, tuple[tuple[tuple[str, ...], str, bool], ...]] = {
+    "any": (
+        (("type",), "check_type", False),
+        (("enum",), "check_enum", False),
+        (("allOf",), "check_allOf", True),
+        (("anyOf",), "check_anyOf", True),
+        (("oneOf",), "check_oneOf", True),
+        (("not",), "check_not", True),
+    ),
+    "object": (
+        (("maxProperties",), "check_maxProperties", False),
+        (("minProperties",), "check_minProperties", False),
+        (("required",), "check_required", False),
+        (("dependencies",), "check_dependencies", True),
+        (("properties", "patternProperties", "additionalProperties"), "check_object_container_checks", True),
+    ),
+    "array": (
+        (("items", "additionalItems"), "check_array_container_checks", True),
+        (("uniqueItems",), "check_uniqueItems", False),
+        (("minItems",), "check_minItems", False),
+        (("maxItems",), "check_maxItems", False),
+    ),
+    "string": (
+        (("maxLength",), "check_maxLength", False),
+        (("minLength",), "check_minLength", False),
+        (("pattern",), "check_pattern", False),
+        (("format",), "check_format", False),
+    ),
+    "number": (
+        (("multipleOf",), "check_multipleOf", False),
+        (("minimum",), "check_minimum", False),
+        (("maximum",), "check_maximum", False),
+    ),
+}
+
+
+@lru_cache(maxsize=None)
+def validation_plan(validator_class: type, keywords: frozenset[str]) -> ValidationPlan:
+    """The plan for a set of present keywords, shared by every schema with the same keywords"""
+    return ValidationPlan(
+        **{
+            instance_type: tuple(
+                (getattr(validator_class, check_name), takes_location)
+                for check_keywords, check_name, takes_location in checks
+                if not keywords.isdisjoint(check_keywords)
+            )
+            for instance_type, checks in CHECKS_BY_INSTANCE_TYPE.items()
+        }
+    )
+
+
 # class Draft4Validator(Draft4Dict):  # for better type hints during development
-class Draft4Validator(dict):
+class Draft4Validator(Mapping):
+    """Compiled schema node
+
+    A read-only mapping of the keywords present in the schema. The checks that apply are selected once, when the node
+    is compiled, keywords that are absent are never looked at during validation.
+    """
+
+    __slots__ = ("_keywords", "_location", "_interner", "_subvalidators", "_plan", "_format_checker")
     __all_keywords__ = (
         "id",
         "$schema",
@@ -130,38 +236,60 @@ class Draft4Validator(dict):
         "$ref",
     )
 
-    def __init__(self, /, __pointer__=None, **kwargs):
-
-
-
-
+    def __init__(self, /, __pointer__: Location | None = None, __interner__: "SchemaInterner | None" = None, **kwargs):
         if __pointer__ is None:
             __pointer__ = Pointer()
-        self.pointer = __pointer__
+        self._location = __pointer__
+        self._interner = __interner__
+        self._subvalidators: IdentityCache[Draft4Validator] | None = None
+        self._keywords: SchemaDict = kwargs
+        self._plan = validation_plan(type(self), frozenset(kwargs))
+        self._format_checker: FormatChecker | None = (
+            format_registry.get(kwargs["format"]) if isinstance(kwargs.get("format"), str) else None
+        )
+
+    def __getitem__(self, keyword: str) -> Any:
+        return self._keywords[keyword]
 
-        # derefence_from_above(current_scope=kwargs, id_key="id", ref_key="$ref", download=True, tracking_pointer=self.pointer)
-        dereference(schema=self, download=True)
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keywords)
 
-        for kw in self.__all_keywords__:
-            kwargs.setdefault(kw, None)
+    def __len__(self) -> int:
+        return len(self._keywords)
 
+    @property
+    def pointer(self) -> Pointer:
+        """Location of this schema, only materialized into a Pointer when it is needed (e.g. to report an error)"""
+        if not isinstance(self._location, Pointer):
+            self._location = materialize(self._location)
+        return self._location
 
-        super().__init__(**kwargs)
+    def subvalidator(self, schema: SchemaType) -> "Draft4Validator":
+        """Compiled validator for a subschema, built on first use and reused afterwards
 
-    def _filtered(self) -> dict:
-        return {key: value for key, value in self.items() if value is not None}
+        A subvalidator is shared by every location its schema is used at, so the location is passed to `validate`
+        instead of being stored on the subvalidator. With an interner, structurally identical subschemas share a single
+        subvalidator across all schemas of the interner.
+        """
+        if self._interner is not None:
+            return self._interner.validator(schema)
+        if self._subvalidators is None:
+            self._subvalidators = IdentityCache()
+        elif (cached := self._subvalidators.get(id(schema))) is not None:
+            return cached[1]
+        return self._subvalidators.store(schema, Draft4Validator(**schema))
 
     def __repr__(self):
-        return repr(self._filtered())
+        return repr(self._keywords)
 
     def __str__(self):
-        return str(self._filtered())
+        return str(self._keywords)
 
     # keywords by general instance type
 
     # number
     def check_multipleOf(self, value: Number):
-        if (multipleOf := self["multipleOf"]) is None:
+        if (multipleOf := self._keywords.get("multipleOf")) is None:
             return
         if multipleOf < 0:
             raise ValueError(f"Value must be greater than 0 (is {value})")
@@ -171,12 +299,12 @@ class Draft4Validator(dict):
             raise ValueError(f"Value is not a multiple of {multipleOf} ({value=})")
 
     def check_maximum(self, value: Number):
-        if (maximum := self["maximum"]) is None:
+        if (maximum := self._keywords.get("maximum")) is None:
             return
         either_is_float = isinstance(value, float) or isinstance(maximum, float)
         float_almost_equal = isclose(value, maximum)
 
-        if self["exclusiveMaximum"]:
+        if self._keywords.get("exclusiveMaximum"):
             if value >= maximum or (either_is_float and float_almost_equal):
                 raise ValueError(f"Value is greater than the (exclusive) maximum ({value} >= {maximum})")
         else:
@@ -184,11 +312,11 @@ class Draft4Validator(dict):
                 raise ValueError(f"Value is greater than the maximum ({value} > {maximum})")
 
     def check_minimum(self, value: Number):
-        if (minimum := self["minimum"]) is None:
+        if (minimum := self._keywords.get("minimum")) is None:
             return
         either_is_float = isinstance(value, float) or isinstance(minimum, float)
         float_almost_equal = isclose(value, minimum)
-        if self["exclusiveMinimum"]:
+        if self._keywords.get("exclusiveMinimum"):
             if value <= minimum or (either_is_float and float_almost_equal):
                 raise ValueError(f"Value is smaller than the (exclusive) minimum ({value} <= {minimum})")
         else:
@@ -197,25 +325,30 @@ class Draft4Validator(dict):
 
     # string
     def check_maxLength(self, value: str):
-        if self["maxLength"] is not None and len(value) > self["maxLength"]:
+        if (maxLength := self._keywords.get("maxLength")) is not None and len(value) > maxLength:
             raise ValueError(f"Value is too long {self['maxLength']=} {len(value)=}")
 
     def check_minLength(self, value: str):
-        if self["minLength"] is not None and len(value) < self["minLength"]:
+        if (minLength := self._keywords.get("minLength")) is not None and len(value) < minLength:
             raise ValueError(f"Value is too short {self['minLength']=} {len(value)=}")
 
     def check_pattern(self, value: str):
-        if self["pattern"] is not None and not re.search(self["pattern"], value):
+        if (pattern := self._keywords.get("pattern")) is None:
+            return
+        check_pattern_input(value)
+        if not re.search(pattern, value):
             raise ValueError(f"Value does not match the given pattern {value=}  {self['pattern']=}")
 
     # array types # TODO further split up
-    def check_array_container_checks(self, array: list[Any]):
-        additionalItems = self["additionalItems"]
+    def check_array_container_checks(self, array: list[Any], location: Location | None = None) -> ValidationSteps:
+        location = self._location if location is None else location
+        additionalItems = self._keywords.get("additionalItems")
         if additionalItems is None or additionalItems is True:
-            additionalItems = {}
+            additionalItems = ALWAYS_VALID
         elif additionalItems is False:
-            additionalItems = {"not": {}}  # fails against all
-        items = {} if self["items"] is None else self["items"]
+            additionalItems = NEVER_VALID  # fails against all
+        if (items := self._keywords.get("items")) is None:
+            items = ALWAYS_VALID
 
         if items is {} or additionalItems is {}:
             return  # These config options always yield a valid result
@@ -224,37 +357,37 @@ class Draft4Validator(dict):
         items_is_schema = isinstance(items, dict)
         items_is_list_of_schemas = isinstance(items, list)
 
-        if items_is_list_of_schemas and self["additionalItems"] is False and len(array) > len(items):
+        if items_is_list_of_schemas and self._keywords.get("additionalItems") is False and len(array) > len(items):
             msg = f"Array is larger ({len(array)=}) than the amount of items specified in the schema ({len(items)}"
             raise ValueError(msg)
 
         for idx, array_subitem in enumerate(array):
-            pointer = self.pointer.extended_copy(str(idx))
-
             if items_is_schema:
-                schema_for_idx = Draft4Validator(pointer, **items)
+                schema_for_idx = self.subvalidator(items)
             elif idx < len(items):
-                schema_for_idx = Draft4Validator(pointer, **items[idx])
+                schema_for_idx = self.subvalidator(items[idx])
             else:
-                schema_for_idx = Draft4Validator(pointer, **additionalItems)
+                schema_for_idx = self.subvalidator(additionalItems)
 
-            errors = schema_for_idx.validate(array_subitem)
+            errors = yield schema_for_idx, array_subitem, (location, str(idx))
             if errors:
                 for key, exceptions in errors.items():
                     subitem_errors[key].extend(exceptions)
         if subitem_errors:
-            raise MultipleValidationErrors("Array container check failed", errors=errors, json_pointer=self.pointer)
+            raise MultipleValidationErrors(
+                "Array container check failed", errors=errors, json_pointer=str(materialize(location))
+            )
 
     def check_maxItems(self, array: list[Any]):
-        if self["maxItems"] is not None and len(array) > self["maxItems"]:
+        if (maxItems := self._keywords.get("maxItems")) is not None and len(array) > maxItems:
             raise ValueError(f"Array contains more than the maximum amount of items {self['maxItems']=} {len(array)=}")
 
     def check_minItems(self, array: list[Any]):
-        if self["minItems"] is not None and len(array) < self["minItems"]:
+        if (minItems := self._keywords.get("minItems")) is not None and len(array) < minItems:
             raise ValueError(f"Array contains less than the minimum amount of items {self['minItems']=} {len(array)=}")
 
     def check_uniqueItems(self, array: list[Any]):
-        if self["uniqueItems"] is not True:
+        if self._keywords.get("uniqueItems") is not True:
             return
         jsonified_items = [json.dumps(item, sort_keys=True) for item in array]
         seen = set()
@@ -268,52 +401,66 @@ class Draft4Validator(dict):
 
     # object types
     def check_maxProperties(self, dict_object: dict[str, Any]):
-        if self["maxProperties"] is not None and (n_properties := len(dict_object)) > self["maxProperties"]:
+        if (maxProperties := self._keywords.get("maxProperties")) is not None and (n_properties := len(dict_object)) > maxProperties:
             raise ValueError(f"Object exceeds maximum properties values {n_properties=} {self['maxProperties']=}")
 
     def check_minProperties(self, dict_object: dict[str, Any]):
-        if self["minProperties"] is not None and (n_properties := len(dict_object)) < self["minProperties"]:
+        if (minProperties := self._keywords.get("minProperties")) is not None and (n_properties := len(dict_object)) < minProperties:
             raise ValueError(f"Object exceeds maximum properties values {n_properties=} {self['minProperties']=}")
 
     def check_required(self, dict_object: dict[str, Any]):
-        if self["required"] is None:
+        if (required := self._keywords.get("required")) is None:
             return
         object_keys = set(dict_object.keys())
-        required_keys = set(self["required"])
+        required_keys = set(required)
         missing_keys = required_keys - object_keys
         if missing_keys:
             raise ValueError(f"Object misses the following required keys: {missing_keys}")
 
-    def check_object_container_checks(self, dict_object: dict[str, Any]):
-        properties: SchemaDict = {} if self["properties"] is None else self["properties"]
-        patternProperties: SchemaDict = {} if self["patternProperties"] is None else self["patternProperties"]
-        additionalProperties: SchemaDict | bool = (
-            {} if self["additionalProperties"] is None else self["additionalProperties"]
-        )
-        if additionalProperties is True:
-            additionalProperties = {}
+    def declared_property_schemas(
+        self, object_key: str, properties: SchemaDict | None = None, patternProperties: SchemaDict | None = None
+    ) -> SchemaArray:
+        """The schemas of `properties` and `patternProperties` that apply to a property, empty for undeclared ones"""
+        if properties is None:
+            properties = self._keywords.get("properties") or ALWAYS_VALID
+        if patternProperties is None:
+            patternProperties = self._keywords.get("patternProperties") or ALWAYS_VALID
+        schemas: SchemaArray = []
+        if object_key in properties:
+            schemas.append(properties[object_key])
+        if patternProperties:
+            check_pattern_input(object_key)
+        for pattern, pattern_schema in patternProperties.items():
+            if re.search(pattern, object_key):
+                schemas.append(pattern_schema)
+        return schemas
+
+    def check_object_container_checks(self, dict_object: dict[str, Any], location: Location | None = None) -> ValidationSteps:
+        location = self._location if location is None else location
+        properties: SchemaDict = self._keywords.get("properties") or ALWAYS_VALID
+        patternProperties: SchemaDict = self._keywords.get("patternProperties") or ALWAYS_VALID
+        additionalProperties: SchemaDict | bool | None = self._keywords.get("additionalProperties")
+        if additionalProperties is None or additionalProperties is True:
+            additionalProperties = ALWAYS_VALID
 
         for object_key, object_value in dict_object.items():
-            schemas_for_child: SchemaArray = []
-            # step 1: add schema from properties
-            if object_key in properties:
-                schemas_for_child.append(properties[object_key])
-            # step 2: add schemas from patternProperties
-            for pattern, pattern_schema in patternProperties.items():
-                if re.search(pattern, object_key):
-                    schemas_for_child.append(pattern_schema)
+            # step 1 and 2: add schemas from properties and patternProperties
+            if patternProperties:
+                schemas_for_child = self.declared_property_schemas(object_key, properties, patternProperties)
+            else:  # the common case, without a call
+                schemas_for_child = [properties[object_key]] if object_key in properties else []
 
             # step 3: add schema from additionalProperties (if and only if no schemas found so far)
             if len(schemas_for_child) == 0 and additionalProperties is not None and additionalProperties is not False:
                 schemas_for_child.append(additionalProperties)
 
             if not schemas_for_child:
-                raise ValueError(f"No suitable schemas found for suitable{self.pointer}/{object_key}")
+                raise ValueError(f"No suitable schemas found for suitable{materialize(location)}/{object_key}")
 
             errors: dict[str, list[ValueError | MultipleValidationErrors]] = defaultdict(list)
             for schema_dict in schemas_for_child:
-                schema_for_child = Draft4Validator(self.pointer.extended_copy(object_key), **schema_dict)
-                child_errors = schema_for_child.validate(object_value)
+                schema_for_child = self.subvalidator(schema_dict)
+                child_errors = yield schema_for_child, object_value, (location, object_key)
 
                 if not child_errors:
                     continue
@@ -321,23 +468,24 @@ class Draft4Validator(dict):
                 mve = MultipleValidationErrors(
                     f"Property {object_key} could not be validated against schema in exception note",
                     errors=child_errors,
-                    json_pointer=str(self.pointer.extended_copy(object_key)),
+                    json_pointer=str(materialize(location).extended_copy(object_key)),
                 )
                 mve.add_note(f"Schema: {schema_for_child}")
-                errors[str(self.pointer.extended_copy(object_key))].append(mve)
+                errors[str(materialize(location).extended_copy(object_key))].append(mve)
 
             if errors:
                 raise MultipleValidationErrors(
                     f"Could not match a valid schema for {object_key}",
                     errors=errors,
-                    json_pointer=str(self.pointer.extended_copy(object_key)),
+                    json_pointer=str(materialize(location).extended_copy(object_key)),
                 )
 
-    def check_dependencies(self, dict_object: dict[str, Any]):
-        if self["dependencies"] is None:
+    def check_dependencies(self, dict_object: dict[str, Any], location: Location | None = None) -> ValidationSteps:
+        if (dependencies := self._keywords.get("dependencies")) is None:
             return
+        location = self._location if location is None else location
         exceptions = defaultdict(list)
-        for dependency, dependency_value in self["dependencies"].items():
+        for dependency, dependency_value in dependencies.items():
             if dependency not in dict_object:
                 continue  # nothing to check against
 
@@ -348,10 +496,8 @@ class Draft4Validator(dict):
                             ValueError(f"Missing key {dependant_field} as dependency for {dependency}")
                         )
             elif isinstance(dependency_value, dict):
-                dependency_schema = Draft4Validator(
-                    self.pointer.extended_copy("dependencies"), **dependency_value
-                )
-                errors = dependency_schema.validate(dict_object)
+                dependency_schema = self.subvalidator(dependency_value)
+                errors = yield dependency_schema, dict_object, (location, "dependencies")
                 if errors:
                     mve = MultipleValidationErrors(
                         f"Dependecy check for object key {dependency} failed",
@@ -364,12 +510,9 @@ class Draft4Validator(dict):
 
     # for any instance type
     def check_enum(self, value: Any):
-        try:
-            if self["enum"] is None:
-                return
-        except KeyError as e:
-            raise RuntimeError(self.pointer) from e
-        for enum_value in self["enum"]:
+        if (enum := self._keywords.get("enum")) is None:
+            return
+        for enum_value in enum:
             if type(enum_value) != type(value) and (isinstance(enum_value, bool) or isinstance(value, bool)):
                 # special case bool <> numeric
                 continue
@@ -387,9 +530,9 @@ class Draft4Validator(dict):
         raise ValueError(f"Value {value} is not one of the given enums {self['enum']}")
 
     def check_type(self, value: Any):
-        if self["type"] is None:
+        if (schema_type := self._keywords.get("type")) is None:
             return
-        types = [self["type"]] if isinstance(self["type"], str) else self["type"]
+        types = [schema_type] if isinstance(schema_type, str) else schema_type
 
         for valid_type in types:
             if valid_type == "null" and value is None:
@@ -403,14 +546,13 @@ class Draft4Validator(dict):
 
         raise ValueError(f"Type of value {value} is not one of {types}")
 
-    def check_allOf(self, any_obj: Any):
-        if self["allOf"] is None:
+    def check_allOf(self, any_obj: Any, location: Location | None = None) -> ValidationSteps:
+        if (allOf := self._keywords.get("allOf")) is None:
             return
+        location = self._location if location is None else location
         errors: dict[str, list[ValueError | MultipleValidationErrors]] = defaultdict(list)
-        for idx, schema in enumerate(self["allOf"]):
-            schema_errors = Draft4Validator(
-                self.pointer.extended_copy("allOf").extended_copy(str(idx)), **schema
-            ).validate(any_obj)
+        for idx, schema in enumerate(allOf):
+            schema_errors = yield self.subvalidator(schema), any_obj, ((location, "allOf"), str(idx))
             for schema_pointer, error_list in schema_errors.items():
                 errors[schema_pointer].extend(error_list)
         if errors:
@@ -418,14 +560,13 @@ class Draft4Validator(dict):
                 "Could not validate against schemas for the given allOf", errors=errors, json_pointer=""
             )
 
-    def check_anyOf(self, any_obj):
-        if self["anyOf"] is None:
+    def check_anyOf(self, any_obj, location: Location | None = None) -> ValidationSteps:
+        if (anyOf := self._keywords.get("anyOf")) is None:
             return
+        location = self._location if location is None else location
         errors: dict[str, list[ValueError | MultipleValidationErrors]] = defaultdict(list)
-        for idx, schema in enumerate(self["anyOf"]):
-            schema_errors = Draft4Validator(
-                self.pointer.extended_copy("anyOf").extended_copy(str(idx)), **schema
-            ).validate(any_obj)
+        for idx, schema in enumerate(anyOf):
+            schema_errors = yield self.subvalidator(schema), any_obj, ((location, "anyOf"), str(idx))
             if not schema_errors:
                 return  # and forget about all other errors
             else:
@@ -437,15 +578,14 @@ class Draft4Validator(dict):
                 "Could not validate against schemas for the given anyOf", errors=errors, json_pointer=""
             )
 
-    def check_oneOf(self, any_obj: Any):
-        if self["oneOf"] is None:
+    def check_oneOf(self, any_obj: Any, location: Location | None = None) -> ValidationSteps:
+        if (oneOf := self._keywords.get("oneOf")) is None:
             return
+        location = self._location if location is None else location
         valid_schemas: list[int] = []
         errors: dict[str, list[ValueError | MultipleValidationErrors]] = defaultdict(list)
-        for idx, schema in enumerate(self["oneOf"]):
-            schema_errors = Draft4Validator(
-                self.pointer.extended_copy("oneOf").extended_copy(str(idx)), **schema
-            ).validate(any_obj)
+        for idx, schema in enumerate(oneOf):
+            schema_errors = yield self.subvalidator(schema), any_obj, ((location, "oneOf"), str(idx))
 
             if not schema_errors:
                 valid_schemas.append(idx)
@@ -465,52 +605,25 @@ class Draft4Validator(dict):
                 f"Could not validate gainst the schema of the given oneOf, multiple schemas matched (at indices {valid_schemas})",
             )
 
-    def check_not(self, any_obj: Any):
-        if self["not"] is not None:
-            errors = Draft4Validator(self.pointer.extended_copy("not"), **self["not"]).validate(any_obj)
+    def check_not(self, any_obj: Any, location: Location | None = None) -> ValidationSteps:
+        if (not_schema := self._keywords.get("not")) is not None:
+            location = self._location if location is None else location
+            errors = yield self.subvalidator(not_schema), any_obj, (location, "not")
             if not errors:
                 raise ValueError("Validation for not keyword failed, instance is valid for the given schema")
 
     def check_format(self, value: str):
-        match (self["format"]):
-            case "date-time":
-                try:
-                    datetime.fromisoformat(value)
-                except ValueError as e:
-                    e.add_note(f"Value {value} is not a valid date-format string")
-                    raise
-            case "email":
-                if not email_pattern.match(value):
-                    raise ValueError(f"Value {value} is not a valid email string")
-            case "hostname":
-                if not hostname_pattern.match(value):
-                    raise ValueError(f"Value {value} is not a valid hostname string")
-            case "ipv4":
-                if not ipv4_pattern.match(value):
-                    raise ValueError(f"Value {value} is not a valid ipv4 formatted string")
-            case "ipv6":
-                if not ipv6_pattern.match(value):
-                    raise ValueError(f"Value {value} is not a valid ipv4 formatted string")
-            case "uri":
-                if not is_valid_uri(value):
-                    raise ValueError(f"Value {value} is not a valid uri")
-            case "regex":
-                try:
-                    _ = re.compile(value)
-                except re.error as e:
-                    e.add_note(f"Value {value} is not a valid regex pattern")
-            case None:
-                return
-            case _:
-                raise RuntimeError(f"Received an unsupported format keyword: {self['format']}")
+        # the checker is looked up in the format registry when the schema is compiled, unknown formats are not checked
+        if self._format_checker is not None and not self._format_checker(value):
+            raise ValueError(f"Value {value} is not a valid {self['format']} string")
 
     def check_metaschema(self, download_external: bool):
         # TODO fix recursion
-        if self["$schema"] and "http://json-schema.org/draft-04/schema" not in self["$schema"]:
-            metaschema = Draft4Validator(self.pointer.extended_copy("$schema"), **{"$ref": self["$schema"]})
+        if (schema_uri := self._keywords.get("$schema")) and "http://json-schema.org/draft-04/schema" not in schema_uri:
+            metaschema = Draft4Validator((self._location, "$schema"), **{"$ref": schema_uri})
         else:
-            metaschema = Draft4Validator(self.pointer.extended_copy("$schema"))
-        errors = metaschema.validate(self)
+            metaschema = Draft4Validator((self._location, "$schema"))
+        errors = metaschema.validate(dict(self))
         if errors:
             raise MultipleValidationErrors(
                 "The schema for validation is not valid against its own metaschema (set in $schema or draft4 when missing)",
@@ -518,57 +631,89 @@ class Draft4Validator(dict):
                 json_pointer="",
             )
 
-    def derefence(self):
-        if self.pointer != Pointer():
-            logger.info("No deref because not top level")
-            return  # only deref the top level
-        derefence_from_above(current_scope=self, id_key="id", ref_key="$ref", download=True, tracking_pointer=self.pointer)
+    def validation_steps(self, instance: Any, location: Location) -> Generator[Any, ValidationErrors, ValidationErrors]:
+        """Validate the instance against this schema, requesting subschema validations by yielding them
 
-    def validate(self, instance: Any) -> dict[str, list[ValueError | MultipleValidationErrors]]:
-        # logger.debug(f"Starting validation for '{str()}'")
-        # reentrant context manager which collects a single exception per `with` statement
+        Yields `(subvalidator, instance, location)` for every subschema validation, the errors of which should be sent
+        back. Returns the errors (empty when the instance is valid), see `validate`.
+        """
         error_collector = CatchErrorContext()
 
-        # self.derefence()
-
         # TODO find all exceptions before returning
+        plan = self._plan
         try:
             # Any types
             # self.check_metaschema(instance) # TODO fix recursion
-            self.check_type(instance)
-            self.check_enum(instance)
-            self.check_allOf(instance)
-            self.check_anyOf(instance)
-            self.check_oneOf(instance)
-            self.check_not(instance)
-
-            # object
+            for check, validates_subschemas in plan.any:
+                if validates_subschemas:
+                    yield from check(self, instance, location)
+                else:
+                    check(self, instance)
             if isinstance(instance, dict):
-                self.check_maxProperties(instance)
-                self.check_minProperties(instance)
-                self.check_required(instance)
-                self.check_dependencies(instance)
-                self.check_object_container_checks(instance)
-
-            # array
-            if isinstance(instance, list):
-                self.check_array_container_checks(instance)
-                self.check_uniqueItems(instance)
-                self.check_minItems(instance)
-                self.check_maxItems(instance)
-
-            # string
-            if isinstance(instance, str):
-                self.check_maxLength(instance)
-                self.check_minLength(instance)
-                self.check_pattern(instance)
-
-            # number
-            if isinstance(instance, (int, float)):
-                self.check_multipleOf(instance)
-                self.check_minimum(instance)
-                self.check_maximum(instance)
+                checks = plan.object
+            elif isinstance(instance, list):
+                checks = plan.array
+            elif isinstance(instance, str):
+                checks = plan.string
+            elif isinstance(instance, (int, float)):
+                checks = plan.number
+            else:
+                checks = ()
+            for check, validates_subschemas in checks:
+                if validates_subschemas:
+                    yield from check(self, instance, location)
+                else:
+                    check(self, instance)
         except ValueError as e:
             return {"non lazy": [e]}
 
         return error_collector.exceptions
+
+    def validate(
+        self,
+        instance: Any,
+        location: Location | None = None,
+        max_depth: int = MAX_VALIDATION_DEPTH,
+        budget: ValidationBudget | None = None,
+    ) -> ValidationErrors:
+        """Validate the instance against this schema
+
+        Subschema validations are run from an explicit stack instead of by recursion, so deeply nested instances are
+        only limited by `max_depth`.
+
+        Args:
+            instance: The instance to validate
+            location: Location of this schema used in the reported errors, defaults to the location it was created with
+            max_depth: Maximum nesting of subschema validations, `ValidationDepthError` is raised when exceeded
+            budget: Limits on the work done by this call, `ValidationBudgetExceeded` is raised when one is hit
+
+        Returns:
+            The errors by location, empty when the instance is valid
+        """
+        location = self._location if location is None else location
+        tracker = None if budget is None else BudgetTracker(budget, instance)
+        budget_token = active_budget.set(budget)
+        try:
+            stack = [self.validation_steps(instance, location)]
+            errors: ValidationErrors | None = None
+            while stack:
+                try:
+                    subvalidator, subinstance, sublocation = stack[-1].send(errors)  # type: ignore[arg-type]
+                except StopIteration as stop:
+                    stack.pop()
+                    if tracker is not None and stack:
+                        tracker.exit()
+                    errors = stop.value
+                    continue
+                if len(stack) >= max_depth:
+                    raise ValidationDepthError(
+                        f"Validation exceeded the maximum depth of {max_depth} at {materialize(sublocation)}",
+                        limit="max_depth",
+                    )
+                if tracker is not None:
+                    tracker.enter(subinstance, sublocation)
+                stack.append(subvalidator.validation_steps(subinstance, sublocation))
+                errors = None
+        finally:
+            active_budget.reset(budget_token)
+        return errors  # type: ignore[return-value]
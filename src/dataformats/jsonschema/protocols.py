@@ -1,10 +1,16 @@
 from typing import Any, Protocol
 
+from dataformats.jsonschema.custom_types import SchemaType
+
 
 class Validator(Protocol):
     def validate(self, value: Any) -> None:
         ...
 
+class Retriever(Protocol):
+    def retrieve(self, uri: str) -> SchemaType:
+        ...
+
 class VersionJsonSchema(Protocol):
     DRAFT_VERSION: str
 
@@ -0,0 +1,405 @@
+"""Static analysis of the regexes in schemas for catastrophic backtracking
+
+`pattern` and `patternProperties` are matched with the backtracking `re` engine, a pattern that can match the same
+input in exponentially many ways takes exponential time on a (hostile) input that almost matches. The analysis works on
+the parse tree of `re` and compares the characters each part of a pattern can start with against the characters that
+can follow it:
+
+- A repeat nested in another repeat is risky when it can match the characters that follow it, e.g. `(a+)+` or
+  `(\\w+\\s?)*`, the input can be split over the iterations of both repeats in many ways.
+- An alternation under a repeat is risky when alternatives can start with the same character, e.g. `(a|aa)+`.
+
+The analysis is conservative: it may report patterns that are safe in practice, but it does not miss these constructs.
+Simple cases can be rewritten into an equivalent possessive form (Python 3.11+), which the engine cannot backtrack into.
+"""
+
+import re
+from logging import getLogger
+from re import _constants as sre  # type: ignore[attr-defined]
+from re import _parser as sre_parse  # type: ignore[attr-defined]
+from typing import Any, Literal, NamedTuple
+
+from dataformats.jsonschema.custom_types import SchemaType
+from dataformats.jsonschema.json_pointer import Pointer
+
+logger = getLogger("regex_risk")
+
+ANY_CHAR = "any"  # stands for every character
+NON_ASCII = "non-ascii"  # stands for the non ascii characters of a category
+END = "end"  # end of the pattern
+
+# what compiling a schema does with its risky patterns, see `check_schema_patterns`
+RegexRiskMode = Literal["warn", "reject", "rewrite"]
+REGEX_RISK_MODES = ("warn", "reject", "rewrite")
+
+_CATEGORY_CHARS = {
+    sre.CATEGORY_DIGIT: frozenset([*"0123456789", NON_ASCII]),
+    sre.CATEGORY_SPACE: frozenset([*" \t\n\r\f\v\x1c\x1d\x1e\x1f", NON_ASCII]),
+    sre.CATEGORY_WORD: frozenset([*"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_", NON_ASCII]),
+}
+_CATEGORY_SOURCE = {
+    sre.CATEGORY_DIGIT: r"\d",
+    sre.CATEGORY_NOT_DIGIT: r"\D",
+    sre.CATEGORY_SPACE: r"\s",
+    sre.CATEGORY_NOT_SPACE: r"\S",
+    sre.CATEGORY_WORD: r"\w",
+    sre.CATEGORY_NOT_WORD: r"\W",
+}
+_AT_SOURCE = {
+    sre.AT_BEGINNING: "^",
+    sre.AT_BEGINNING_STRING: r"\A",
+    sre.AT_END: "$",
+    sre.AT_END_STRING: r"\Z",
+    sre.AT_BOUNDARY: r"\b",
+    sre.AT_NON_BOUNDARY: r"\B",
+}
+_MAX_RANGE = 256  # larger character ranges are treated as any character
+_SINGLE_CHARACTER = (sre.LITERAL, sre.NOT_LITERAL, sre.ANY, sre.IN)
+_REPEATS = (sre.MAX_REPEAT, sre.MIN_REPEAT, sre.POSSESSIVE_REPEAT)
+
+
+class RegexRisk(NamedTuple):
+    location: Pointer
+    pattern: str
+    reasons: tuple[str, ...]
+
+
+def _class_chars(items: list) -> frozenset[str]:
+    chars: set[str] = set()
+    for op, av in items:
+        if op is sre.LITERAL:
+            chars.add(chr(av))
+        elif op is sre.RANGE and av[1] - av[0] < _MAX_RANGE:
+            chars.update(chr(code) for code in range(av[0], av[1] + 1))
+        elif op is sre.CATEGORY and av in _CATEGORY_CHARS:
+            chars.update(_CATEGORY_CHARS[av])
+        else:
+            return frozenset([ANY_CHAR])  # negations, large ranges and negated categories
+    return frozenset(chars)
+
+
+def _item_first(op, av, strict: bool) -> tuple[frozenset[str], bool]:
+    """Characters an item can start with and whether it can match the empty string
+
+    With `strict`, zero-width assertions are treated as if they could consume any character, giving back characters
+    in front of an assertion can change its outcome.
+    """
+    if op is sre.LITERAL:
+        return frozenset([chr(av)]), False
+    if op in (sre.NOT_LITERAL, sre.ANY):
+        return frozenset([ANY_CHAR]), False
+    if op is sre.IN:
+        return _class_chars(av), False
+    if op is sre.AT:
+        if not strict or av is sre.AT_END_STRING:
+            return frozenset(), True
+        if av is sre.AT_END:
+            return frozenset("\n"), True
+        return frozenset([ANY_CHAR]), True
+    if op in (sre.ASSERT, sre.ASSERT_NOT):
+        return (frozenset([ANY_CHAR]) if strict else frozenset()), True
+    if op is sre.SUBPATTERN:
+        return _sequence_first(av[3], strict)
+    if op is sre.ATOMIC_GROUP:
+        return _sequence_first(av, strict)
+    if op is sre.BRANCH:
+        chars: frozenset[str] = frozenset()
+        nullable = False
+        for alternative in av[1]:
+            alternative_chars, alternative_nullable = _sequence_first(alternative, strict)
+            chars |= alternative_chars
+            nullable = nullable or alternative_nullable
+        return chars, nullable
+    if op in _REPEATS:
+        chars, nullable = _sequence_first(av[2], strict)
+        return chars, nullable or av[0] == 0
+    return frozenset([ANY_CHAR]), True  # backreferences and conditionals
+
+
+def _sequence_first(items, strict: bool) -> tuple[frozenset[str], bool]:
+    chars: frozenset[str] = frozenset()
+    for op, av in items:
+        item_chars, nullable = _item_first(op, av, strict)
+        chars |= item_chars
+        if not nullable:
+            return chars, False
+    return chars, True
+
+
+def _first(items, follow: frozenset[str], strict: bool = False) -> frozenset[str]:
+    """Characters the sequence can start with, followed by `follow`"""
+    chars, nullable = _sequence_first(items, strict)
+    return chars | follow if nullable else chars
+
+
+def _has_non_ascii(chars: frozenset[str]) -> bool:
+    return any(char == NON_ASCII or (len(char) == 1 and ord(char) > 127) for char in chars)
+
+
+def _overlaps(first: frozenset[str], second: frozenset[str]) -> bool:
+    first, second = first - {END}, second - {END}
+    if not first or not second:
+        return False
+    if ANY_CHAR in first or ANY_CHAR in second or not first.isdisjoint(second):
+        return True
+    return (NON_ASCII in first and _has_non_ascii(second)) or (NON_ASCII in second and _has_non_ascii(first))
+
+
+def _find_risks(items, follow: frozenset[str], in_repeat: bool, risks: list[str]):
+    for index, (op, av) in enumerate(items):
+        item_follow = _first(items[index + 1 :], follow)
+        if op in _REPEATS:
+            repeat_min, repeat_max, body = av
+            body_first, _ = _sequence_first(body, strict=False)
+            if repeat_max > 1:
+                if in_repeat and op is not sre.POSSESSIVE_REPEAT and _overlaps(body_first, item_follow):
+                    quantifier = _quantifier(op, repeat_min, repeat_max)
+                    risks.append(f"nested quantifier {quantifier} can match what follows it")
+                # the next iteration follows the body as well
+                _find_risks(body, body_first | item_follow, True, risks)
+            else:
+                _find_risks(body, item_follow, in_repeat, risks)
+        elif op is sre.BRANCH:
+            alternatives = [_first(alternative, item_follow) for alternative in av[1]]
+            if in_repeat and any(
+                _overlaps(first, second) for idx, first in enumerate(alternatives) for second in alternatives[idx + 1 :]
+            ):
+                risks.append("alternatives under a quantifier can match the same characters")
+            for alternative in av[1]:
+                _find_risks(alternative, item_follow, in_repeat, risks)
+        elif op is sre.SUBPATTERN:
+            _find_risks(av[3], item_follow, in_repeat, risks)
+        elif op is sre.ATOMIC_GROUP:
+            _find_risks(av, item_follow, in_repeat, risks)
+        elif op in (sre.ASSERT, sre.ASSERT_NOT):
+            _find_risks(av[1], frozenset([END]), False, risks)
+
+
+def pattern_risks(pattern: str) -> list[str]:
+    """Reasons the pattern is prone to catastrophic backtracking, empty when no risky construct was found"""
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error as e:
+        return [f"invalid pattern ({e})"]
+    risks: list[str] = []
+    _find_risks(list(parsed), frozenset([END]), False, risks)
+    return list(dict.fromkeys(risks))
+
+
+def _quantifier(op, repeat_min: int, repeat_max: int) -> str:
+    if repeat_max is sre.MAXREPEAT:
+        quantifier = {0: "*", 1: "+"}.get(repeat_min, f"{{{repeat_min},}}")
+    elif repeat_min == 0 and repeat_max == 1:
+        quantifier = "?"
+    elif repeat_min == repeat_max:
+        quantifier = f"{{{repeat_min}}}"
+    else:
+        quantifier = f"{{{repeat_min},{repeat_max}}}"
+    if op is sre.MIN_REPEAT:
+        return quantifier + "?"
+    if op is sre.POSSESSIVE_REPEAT:
+        return quantifier + "+"
+    return quantifier
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def _class_source(items) -> str:
+    parts = []
+    for op, av in items:
+        if op is sre.NEGATE:
+            parts.insert(0, "^")
+        elif op is sre.LITERAL:
+            parts.append(re.escape(chr(av)))
+        elif op is sre.RANGE:
+            parts.append(f"{re.escape(chr(av[0]))}-{re.escape(chr(av[1]))}")
+        elif op is sre.CATEGORY and av in _CATEGORY_SOURCE:
+            parts.append(_CATEGORY_SOURCE[av])
+        else:
+            raise _Unsupported(op)
+    return f"[{''.join(parts)}]"
+
+
+def _source(items) -> str:
+    """Regex source of a parse tree, for the constructs the rewrites produce or keep"""
+    parts = []
+    for op, av in items:
+        if op is sre.LITERAL:
+            parts.append(re.escape(chr(av)))
+        elif op is sre.NOT_LITERAL:
+            parts.append(f"[^{re.escape(chr(av))}]")
+        elif op is sre.ANY:
+            parts.append(".")
+        elif op is sre.IN:
+            parts.append(_class_source(av))
+        elif op is sre.AT and av in _AT_SOURCE:
+            parts.append(_AT_SOURCE[av])
+        elif op is sre.SUBPATTERN and not av[1] and not av[2]:
+            parts.append(f"({'' if av[0] is not None else '?:'}{_source(av[3])})")
+        elif op is sre.ATOMIC_GROUP:
+            parts.append(f"(?>{_source(av)})")
+        elif op is sre.BRANCH:
+            parts.append(f"(?:{'|'.join(_source(alternative) for alternative in av[1])})")
+        elif op in _REPEATS:
+            body = av[2]
+            body_source = _source(body)
+            if len(body) != 1 or body[0][0] not in (*_SINGLE_CHARACTER, sre.SUBPATTERN, sre.ATOMIC_GROUP):
+                body_source = f"(?:{body_source})"
+            parts.append(body_source + _quantifier(op, av[0], av[1]))
+        elif op in (sre.ASSERT, sre.ASSERT_NOT):
+            kind = {(sre.ASSERT, 1): "=", (sre.ASSERT, -1): "<=", (sre.ASSERT_NOT, 1): "!", (sre.ASSERT_NOT, -1): "<!"}
+            parts.append(f"(?{kind[op, av[0]]}{_source(av[1])})")
+        else:
+            raise _Unsupported(op)
+    return "".join(parts)
+
+
+def _single_character_repeat(op, av) -> tuple[int, Any] | None:
+    """Unwrap a greedy unbounded repeat of a single character (class), possibly in a group"""
+    if op is not sre.MAX_REPEAT or av[1] is not sre.MAXREPEAT:
+        return None
+    body = av[2]
+    while len(body) == 1 and body[0][0] is sre.SUBPATTERN:
+        body = body[0][1][3]
+    if len(body) == 1 and body[0][0] in _SINGLE_CHARACTER:
+        return av[0], body[0]
+    return None
+
+
+def _harden(items, follow: frozenset[str]) -> list:
+    hardened: list = []
+    for index, (op, av) in enumerate(items):
+        if op in _REPEATS:
+            repeat_min, repeat_max, body = av
+            if op is sre.MAX_REPEAT and repeat_max is sre.MAXREPEAT and len(body) == 1:
+                # (c+)+, (c*)+, ... match the same as a single repeat of c
+                inner = body[0]
+                while inner[0] is sre.SUBPATTERN and len(inner[1][3]) == 1:
+                    inner = inner[1][3][0]
+                if (nested := _single_character_repeat(*inner)) is not None:
+                    op, av = sre.MAX_REPEAT, (repeat_min * nested[0], sre.MAXREPEAT, [nested[1]])
+                    repeat_min, repeat_max, body = av
+            item_follow = _first(items[index + 1 :], follow, strict=True)
+            if op is sre.MAX_REPEAT and len(body) == 1 and body[0][0] in _SINGLE_CHARACTER:
+                body_first, _ = _item_first(*body[0], strict=True)
+                if not _overlaps(body_first, item_follow):
+                    # what follows cannot start with a character the repeat gives back, so giving back never helps
+                    op = sre.POSSESSIVE_REPEAT
+            else:
+                body_first, _ = _sequence_first(body, strict=True)
+                body = _harden(body, body_first | item_follow)
+            hardened.append((op, (repeat_min, repeat_max, body)))
+        elif op is sre.SUBPATTERN:
+            item_follow = _first(items[index + 1 :], follow, strict=True)
+            hardened.append((op, (*av[:3], _harden(av[3], item_follow))))
+        elif op is sre.BRANCH:
+            item_follow = _first(items[index + 1 :], follow, strict=True)
+            hardened.append((op, (av[0], [_harden(alternative, item_follow) for alternative in av[1]])))
+        else:
+            hardened.append((op, av))
+    return hardened
+
+
+def harden_pattern(pattern: str) -> str:
+    """Rewrite repeats of single characters into possessive repeats where that does not change what the pattern matches
+
+    Nested repeats of a single character are collapsed first, e.g. `^(a+)+$` becomes `^a++$`. Patterns with flags or
+    backreferences are returned as they are.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+        if parsed.state.flags & ~re.UNICODE or parsed.state.groupdict:
+            return pattern
+        return _source(_harden(list(parsed), frozenset([END])))
+    except (re.error, _Unsupported):
+        return pattern
+
+
+def _schema_patterns(schema: SchemaType) -> list[tuple[Pointer, str, str]]:
+    """(location, keyword, pattern) of every `pattern` and `patternProperties` key in the schema"""
+    found: list[tuple[Pointer, str, str]] = []
+    # the pointers are built from the raw keys, they are not escaped json pointer parts
+    stack: list[tuple[Pointer, Any]] = [(Pointer(), schema)]
+    while stack:
+        location, node = stack.pop()
+        if isinstance(node, list):
+            stack.extend((location._child(str(idx)), item) for idx, item in enumerate(node))
+            continue
+        if not isinstance(node, dict):
+            continue
+        for key, value in node.items():
+            if key in ("enum", "default"):
+                continue  # instances, not schemas
+            child = location._child(key)
+            if key == "pattern" and isinstance(value, str):
+                found.append((child, key, value))
+            elif key == "patternProperties" and isinstance(value, dict):
+                found.extend((child._child(pattern), key, pattern) for pattern in value)
+            stack.append((child, value))
+    return found
+
+
+def analyze_schema_patterns(schema: SchemaType, reject: bool = False, rewrite: bool = False) -> list[RegexRisk]:
+    """Find the patterns of a schema that are prone to catastrophic backtracking, to be run when a schema is compiled
+
+    Args:
+        schema: The schema to analyze
+        reject: Raise a ValueError listing the risky patterns instead of only logging them
+        rewrite: Replace the risky patterns by their hardened form in place where possible, see `harden_pattern`
+
+    Returns:
+        The patterns that are (still) risky
+    """
+    risky: list[RegexRisk] = []
+    # nested patterns come after the patternProperties key they are below, rewrite them before the key is renamed
+    for location, keyword, pattern in reversed(_schema_patterns(schema)):
+        if not (reasons := pattern_risks(pattern)):
+            continue
+        if rewrite and not pattern_risks(hardened := harden_pattern(pattern)):
+            if _replace_pattern(schema, location, keyword, pattern, hardened):
+                logger.info(f"Rewrote pattern {pattern!r} at {location} to {hardened!r}")
+                continue
+            reasons.append(f"its hardened form {hardened!r} is already a key of the patternProperties")
+        risky.append(RegexRisk(location, pattern, tuple(reasons)))
+    risky.reverse()
+
+    for risk in risky:
+        logger.warning(
+            f"Pattern {risk.pattern!r} at {risk.location} is prone to backtracking: {', '.join(risk.reasons)}"
+        )
+    if reject and risky:
+        locations = [str(risk.location) for risk in risky]
+        raise ValueError(f"Schema contains patterns prone to catastrophic backtracking at {locations}")
+    return risky
+
+
+def check_regex_risk_mode(mode: str | None):
+    """Raise a ValueError for an unknown `regex_risk` compile option"""
+    if mode is not None and mode not in REGEX_RISK_MODES:
+        raise ValueError(f"regex_risk should be one of {REGEX_RISK_MODES} or None, not {mode!r}")
+
+
+def check_schema_patterns(schema: SchemaType, mode: RegexRiskMode | None) -> list[RegexRisk]:
+    """Analyze the patterns of a schema that is about to be compiled, as set by the `regex_risk` compile option
+
+    None skips the analysis, "warn" logs the risky patterns, "reject" raises a ValueError for them and "rewrite"
+    hardens them in place where possible and logs the others.
+    """
+    check_regex_risk_mode(mode)
+    if mode is None:
+        return []
+    return analyze_schema_patterns(schema, reject=mode == "reject", rewrite=mode == "rewrite")
+
+
+def _replace_pattern(schema: SchemaType, pointer: Pointer, keyword: str, pattern: str, hardened: str) -> bool:
+    """Replace the pattern in place, False when a patternProperties key would replace an existing one"""
+    if keyword == "pattern":
+        pointer.parent.follow_pointer(schema)["pattern"] = hardened  # type: ignore[index]
+        return True
+    pattern_properties: dict = pointer.parent.follow_pointer(schema)  # type: ignore[assignment]
+    if hardened in pattern_properties:
+        return False
+    pattern_properties[hardened] = pattern_properties.pop(pattern)
+    return True
@@ -0,0 +1,238 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from copy import deepcopy
+from dataclasses import asdict, dataclass
+from logging import getLogger
+from pathlib import Path
+from urllib.parse import ParseResult, urldefrag, urlparse
+from urllib.request import url2pathname
+
+import requests
+from dataformats.jsonschema.custom_types import SchemaType
+from dataformats.jsonschema.protocols import Retriever
+from requests.adapters import HTTPAdapter
+
+logger = getLogger("retrievers")
+
+max_age_pattern = re.compile(r"max-age=(\d+)")
+
+
+class RetrievalError(ValueError):
+    """A response a schema could not be read from"""
+
+
+class MemoryRetriever:
+    """Serves schemas from a dict of uri -> schema
+
+    Unknown uris are passed on to the fallback retriever (if given). Every call returns a fresh copy, dereferencing
+    replaces refs in place and should never alter the registered documents.
+    """
+
+    def __init__(self, documents: dict[str, SchemaType] | None = None, fallback: Retriever | None = None):
+        self.documents: dict[str, SchemaType] = {}
+        self.fallback = fallback
+        for uri, schema in (documents or {}).items():
+            self.add(uri, schema)
+
+    def add(self, uri: str, schema: SchemaType):
+        uri, _ = urldefrag(uri)
+        self.documents[uri] = schema
+
+    def __contains__(self, uri: str):
+        return urldefrag(uri)[0] in self.documents
+
+    def retrieve(self, uri: str) -> SchemaType:
+        document_uri, _ = urldefrag(uri)
+        if document_uri in self.documents:
+            return deepcopy(self.documents[document_uri])
+        if self.fallback is None:
+            raise ValueError(f"No schema registered for {document_uri}")
+        return self.fallback.retrieve(uri)
+
+
+class FileRetriever:
+    """Reads schemas from `file://` uris"""
+
+    def retrieve(self, uri: str) -> SchemaType:
+        uri_parts: ParseResult = urlparse(uri)
+        if uri_parts.scheme != "file":
+            raise ValueError(f"Encountered a ref with a unsupported scheme ({uri_parts.scheme})")
+        return json.loads(Path(url2pathname(uri_parts.path)).read_text())
+
+
+@dataclass
+class CacheEntry:
+    uri: str
+    body: str
+    etag: str | None = None
+    last_modified: str | None = None
+    expires: float = 0.0
+
+    @property
+    def is_fresh(self) -> bool:
+        return time.time() < self.expires
+
+
+class HttpRetriever:
+    """Downloads schemas over http(s) with a pooled session and a conditional request cache
+
+    Responses are kept in memory and, when `cache_dir` is given, on disk so they survive restarts. A cached document
+    is served without a request while it is fresh according to `Cache-Control: max-age`. Stale documents are
+    revalidated with `If-None-Match`/`If-Modified-Since` and reused on a `304 Not Modified`. Responses with
+    `Cache-Control: no-store` are not cached at all.
+
+    Args:
+        timeout: Passed on to requests, either a total or a (connect, read) tuple.
+        cache_dir: Directory for the on disk cache, disabled when None.
+        pool_maxsize: Maximum amount of connections kept open per host.
+        session: Use an existing session instead of creating one.
+        max_entries: Maximum amount of documents kept in memory, the least recently used are evicted first.
+    """
+
+    def __init__(
+        self,
+        timeout: float | tuple[float, float] = (3.05, 10.0),
+        cache_dir: Path | str | None = None,
+        pool_maxsize: int = 10,
+        session: requests.Session | None = None,
+        max_entries: int = 256,
+    ):
+        if max_entries < 1:
+            raise ValueError(f"max_entries should be at least 1, not {max_entries}")
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cache_path(self, uri: str) -> Path | None:
+        if self.cache_dir is None:
+            return None
+        return self.cache_dir / f"{hashlib.sha256(uri.encode()).hexdigest()}.json"
+
+    def _load_entry(self, uri: str) -> CacheEntry | None:
+        with self._lock:
+            if uri in self._entries:
+                self._entries.move_to_end(uri)
+                return self._entries[uri]
+        cache_path = self._cache_path(uri)
+        if cache_path is None or not cache_path.exists():
+            return None
+        try:
+            entry = CacheEntry(**json.loads(cache_path.read_text()))
+        except (ValueError, TypeError):
+            logger.warning(f"Ignoring corrupt cache file {cache_path} for {uri}")
+            return None
+        self._remember(entry)
+        return entry
+
+    def _remember(self, entry: CacheEntry):
+        with self._lock:
+            self._entries[entry.uri] = entry
+            self._entries.move_to_end(entry.uri)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _forget(self, uri: str):
+        with self._lock:
+            self._entries.pop(uri, None)
+        cache_path = self._cache_path(uri)
+        if cache_path is not None:
+            cache_path.unlink(missing_ok=True)
+
+    def _store_entry(self, entry: CacheEntry):
+        self._remember(entry)
+        cache_path = self._cache_path(entry.uri)
+        if cache_path is not None:
+            temporary_path = cache_path.with_suffix(f".{threading.get_ident()}.tmp")
+            temporary_path.write_text(json.dumps(asdict(entry)))
+            temporary_path.replace(cache_path)
+
+    def retrieve(self, uri: str) -> SchemaType:
+        uri, _ = urldefrag(uri)
+        entry = self._load_entry(uri)
+        if entry is not None and entry.is_fresh:
+            logger.debug(f"Serving fresh cached {uri}")
+            return json.loads(entry.body)
+
+        headers = {}
+        if entry is not None and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry is not None and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+
+        response = self.session.get(uri, headers=headers, timeout=self.timeout)
+        cache_control = response.headers.get("Cache-Control", "").lower()
+        max_age = max_age_pattern.search(cache_control)
+        expires = time.time() + int(max_age.group(1)) if max_age and "no-cache" not in cache_control else 0.0
+        no_store = "no-store" in cache_control
+
+        if response.status_code == 304:
+            if entry is None:
+                raise RetrievalError(f"Received 304 Not Modified for {uri} without a cached copy")
+            logger.debug(f"Revalidated cached {uri}")
+            if no_store:
+                self._forget(uri)
+            else:
+                entry.expires = expires
+                self._store_entry(entry)
+            return json.loads(entry.body)
+
+        response.raise_for_status()
+        body = response.text
+        schema = json.loads(body)
+        if no_store:
+            self._forget(uri)
+        else:
+            self._store_entry(
+                CacheEntry(
+                    uri=uri,
+                    body=body,
+                    etag=response.headers.get("ETag"),
+                    last_modified=response.headers.get("Last-Modified"),
+                    expires=expires,
+                )
+            )
+        return schema
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.cache_dir is not None:
+            for cache_path in self.cache_dir.glob("*.json"):
+                cache_path.unlink(missing_ok=True)
+
+
+class SchemeRetriever:
+    """Dispatches to a retriever based on the scheme of the uri"""
+
+    def __init__(self, retrievers: dict[str, Retriever]):
+        self.retrievers = retrievers
+
+    def retrieve(self, uri: str) -> SchemaType:
+        scheme = urlparse(uri).scheme
+        if scheme not in self.retrievers:
+            raise ValueError(f"Encountered a ref with a unsupported scheme ({scheme})")
+        return self.retrievers[scheme].retrieve(uri)
+
+
+def create_default_retriever(cache_dir: Path | str | None = None) -> SchemeRetriever:
+    http_retriever = HttpRetriever(cache_dir=cache_dir)
+    return SchemeRetriever({"file": FileRetriever(), "http": http_retriever, "https": http_retriever})
+
+
+default_retriever = create_default_retriever()
@@ -0,0 +1,319 @@
+import inspect
+import re
+from logging import getLogger
+from random import random
+from typing import Any, Callable, Iterable, Mapping, NamedTuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.routing import compile_path
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from dataformats.jsonschema.budget import ValidationBudget, ValidationBudgetExceeded
+from dataformats.jsonschema.custom_types import SchemaType
+from dataformats.jsonschema.interning import SchemaRegistry
+from dataformats.jsonschema.mixins.validations_mixin import ValidationErrors, flatten_errors
+from dataformats.jsonschema.regex_risk import RegexRiskMode
+from dataformats.jsonschema.streaming import JsonSyntaxError, StreamingValidator, StreamValidationError
+
+logger = getLogger("starlette_validation")
+
+# payloads up to this size are validated on the event loop, larger ones in the thread pool
+THREADPOOL_THRESHOLD = 64 * 1024
+
+
+def error_details(errors: ValidationErrors) -> list[dict[str, str]]:
+    return [{"location": location, "message": message} for location, message in flatten_errors(errors)]
+
+
+def params_instance(params: Iterable[tuple[str, Any]]) -> dict[str, Any]:
+    """Query parameters or form fields (the `multi_items()` of starlette's `QueryParams` and `FormData`) as an instance
+    for a `TransformingValidator` with `coerce_strings`, a name that is repeated becomes an array of its values"""
+    instance: dict[str, Any] = {}
+    for name, value in params:
+        if name not in instance:
+            instance[name] = value
+        elif isinstance(instance[name], list):
+            instance[name].append(value)
+        else:
+            instance[name] = [instance[name], value]
+    return instance
+
+
+class RouteSchemas:
+    """Compiled schemas by route
+
+    Routes are written as "METHOD /path/{param}", using the path syntax of starlette routes. A route without a method
+    applies to every method. The first route that matches a request is used. The schemas are registered in the registry
+    as "<namespace> <route>". `regex_risk` configures the registry created when none is given, see `SchemaRegistry`.
+    """
+
+    def __init__(
+        self,
+        schemas: Mapping[str, SchemaType],
+        registry: SchemaRegistry | None = None,
+        namespace: str = "request",
+        regex_risk: RegexRiskMode | None = None,
+    ):
+        if registry is not None and regex_risk is not None:
+            raise ValueError("regex_risk cannot be combined with a registry, configure it on the registry instead")
+        self.registry = SchemaRegistry(regex_risk=regex_risk) if registry is None else registry
+        self._routes: list[tuple[str, str | None, re.Pattern, StreamingValidator]] = []
+        for route, schema in schemas.items():
+            method, _, path = route.rpartition(" ")
+            if not path.startswith("/"):
+                raise ValueError(f"Route {route} should be written as 'METHOD /path'")
+            path_regex, _, _ = compile_path(path)
+            validator = StreamingValidator(self.registry.add(f"{namespace} {route}", schema))
+            self._routes.append((route, method.upper() or None, path_regex, validator))
+        logger.info(f"Compiled the {namespace} schemas of {len(self._routes)} routes")
+
+    def match(self, method: str, path: str) -> tuple[str, StreamingValidator] | None:
+        for route, route_method, path_regex, validator in self._routes:
+            if (route_method is None or route_method == method) and path_regex.match(path):
+                return route, validator
+        return None
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+
+def validate_json(
+    validator: StreamingValidator, body: bytes, budget: ValidationBudget | None = None
+) -> tuple[Any, ValidationErrors]:
+    """Decode and validate a json document in a single pass, up to its first error
+
+    `JsonSyntaxError` is raised for malformed documents.
+    """
+    try:
+        return validator.decode(body, budget), {}
+    except StreamValidationError as e:
+        return None, e.errors
+
+
+def is_json(content_type: str) -> bool:
+    media_type = content_type.partition(";")[0].strip().lower()
+    return media_type == "application/json" or media_type.endswith("+json")
+
+
+class RequestValidationMiddleware:
+    """Validate json request bodies against the schema of their route before the endpoint is called
+
+    The schemas are compiled when the middleware is created, i.e. when the application starts. Bodies are decoded and
+    validated in a single pass (see `StreamingValidator`): an invalid request is answered with a 4xx response with the
+    error and its location as soon as the error is read, valid ones are passed on with the decoded body in
+    `request.state.validated_body`. Bodies larger than `threadpool_threshold` bytes are decoded in the thread pool, so
+    large payloads do not block the event loop.
+
+    Usage:
+        Starlette(routes=..., middleware=[Middleware(RequestValidationMiddleware, schemas={"POST /items": schema})])
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        schemas: Mapping[str, SchemaType],
+        threadpool_threshold: int = THREADPOOL_THRESHOLD,
+        max_body_size: int | None = None,
+        budget: ValidationBudget | None = None,
+        registry: SchemaRegistry | None = None,
+        regex_risk: RegexRiskMode | None = None,
+    ):
+        """
+        Args:
+            app: The wrapped application
+            schemas: Schema of the request body by route, see `RouteSchemas`
+            threadpool_threshold: Size in bytes above which a body is validated in the thread pool
+            max_body_size: Size in bytes above which a body is refused without parsing it
+            budget: Limits on the work done per validation, exceeding it is answered as an invalid request
+            registry: Registry to compile the schemas in, to share subschemas with other contracts
+            regex_risk: Check the patterns of the schemas for catastrophic backtracking when they are compiled, either
+                "warn", "reject" or "rewrite" (see `check_schema_patterns`). Set it on the registry when one is given
+        """
+        self.app = app
+        self.routes = RouteSchemas(schemas, registry, regex_risk=regex_risk)
+        self.threadpool_threshold = threadpool_threshold
+        self.max_body_size = max_body_size
+        self.budget = budget
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or (match := self.routes.match(scope["method"], scope["path"])) is None:
+            await self.app(scope, receive, send)
+            return
+        route, validator = match
+
+        headers = dict(scope["headers"])
+        if not is_json(headers.get(b"content-type", b"").decode("latin-1")):
+            await self.reject(scope, receive, send, 415, "Request body should be json")
+            return
+        body = await self.read_body(receive)
+        if body is None:
+            await self.reject(scope, receive, send, 413, f"Request body exceeds {self.max_body_size} bytes")
+            return
+
+        try:
+            if len(body) > self.threadpool_threshold:
+                instance, errors = await run_in_threadpool(validate_json, validator, body, self.budget)
+            else:
+                instance, errors = validate_json(validator, body, self.budget)
+        except JsonSyntaxError as e:
+            details = [{"location": "", "message": str(e)}]
+            await self.reject(scope, receive, send, 400, "Request body is not valid json", details)
+            return
+        except ValidationBudgetExceeded as e:
+            details = [{"location": "", "message": str(e)}]
+            await self.reject(scope, receive, send, 422, "Request body could not be validated", details)
+            return
+        if errors:
+            logger.debug(f"Rejected a request to {route}")
+            details = error_details(errors)
+            await self.reject(scope, receive, send, 422, "Request body does not match the schema", details)
+            return
+
+        scope.setdefault("state", {})["validated_body"] = instance
+        body_sent = False
+
+        async def replay_body() -> Message:
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        await self.app(scope, replay_body, send)
+
+    async def read_body(self, receive: Receive) -> bytes | None:
+        """The complete request body, or None when it exceeds the maximum size"""
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if self.max_body_size is not None and size > self.max_body_size:
+                return None
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    async def reject(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+        status_code: int,
+        detail: str,
+        errors: list[dict[str, str]] | None = None,
+    ):
+        response = JSONResponse({"detail": detail, "errors": [] if errors is None else errors}, status_code=status_code)
+        await response(scope, receive, send)
+
+
+class ResponseViolation(NamedTuple):
+    """A sampled response that does not match the schema of its route"""
+
+    route: str
+    method: str
+    path: str
+    status_code: int
+    errors: list[dict[str, str]]
+
+
+# called with every violation, may be a coroutine function
+ViolationCallback = Callable[[ResponseViolation], Any]
+
+
+class ResponseValidationMiddleware:
+    """Validate a sample of the json responses against the schema of their route, to detect contract drift
+
+    Only sampled responses are buffered. They are validated in the thread pool after the response has been sent, like
+    a background task, so the client does not wait for the validation. Only successful (2xx) json responses are
+    validated, violations are passed to `on_violation`.
+
+    Usage:
+        Starlette(
+            routes=...,
+            middleware=[Middleware(ResponseValidationMiddleware, schemas={"GET /items": schema}, on_violation=report)],
+        )
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        schemas: Mapping[str, SchemaType],
+        on_violation: ViolationCallback,
+        sample_rate: float = 0.01,
+        route_sample_rates: Mapping[str, float] | None = None,
+        budget: ValidationBudget | None = None,
+        registry: SchemaRegistry | None = None,
+        regex_risk: RegexRiskMode | None = None,
+    ):
+        """
+        Args:
+            app: The wrapped application
+            schemas: Schema of the response body by route, see `RouteSchemas`
+            on_violation: Called with every response that does not match its schema
+            sample_rate: Fraction of the responses to validate
+            route_sample_rates: Fraction of the responses to validate for specific routes of `schemas`
+            budget: Limits on the work done per validation, responses exceeding it are logged and skipped
+            registry: Registry to compile the schemas in, to share subschemas with other contracts
+        """
+        self.app = app
+        self.routes = RouteSchemas(schemas, registry, namespace="response")
+        self.on_violation = on_violation
+        self.budget = budget
+        self.sample_rates = {} if route_sample_rates is None else dict(route_sample_rates)
+        for route, rate in [("default", sample_rate), *self.sample_rates.items()]:
+            if not 0 <= rate <= 1:
+                raise ValueError(f"Sample rate {rate} of {route} is not between 0 and 1")
+            if route != "default" and route not in schemas:
+                raise ValueError(f"Sample rate given for {route}, which has no schema")
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or (match := self.routes.match(scope["method"], scope["path"])) is None:
+            await self.app(scope, receive, send)
+            return
+        route, validator = match
+        if random() >= self.sample_rates.get(route, self.sample_rate):
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        content_type = ""
+        chunks = []
+
+        async def capture_response(message: Message):
+            nonlocal status_code, content_type
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"").decode("latin-1")
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, receive, capture_response)
+        if 200 <= status_code < 300 and is_json(content_type):
+            await self.check(route, scope, status_code, b"".join(chunks), validator)
+
+    async def check(self, route: str, scope: Scope, status_code: int, body: bytes, validator: StreamingValidator):
+        try:
+            _, errors = await run_in_threadpool(validate_json, validator, body, self.budget)
+            details = error_details(errors)
+        except JsonSyntaxError as e:
+            details = [{"location": "", "message": str(e)}]
+        except ValidationBudgetExceeded as e:
+            logger.warning(f"Skipped the validation of a response of {route}: {e}")
+            return
+        if not details:
+            return
+        violation = ResponseViolation(route, scope["method"], scope["path"], status_code, details)
+        try:
+            result = self.on_violation(violation)
+            if inspect.isawaitable(result):
+                await result
+        except Exception:
+            logger.exception(f"Reporting a response violation of {route} failed")
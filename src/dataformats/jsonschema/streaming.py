@@ -0,0 +1,572 @@
+import json
+import mmap
+import re
+from functools import lru_cache
+from logging import getLogger
+from pathlib import Path
+from time import monotonic
+from typing import Any, NamedTuple
+
+from dataformats.jsonschema.budget import ValidationBudget, ValidationBudgetExceeded, active_budget, check_pattern_input
+from dataformats.jsonschema.hashing import IdentityCache
+from dataformats.jsonschema.json_pointer import Location, Pointer, materialize
+from dataformats.jsonschema.mixins.validations_mixin import Draft4Validator, ValidationErrors, ValidationPlan
+
+logger = getLogger("streaming")
+
+# json documents are tokenized as bytes, so the buffer (bytes, memoryview, mmap, ...) is never decoded as a whole
+_whitespace = re.compile(rb"[ \t\n\r]*")
+_string = re.compile(rb'"(?:[^"\\\x00-\x1f]++|\\(?:["\\/bfnrt]|u[0-9A-Fa-f]{4}))*+"')
+_property_name = re.compile(rb"(" + _string.pattern + rb")[ \t\n\r]*+:[ \t\n\r]*+")
+_number = re.compile(rb"-?(?:0|[1-9][0-9]*+)(\.[0-9]++)?([eE][-+]?[0-9]++)?")
+_escape = re.compile(rb"\\")
+# the bytes that continue a utf-8 sequence, every other byte of a string without escapes starts a code point
+_continuation_bytes = bytes(range(0x80, 0xC0))
+_literals = {ord("t"): (b"true", True), ord("f"): (b"false", False), ord("n"): (b"null", None)}
+
+OPEN_OBJECT, CLOSE_OBJECT, OPEN_ARRAY, CLOSE_ARRAY = b"{}[]"
+COMMA, COLON, QUOTE = b',:"'
+
+# checks that are not run once a value is complete: the container checks and allOf are streamed instead
+STREAMED_CHECKS = ("check_object_container_checks", "check_array_container_checks", "check_allOf")
+# checks that only need the keys of an object or the length of an array, the values are not kept for these
+SKELETON_CHECKS = ("check_maxProperties", "check_minProperties", "check_required", "check_maxItems", "check_minItems")
+# children of a node set whose node sets are remembered, property names can be arbitrary keys
+MAX_CACHED_CHILDREN = 1024
+# bytes of a string counted at once when its length is checked before it is decoded
+LENGTH_CHUNK_SIZE = 1024 * 1024
+
+
+class JsonSyntaxError(ValueError):
+    """The document is not valid json"""
+
+    def __init__(self, message: str, offset: int):
+        super().__init__(f"{message} at byte {offset}")
+        self.offset = offset
+
+
+class StreamValidationError(ValueError):
+    """A violation of the schema found while decoding, at the json pointer and byte offset of the offending value"""
+
+    def __init__(self, error: ValueError, pointer: Pointer, offset: int):
+        super().__init__(str(error))
+        self.error = error
+        self.pointer = pointer
+        self.offset = offset
+
+    @property
+    def errors(self) -> ValidationErrors:
+        """The violation in the format of `Draft4Validator.validate`"""
+        return {str(self.pointer): [self.error]}
+
+
+class NodeInfo(NamedTuple):
+    """The keywords of a compiled schema node that are checked while a value is being decoded"""
+
+    types: tuple[str, ...] | None
+    properties: dict[str, Any]
+    pattern_properties: dict[str, Any]
+    additional_properties: Any
+    max_properties: int | None
+    items: Any
+    additional_items: Any
+    max_items: int | None
+    max_length: int | None
+    all_of: tuple[Draft4Validator, ...]
+
+
+@lru_cache(maxsize=None)
+def completion_checks(plan: ValidationPlan, instance_type: str) -> tuple[tuple[Any, bool], ...]:
+    """The checks of a plan that are run once a value of the instance type is complete"""
+    checks = plan.any + getattr(plan, instance_type, ())
+    if instance_type in ("object", "array"):
+        checks = tuple(check for check in checks if check[0].__name__ != "check_type")  # checked when opened
+    return tuple(check for check in checks if check[0].__name__ not in STREAMED_CHECKS)
+
+
+class ItemCount:
+    """Stands in for an array whose items are not kept, when only its length is checked"""
+
+    __slots__ = ("length",)
+
+    def __init__(self):
+        self.length = 0
+
+    def append(self, item: Any):
+        self.length += 1
+
+    def __len__(self) -> int:
+        return self.length
+
+
+# the same dispatch as `Draft4Validator.validation_steps` for the types json is decoded to, booleans are numbers there
+INSTANCE_TYPES = {
+    dict: "object",
+    list: "array",
+    ItemCount: "array",
+    str: "string",
+    int: "number",
+    float: "number",
+    bool: "number",
+}
+
+
+class NodeSet:
+    """The compiled schema nodes that apply to a value, and what is derived from them
+
+    Node sets are interned by their `StreamingValidator`. Siblings (the items of an array, the same property of many
+    objects) share a node set, so the nodes of their children and the checks of their values are computed once.
+    """
+
+    __slots__ = (
+        "nodes",
+        "types",
+        "max_properties",
+        "max_items",
+        "max_length",
+        "max_length_range",
+        "has_patterns",
+        "positional_items",
+        "children",
+        "checks",
+        "needs_value",
+    )
+
+    def __init__(self, nodes: tuple[Draft4Validator, ...], infos: tuple[NodeInfo, ...]):
+        self.nodes = nodes
+        self.types = tuple((node, info.types) for node, info in zip(nodes, infos) if info.types is not None)
+        self.max_properties = tuple(
+            (node, info.max_properties) for node, info in zip(nodes, infos) if info.max_properties is not None
+        )
+        self.max_items = tuple((node, info.max_items) for node, info in zip(nodes, infos) if info.max_items is not None)
+        self.max_length = tuple(
+            (node, info.max_length) for node, info in zip(nodes, infos) if info.max_length is not None
+        )
+        maxima = [maximum for _, maximum in self.max_length]
+        self.max_length_range = (min(maxima), max(maxima)) if maxima else None
+        self.has_patterns = any(info.pattern_properties for info in infos)
+        self.positional_items = any(isinstance(info.items, list) for info in infos)
+        # child key (property name or item index) -> node set of the child, nodes that fail on the child's presence
+        self.children: dict[str | int, tuple[NodeSet, tuple[tuple[Draft4Validator, str], ...]]] = {}
+        # instance type -> (node, check, validates subschemas) to run once a value is complete
+        self.checks: dict[str, tuple[tuple[Draft4Validator, Any, bool], ...]] = {}
+        # instance type -> whether the checks need the values of the container, not just its keys or length
+        self.needs_value: dict[str, bool] = {}
+
+
+class Frame:
+    """An object or array that is being decoded"""
+
+    __slots__ = ("container", "node_set", "location", "offset", "key", "keep")
+
+    def __init__(
+        self, container: dict | list | ItemCount, node_set: NodeSet, location: Location, offset: int, keep: bool
+    ):
+        self.container = container
+        self.node_set = node_set
+        self.location = location
+        self.offset = offset
+        self.key: str = ""
+        self.keep = keep  # whether the values of the container are kept
+
+
+class StreamingValidator:
+    """Decode json documents from bytes while validating them against a compiled schema
+
+    The document is validated in the same pass that decodes it. Constraints that can be decided before a value is
+    complete (the type of objects and arrays, `maxItems`, `maxProperties`, `additionalProperties` and
+    `additionalItems` being false, `maxLength` of strings without escapes) are checked as soon as the offending token
+    is read, so an invalid document is rejected without decoding the rest of it. `allOf` is applied while decoding,
+    the other applicators (`anyOf`, `oneOf`, `not` and schema `dependencies`) are checked once the value they apply to
+    is complete.
+    """
+
+    def __init__(self, validator: Draft4Validator):
+        self.validator = validator
+        self._infos: IdentityCache[NodeInfo] = IdentityCache()
+        self._node_sets: dict[tuple[int, ...], NodeSet] = {}
+        self.root = self.node_set(self.applicable([validator], ()))
+
+    def info(self, node: Draft4Validator) -> NodeInfo:
+        if (cached := self._infos.entry(node)) is not None:
+            return cached[1]
+        if (schema_type := node.get("type")) is not None:
+            schema_type = (schema_type,) if isinstance(schema_type, str) else tuple(schema_type)
+        info = NodeInfo(
+            types=schema_type,
+            properties=node.get("properties") or {},
+            pattern_properties=node.get("patternProperties") or {},
+            additional_properties=node.get("additionalProperties"),
+            max_properties=node.get("maxProperties"),
+            items=node.get("items"),
+            additional_items=node.get("additionalItems"),
+            max_items=node.get("maxItems"),
+            max_length=node.get("maxLength"),
+            all_of=tuple(node.subvalidator(schema) for schema in node.get("allOf", ())),
+        )
+        return self._infos.store(node, info)
+
+    def node_set(self, nodes: tuple[Draft4Validator, ...]) -> NodeSet:
+        key = tuple(map(id, nodes))
+        if (node_set := self._node_sets.get(key)) is None:
+            node_set = self._node_sets[key] = NodeSet(nodes, tuple(map(self.info, nodes)))
+        return node_set
+
+    def without(self, node_set: NodeSet, node: Draft4Validator) -> NodeSet:
+        """Stop checking a node that failed, nodes are compared by identity (as mappings they compare by content)"""
+        return self.node_set(tuple(other for other in node_set.nodes if other is not node))
+
+    def applicable(
+        self, new_nodes: list[Draft4Validator], nodes: tuple[Draft4Validator, ...]
+    ) -> tuple[Draft4Validator, ...]:
+        """Add the new nodes, and the nodes of their allOf subschemas, to the nodes that apply to a value"""
+        stack = new_nodes[::-1]
+        while stack:
+            node = stack.pop()
+            if node and not any(node is other for other in nodes):  # empty schemas have nothing to check
+                nodes += (node,)
+                stack.extend(reversed(self.info(node).all_of))
+        return nodes
+
+    def property_nodes(self, node_set: NodeSet, key: str) -> tuple[NodeSet, tuple[tuple[Draft4Validator, str], ...]]:
+        """The node set of a property and the nodes that do not allow the property"""
+        if (cached := node_set.children.get(key)) is not None:
+            return cached
+        nodes: tuple[Draft4Validator, ...] = ()
+        failed = []
+        for node in node_set.nodes:
+            info = self.info(node)
+            schemas = [info.properties[key]] if key in info.properties else []
+            schemas.extend(schema for pattern, schema in info.pattern_properties.items() if re.search(pattern, key))
+            if not schemas and info.additional_properties is not None and info.additional_properties is not True:
+                if info.additional_properties is False:
+                    failed.append((node, f"Property {key} is not allowed"))
+                    continue
+                schemas.append(info.additional_properties)
+            nodes = self.applicable([node.subvalidator(schema) for schema in schemas if schema], nodes)
+        children = (self.node_set(nodes), tuple(failed))
+        if len(node_set.children) < MAX_CACHED_CHILDREN:
+            node_set.children[key] = children
+        return children
+
+    def item_nodes(self, node_set: NodeSet, index: int) -> tuple[NodeSet, tuple[tuple[Draft4Validator, str], ...]]:
+        """The node set of an array item and the nodes that do not allow the item"""
+        key = index if node_set.positional_items else -1
+        if (cached := node_set.children.get(key)) is not None:
+            return cached
+        nodes: tuple[Draft4Validator, ...] = ()
+        failed = []
+        for node in node_set.nodes:
+            info = self.info(node)
+            if isinstance(info.items, dict):
+                nodes = self.applicable([node.subvalidator(info.items)], nodes)
+            elif isinstance(info.items, list):
+                if index < len(info.items):
+                    nodes = self.applicable([node.subvalidator(info.items[index])], nodes)
+                elif info.additional_items is False:
+                    failed.append((node, f"Array has more than the {len(info.items)} items of the schema"))
+                elif isinstance(info.additional_items, dict):
+                    nodes = self.applicable([node.subvalidator(info.additional_items)], nodes)
+        children = (self.node_set(nodes), tuple(failed))
+        if len(node_set.children) < MAX_CACHED_CHILDREN:
+            node_set.children[key] = children
+        return children
+
+    def checks(self, node_set: NodeSet, instance_type: str) -> tuple[tuple[Draft4Validator, Any, bool], ...]:
+        if (checks := node_set.checks.get(instance_type)) is None:
+            checks = node_set.checks[instance_type] = tuple(
+                (node, check, validates_subschemas)
+                for node in node_set.nodes
+                for check, validates_subschemas in completion_checks(node._plan, instance_type)
+            )
+        return checks
+
+    def needs_value(self, node_set: NodeSet, instance_type: str) -> bool:
+        if (needs_value := node_set.needs_value.get(instance_type)) is None:
+            needs_value = node_set.needs_value[instance_type] = any(
+                check.__name__ not in SKELETON_CHECKS for _, check, _ in self.checks(node_set, instance_type)
+            )
+        return needs_value
+
+    def decode(self, data: bytes | bytearray | memoryview, budget: ValidationBudget | None = None) -> Any:
+        """Decode and validate the json document
+
+        Args:
+            data: The json document, utf-8 encoded
+            budget: Limits on the work done by this call, `ValidationBudgetExceeded` is raised when one is hit
+
+        Raises:
+            StreamValidationError: At the first violation of the schema
+            JsonSyntaxError: When the document is not valid json
+
+        Returns:
+            The decoded document
+        """
+        errors: list[StreamValidationError] = []
+        budget_token = active_budget.set(budget)
+        try:
+            return self._decode(data, budget, errors, max_errors=1, keep=True)
+        finally:
+            active_budget.reset(budget_token)
+
+    def validate_file(
+        self, path: str | Path, max_errors: int = 100, budget: ValidationBudget | None = None
+    ) -> list[StreamValidationError]:
+        """Validate a json file without loading it
+
+        The file is memory mapped and tokenized from the mapping. Objects and arrays are only kept in memory as long as
+        a check needs their complete value (e.g. `enum`, `uniqueItems`, `anyOf`), otherwise only their keys or length
+        are kept while they are being decoded. Memory use is therefore bounded by the largest value that has to be
+        kept, not by the size of the file.
+
+        Args:
+            path: Path of the json file, utf-8 encoded
+            max_errors: Amount of errors after which validation stops
+            budget: Limits on the work done by this call, `ValidationBudgetExceeded` is raised when one is hit
+
+        Raises:
+            JsonSyntaxError: When the file is not valid json, the errors found before are lost
+
+        Returns:
+            The errors with their json pointers and byte offsets, empty when the file is valid
+        """
+        errors: list[StreamValidationError] = []
+        with open(path, "rb") as file:
+            if file.seek(0, 2) == 0:
+                raise JsonSyntaxError("Expected a value", 0)
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                budget_token = active_budget.set(budget)
+                try:
+                    self._decode(data, budget, errors, max_errors, keep=False)
+                except StreamValidationError:
+                    logger.info(f"Stopped validating {path} after {len(errors)} errors")
+                finally:
+                    active_budget.reset(budget_token)
+        return errors
+
+    def _decode(
+        self,
+        data: bytes | bytearray | memoryview | mmap.mmap,
+        budget: ValidationBudget | None,
+        errors: list[StreamValidationError],
+        max_errors: int,
+        keep: bool,
+    ) -> Any:
+        whitespace = _whitespace.match
+        end = len(data)
+        deadline = None if budget is None or budget.timeout is None else monotonic() + budget.timeout
+        max_depth = None if budget is None else budget.max_instance_depth
+        max_nodes = None if budget is None else budget.max_nodes
+        visited_nodes = 0
+
+        def fail(error: ValueError, location: Location, offset: int):
+            errors.append(StreamValidationError(error, materialize(location), offset))
+            if len(errors) >= max_errors:
+                raise errors[-1]
+
+        node_set = self.root
+        location: Location = Pointer()
+        stack: list[Frame] = []
+        pos = whitespace(data, 0).end()
+        while True:
+            # a value starts at pos, the node set applies to it
+            if pos >= end:
+                raise JsonSyntaxError("Expected a value", pos)
+            offset = pos
+            char = data[pos]
+            if budget is not None:
+                visited_nodes += len(node_set.nodes)
+                if max_nodes is not None and visited_nodes > max_nodes:
+                    raise ValidationBudgetExceeded(
+                        f"Validation exceeded the maximum of {max_nodes} nodes at {materialize(location)}",
+                        limit="max_nodes",
+                    )
+                if deadline is not None and monotonic() > deadline:
+                    raise ValidationBudgetExceeded(
+                        f"Validation exceeded its timeout of {budget.timeout}s at {materialize(location)}",
+                        limit="timeout",
+                    )
+
+            if char == OPEN_OBJECT or char == OPEN_ARRAY:
+                if max_depth is not None and len(stack) >= max_depth:
+                    raise ValidationBudgetExceeded(
+                        f"Instance exceeds the maximum depth of {max_depth} at {materialize(location)}",
+                        limit="max_instance_depth",
+                    )
+                instance_type = "object" if char == OPEN_OBJECT else "array"
+                for node, types in node_set.types:
+                    if instance_type not in types:
+                        node_set = self.without(node_set, node)
+                        error = ValueError(f"Type of value is {instance_type}, not one of {list(types)}")
+                        fail(error, location, offset)
+                if keep or (stack and stack[-1].keep) or self.needs_value(node_set, instance_type):
+                    frame = Frame({} if char == OPEN_OBJECT else [], node_set, location, offset, keep=True)
+                else:
+                    frame = Frame({} if char == OPEN_OBJECT else ItemCount(), node_set, location, offset, keep=False)
+                pos = whitespace(data, pos + 1).end()
+                if pos < end and data[pos] == (CLOSE_OBJECT if char == OPEN_OBJECT else CLOSE_ARRAY):
+                    pos += 1
+                    value = frame.container
+                else:
+                    stack.append(frame)
+                    if char == OPEN_OBJECT:
+                        pos, node_set, location = self._open_property(data, pos, frame, fail)
+                    else:
+                        node_set, location = self._open_item(pos, frame, fail)
+                    continue
+            elif char == QUOTE:
+                if (match := _string.match(data, pos)) is None:
+                    raise JsonSyntaxError("Invalid string", pos)
+                pos = match.end()
+                # a string has at most as many code points as bytes, fail the longer ones before they are decoded
+                if (length_range := node_set.max_length_range) is not None and pos - offset - 2 > length_range[0]:
+                    if (length := string_length(data, offset + 1, pos - 1, length_range[1])) is not None:
+                        for node, maximum in node_set.max_length:
+                            if length > maximum:
+                                node_set = self.without(node_set, node)
+                                fail(ValueError(f"Value is too long, more than {maximum} characters"), location, offset)
+                value = decode_string(data, offset, pos)
+            elif (literal := _literals.get(char)) is not None:
+                if data[pos : pos + len(literal[0])] != literal[0]:
+                    raise JsonSyntaxError("Invalid literal", pos)
+                pos += len(literal[0])
+                value = literal[1]
+            elif (match := _number.match(data, pos)) is not None:
+                pos = match.end()
+                value = float(match[0]) if match[1] or match[2] else int(match[0])
+            else:
+                raise JsonSyntaxError("Expected a value", pos)
+
+            # the value is complete, check it and add it to its parent; close the parents that are complete as well
+            while True:
+                if node_set.nodes:
+                    self._complete(value, node_set, location, offset, budget, fail)
+                if not stack:
+                    pos = whitespace(data, pos).end()
+                    if pos != end:
+                        raise JsonSyntaxError("Extra data after the document", pos)
+                    return value
+                frame = stack[-1]
+                container = frame.container
+                if isinstance(container, dict):
+                    container[frame.key] = value if frame.keep else None
+                    for node, maximum in frame.node_set.max_properties:
+                        if len(container) > maximum:
+                            frame.node_set = self.without(frame.node_set, node)
+                            fail(ValueError(f"Object has more than {maximum} properties"), frame.location, offset)
+                else:
+                    container.append(value)
+                    for node, maximum in frame.node_set.max_items:
+                        if len(container) > maximum:
+                            frame.node_set = self.without(frame.node_set, node)
+                            fail(ValueError(f"Array has more than {maximum} items"), frame.location, offset)
+                pos = whitespace(data, pos).end()
+                separator = data[pos] if pos < end else None
+                if separator == COMMA:
+                    pos = whitespace(data, pos + 1).end()
+                    if isinstance(container, dict):
+                        pos, node_set, location = self._open_property(data, pos, frame, fail)
+                    else:
+                        node_set, location = self._open_item(pos, frame, fail)
+                    break
+                if separator != (CLOSE_OBJECT if isinstance(container, dict) else CLOSE_ARRAY):
+                    raise JsonSyntaxError("Expected , or the end of the container", pos)
+                stack.pop()
+                pos += 1
+                value, node_set, location, offset = container, frame.node_set, frame.location, frame.offset
+
+    def _open_property(self, data, pos: int, frame: Frame, fail) -> tuple[int, NodeSet, Location]:
+        """Read the key of a property, returns the position of its value and the node set that applies to it"""
+        if (match := _property_name.match(data, pos)) is None:
+            raise JsonSyntaxError("Expected a property name followed by :", pos)
+        key = decode_string(data, pos, match.end(1))
+        frame.key = key
+        location = (frame.location, key)
+        if not frame.node_set.nodes:
+            return match.end(), frame.node_set, location
+        if frame.node_set.has_patterns:
+            check_pattern_input(key)
+        node_set, failed = self.property_nodes(frame.node_set, key)
+        for node, message in failed:
+            frame.node_set = self.without(frame.node_set, node)
+            fail(ValueError(message), location, match.start())
+        return match.end(), node_set, location
+
+    def _open_item(self, pos: int, frame: Frame, fail) -> tuple[NodeSet, Location]:
+        """Returns the node set that applies to the next item of an array"""
+        location = (frame.location, str(len(frame.container)))
+        if not frame.node_set.nodes:
+            return frame.node_set, location
+        node_set, failed = self.item_nodes(frame.node_set, len(frame.container))
+        for node, message in failed:
+            frame.node_set = self.without(frame.node_set, node)
+            fail(ValueError(message), location, pos)
+        return node_set, location
+
+    def _complete(
+        self, value: Any, node_set: NodeSet, location: Location, offset: int, budget: ValidationBudget | None, fail
+    ):
+        """Run the checks that need the complete value"""
+        failed = None
+        for node, check, validates_subschemas in self.checks(node_set, INSTANCE_TYPES.get(type(value), "other")):
+            if node is failed:
+                continue  # a node stops at its first error, like in `Draft4Validator.validate`
+            try:
+                if validates_subschemas:
+                    run_check(check, node, value, location, budget)
+                else:
+                    check(node, value)
+            except ValueError as e:
+                failed = node
+                fail(e, location, offset)
+
+
+def run_check(check, node: Draft4Validator, value: Any, location: Location, budget: ValidationBudget | None):
+    """Run a check that validates subschemas (see `ValidationSteps`) by validating them in full"""
+    steps = check(node, value, location)
+    errors = None
+    try:
+        while True:
+            subvalidator, subinstance, sublocation = steps.send(errors)
+            errors = subvalidator.validate(subinstance, sublocation, budget=budget)
+    except StopIteration:
+        pass
+
+
+def string_length(data, start: int, end: int, limit: int) -> int | None:
+    """The amount of code points of the raw string between start and end, counted without decoding it
+
+    Counting stops once it exceeds the limit. None when the string has escapes, its length is then only known once
+    it is decoded.
+    """
+    if _escape.search(data, start, end) is not None:
+        return None
+    length = 0
+    for chunk_start in range(start, end, LENGTH_CHUNK_SIZE):
+        chunk = bytes(data[chunk_start : min(chunk_start + LENGTH_CHUNK_SIZE, end)])
+        length += len(chunk.translate(None, _continuation_bytes))
+        if length > limit:
+            break
+    return length
+
+
+def decode_string(data, start: int, end: int) -> str:
+    raw = bytes(data[start:end])
+    try:
+        return json.loads(raw) if b"\\" in raw else raw[1:-1].decode("utf-8")
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise JsonSyntaxError(f"Invalid string ({e})", start) from e
+
+
+def decode_validated(
+    data: bytes | bytearray | memoryview, validator: Draft4Validator, budget: ValidationBudget | None = None
+) -> Any:
+    """Decode a json document while validating it, see `StreamingValidator.decode`"""
+    return StreamingValidator(validator).decode(data, budget)
+
+
+def validate_file(
+    path: str | Path, validator: Draft4Validator, max_errors: int = 100, budget: ValidationBudget | None = None
+) -> list[StreamValidationError]:
+    """Validate a json file with bounded memory, see `StreamingValidator.validate_file`"""
+    return StreamingValidator(validator).validate_file(path, max_errors, budget)
@@ -0,0 +1,313 @@
+import copy
+import re
+from logging import getLogger
+from typing import Any, NamedTuple
+
+from dataformats.jsonschema.budget import BudgetTracker, ValidationBudget, active_budget
+from dataformats.jsonschema.custom_types import JsonType
+from dataformats.jsonschema.hashing import IdentityCache
+from dataformats.jsonschema.json_pointer import Location, materialize
+from dataformats.jsonschema.mixins.validations_mixin import (
+    MAX_VALIDATION_DEPTH,
+    Draft4Validator,
+    ValidationDepthError,
+    ValidationErrors,
+)
+
+logger = getLogger("transforms")
+
+_missing = object()
+
+# the types strings are converted to, in the order they are tried
+COERCIBLE_TYPES = ("integer", "number", "boolean", "array")
+_integer = re.compile(r"[-+]?[0-9]+")
+_number = re.compile(r"[-+]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][-+]?[0-9]+)?")
+
+
+def coerce_string(value: str, types: tuple[str, ...]) -> JsonType:
+    """Convert a string (e.g. a query parameter) to the first of the types it can be read as, unchanged when none
+
+    Strings are converted to an array of a single item, its items are converted by the schema of the array.
+    """
+    for schema_type in types:
+        if schema_type == "integer" and _integer.fullmatch(value):
+            return int(value)
+        if schema_type == "number" and _number.fullmatch(value):
+            return int(value) if _integer.fullmatch(value) else float(value)
+        if schema_type == "boolean" and value in ("true", "false"):
+            return value == "true"
+        if schema_type == "array":
+            return [value]
+    return value
+
+
+class NodeTransform(NamedTuple):
+    """What a compiled schema node, together with its allOf subschemas, changes in the objects it validates"""
+
+    defaults: tuple[tuple[str, JsonType], ...]
+    # the nodes declaring the properties that are kept, empty when objects are not projected
+    declaring: tuple[Draft4Validator, ...]
+    declared_names: frozenset[str]
+    # the types strings are converted to, empty when they are not converted
+    coerce: tuple[str, ...]
+    all_of: tuple[Draft4Validator, ...]
+    all_of_ids: frozenset[int]
+    # the subschemas validating the children of the instance
+    children: tuple[Draft4Validator, ...]
+
+
+class Output:
+    """The transformed value of an instance, copied on the first write so unchanged values are shared"""
+
+    __slots__ = ("value", "owned")
+
+    def __init__(self, value: JsonType):
+        self.value = value
+        self.owned = False
+
+    def set(self, key: str | int, value: JsonType):
+        container = self.value
+        if (container.get(key, _missing) if isinstance(container, dict) else container[key]) is value:  # type: ignore
+            return
+        if not self.owned:
+            container = self.value = container.copy()  # type: ignore[union-attr]
+            self.owned = True
+        container[key] = value  # type: ignore[index]
+
+
+class TransformingValidator:
+    """Validate instances against a compiled schema and return a transformed copy of them, in a single walk
+
+    With `fill_defaults`, the `default` of every property in `properties` that is missing from an object is added. The
+    defaults of allOf subschemas are added as well, those of the other applicators (`anyOf`, `oneOf`, `not` and
+    schema `dependencies`) are not, as they may not apply.
+
+    With `strip_undeclared`, objects are projected on their schema: properties that are not declared in `properties` or
+    `patternProperties` of the schema or one of its allOf subschemas are removed. Objects whose schema declares neither
+    (free form objects) are kept as they are.
+
+    With `coerce_strings`, strings are converted to the `type` of their schema (or of its first allOf subschema that
+    has one) before they are validated, see `coerce_string`: query parameters and form fields arrive as strings.
+    Strings are kept when the type allows strings, or when they cannot be read as one of the types.
+
+    Defaults and projections are not validated: apart from the coerced values, the errors are those of the original
+    instance, the same as `Draft4Validator.validate` reports.
+
+    The instance is never modified. Objects and arrays are copied when something in them changes, everything else is
+    shared between the instance and its transformed copy.
+    """
+
+    def __init__(
+        self,
+        validator: Draft4Validator,
+        fill_defaults: bool = True,
+        strip_undeclared: bool = False,
+        coerce_strings: bool = False,
+    ):
+        self.validator = validator
+        self.fill_defaults = fill_defaults
+        self.strip_undeclared = strip_undeclared
+        self.coerce_strings = coerce_strings
+        self._transforms: IdentityCache[NodeTransform] = IdentityCache()
+        self._changing_transforms: IdentityCache[NodeTransform | None] = IdentityCache()
+
+    def transform(self, node: Draft4Validator) -> NodeTransform:
+        if (cached := self._transforms.entry(node)) is not None:
+            return cached[1]
+        all_of = tuple(node.subvalidator(schema) for schema in node.get("allOf", ()))
+        defaults: dict[str, JsonType] = {}
+        declaring: dict[int, Draft4Validator] = {}
+        if self.strip_undeclared:
+            if "properties" in node or "patternProperties" in node:
+                declaring[id(node)] = node
+            for subvalidator in all_of:
+                declaring.update((id(other), other) for other in self.transform(subvalidator).declaring)
+        if self.fill_defaults:
+            for key, schema in (node.get("properties") or {}).items():
+                if isinstance(schema, dict) and "default" in schema:
+                    defaults[key] = schema["default"]
+            for subvalidator in all_of:
+                for key, default in self.transform(subvalidator).defaults:
+                    defaults.setdefault(key, default)
+        children = [*(node.get("properties") or {}).values(), *(node.get("patternProperties") or {}).values()]
+        for keyword in ("additionalProperties", "items", "additionalItems"):
+            subschemas = node.get(keyword)
+            children.extend(subschemas if isinstance(subschemas, list) else [subschemas])
+        subvalidators = tuple(node.subvalidator(schema) for schema in children if isinstance(schema, dict))
+        declared_names = frozenset(name for other in declaring.values() for name in other.get("properties") or ())
+        coerce: tuple[str, ...] = ()
+        if self.coerce_strings and (schema_type := node.get("type")) is not None:
+            types = [schema_type] if isinstance(schema_type, str) else schema_type
+            coerce = () if "string" in types else tuple(name for name in COERCIBLE_TYPES if name in types)
+        elif self.coerce_strings:
+            coerce = next((self.transform(subvalidator).coerce for subvalidator in all_of), ())
+        transform = NodeTransform(
+            tuple(defaults.items()),
+            tuple(declaring.values()),
+            declared_names,
+            coerce,
+            all_of,
+            frozenset(map(id, all_of)),
+            subvalidators,
+        )
+        return self._transforms.store(node, transform)
+
+    def changing_transform(self, node: Draft4Validator) -> NodeTransform | None:
+        """The transform of the node when it, or a subschema reachable from it, may change a value. Values validated by
+        nodes that do not are validated without tracking their output"""
+        if (cached := self._changing_transforms.entry(node)) is not None:
+            return cached[1]
+        reachable = {id(node): node}
+        stack = [node]
+        changes = False
+        while stack and not changes:
+            transform = self.transform(stack.pop())
+            changes = bool(transform.defaults or transform.declaring or transform.coerce)
+            for subvalidator in (*transform.all_of, *transform.children):
+                if id(subvalidator) not in reachable:
+                    reachable[id(subvalidator)] = subvalidator
+                    stack.append(subvalidator)
+        return self._changing_transforms.store(node, self.transform(node) if changes else None)
+
+    def validate(
+        self,
+        instance: Any,
+        location: Location | None = None,
+        max_depth: int = MAX_VALIDATION_DEPTH,
+        budget: ValidationBudget | None = None,
+    ) -> tuple[JsonType, ValidationErrors]:
+        """Validate the instance and transform it in the same walk
+
+        Args: see `Draft4Validator.validate`
+
+        Returns:
+            The transformed copy of the instance and the errors by location (empty when the instance is valid)
+        """
+        validator = self.validator
+        location = validator._location if location is None else location
+        tracker = None if budget is None else BudgetTracker(budget, instance)
+        budget_token = active_budget.set(budget)
+        root = Output(instance)
+        changing_transforms = self._changing_transforms
+        tracked_types = (dict, list, str) if self.coerce_strings else (dict, list)
+        try:
+            # the validations whose value is transformed as (depth of their steps in the stack, transform of the node,
+            # instance, output, output of the parent value, key in it), the parent is None for applicators as they
+            # share the output of their instance
+            tracked: list[tuple[int, NodeTransform, Any, Output, Output | None, Any]] = []
+            if (transform := self.changing_transform(validator)) is not None:
+                if transform.coerce and isinstance(instance, str):
+                    instance = self._coerce(transform, root)
+                tracked.append((1, transform, instance, root, None, None))
+            tracked_depth = 1 if tracked else 0
+            stack = [validator.validation_steps(instance, location)]
+            errors: ValidationErrors | None = None
+            while stack:
+                try:
+                    subvalidator, subinstance, sublocation = stack[-1].send(errors)  # type: ignore[arg-type]
+                except StopIteration as stop:
+                    stack.pop()
+                    if tracker is not None and stack:
+                        tracker.exit()
+                    errors = stop.value
+                    if len(stack) < tracked_depth:
+                        _, transform, _, output, parent, key = tracked.pop()
+                        tracked_depth = tracked[-1][0] if tracked else 0
+                        if parent is not None or not stack:
+                            if transform.defaults and isinstance(output.value, dict):
+                                self._fill_defaults(transform, output)
+                            if transform.declaring and isinstance(output.value, dict):
+                                self._strip_undeclared(transform, output)
+                            if parent is not None and output.owned:
+                                parent.set(key, output.value)
+                    continue
+                depth = len(stack)
+                if depth >= max_depth:
+                    raise ValidationDepthError(
+                        f"Validation exceeded the maximum depth of {max_depth} at {materialize(sublocation)}",
+                        limit="max_depth",
+                    )
+                if tracker is not None:
+                    tracker.enter(subinstance, sublocation)
+                errors = None
+                if depth == tracked_depth:
+                    _, transform, node_instance, output, _, _ = tracked[-1]
+                    if subinstance is node_instance:
+                        # applicators validate the same instance, the changes of allOf subschemas apply to it
+                        if id(subvalidator) in transform.all_of_ids:
+                            tracked_depth = depth + 1
+                            subtransform = self.transform(subvalidator)
+                            tracked.append((tracked_depth, subtransform, subinstance, output, None, None))
+                    elif isinstance(subinstance, tracked_types):
+                        # container checks validate a child
+                        if (cached := changing_transforms.get(id(subvalidator))) is not None:
+                            subtransform = cached[1]
+                        else:
+                            subtransform = self.changing_transform(subvalidator)
+                        key = sublocation[1] if isinstance(output.value, dict) else int(sublocation[1])
+                        # the key is missing when the property was stripped by an earlier validation of the object
+                        if subtransform is not None and (isinstance(output.value, list) or key in output.value):
+                            suboutput = Output(output.value[key])  # type: ignore[index]
+                            if subtransform.coerce and isinstance(suboutput.value, str):
+                                subinstance = self._coerce(subtransform, suboutput)
+                            tracked_depth = depth + 1
+                            tracked.append((tracked_depth, subtransform, subinstance, suboutput, output, key))
+                stack.append(subvalidator.validation_steps(subinstance, sublocation))
+        finally:
+            active_budget.reset(budget_token)
+        return root.value, errors  # type: ignore[return-value]
+
+    def _coerce(self, transform: NodeTransform, output: Output) -> JsonType:
+        """Convert the string value to the type of the node, before it is validated"""
+        value = coerce_string(output.value, transform.coerce)  # type: ignore[arg-type]
+        if value is not output.value:
+            output.value = value
+            output.owned = True  # a new value, to be set in the parent
+        return value
+
+    def _fill_defaults(self, transform: NodeTransform, output: Output):
+        """Add the missing properties that have a default, once all subschemas of the object have been validated"""
+        for key, default in transform.defaults:
+            if key not in output.value:
+                output.set(key, copy.deepcopy(default))
+
+    def _strip_undeclared(self, transform: NodeTransform, output: Output):
+        """Remove the properties no node declares, with the classification of the object container checks"""
+        dict_object: dict[str, Any] = output.value  # type: ignore[assignment]
+        declared_names = transform.declared_names
+        if declared_names.issuperset(dict_object):
+            return
+        kept = {
+            key: value
+            for key, value in dict_object.items()
+            if key in declared_names or any(node.declared_property_schemas(key) for node in transform.declaring)
+        }
+        if len(kept) != len(dict_object):
+            output.value = kept
+            output.owned = True
+
+
+def validate_with_defaults(
+    instance: JsonType, validator: Draft4Validator, budget: ValidationBudget | None = None
+) -> tuple[JsonType, ValidationErrors]:
+    """Validate an instance and return a copy of it with the defaults of its properties filled in, see
+    `TransformingValidator`"""
+    return TransformingValidator(validator).validate(instance, budget=budget)
+
+
+def validate_projection(
+    instance: JsonType, validator: Draft4Validator, budget: ValidationBudget | None = None
+) -> tuple[JsonType, ValidationErrors]:
+    """Validate an instance and return a copy of it without the properties its schema does not declare, see
+    `TransformingValidator`"""
+    projecting_validator = TransformingValidator(validator, fill_defaults=False, strip_undeclared=True)
+    return projecting_validator.validate(instance, budget=budget)
+
+
+def validate_coerced(
+    instance: JsonType, validator: Draft4Validator, budget: ValidationBudget | None = None
+) -> tuple[JsonType, ValidationErrors]:
+    """Convert the strings in an instance to the types of their schemas while validating it, see
+    `TransformingValidator`"""
+    coercing_validator = TransformingValidator(validator, fill_defaults=False, coerce_strings=True)
+    return coercing_validator.validate(instance, budget=budget)
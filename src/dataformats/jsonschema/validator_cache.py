@@ -0,0 +1,121 @@
+import hashlib
+from collections import OrderedDict
+from copy import deepcopy
+from logging import getLogger
+from threading import Lock
+from typing import NamedTuple
+
+from dataformats.jsonschema.custom_types import SchemaType
+from dataformats.jsonschema.hashing import canonical_json
+from dataformats.jsonschema.mixins.schema_parsing import is_absolute
+from dataformats.jsonschema.mixins.validations_mixin import Draft4Validator
+from dataformats.jsonschema.regex_risk import RegexRiskMode, check_regex_risk_mode, check_schema_patterns
+
+logger = getLogger("validator_cache")
+
+
+class ValidatorCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    bytes: int
+
+
+class ValidatorCache:
+    """Bounded LRU cache of compiled validators
+
+    Schemas with an absolute id are keyed by that id, other schemas by the hash of their content. The size of an entry
+    is estimated by the length of the canonical serialization of its schema. When either limit is exceeded, the least
+    recently used validators are evicted. Cached schemas should not be modified, invalidate them instead.
+
+    With `regex_risk` the patterns of a schema are checked for catastrophic backtracking before it is compiled, see
+    `check_schema_patterns`. Rewritten patterns are applied to a copy, the given schema is not modified.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        id_key: str = "id",
+        regex_risk: RegexRiskMode | None = None,
+    ):
+        check_regex_risk_mode(regex_risk)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.id_key = id_key
+        self.regex_risk = regex_risk
+        self._entries: OrderedDict[str, tuple[Draft4Validator, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, schema: SchemaType) -> str:
+        """Cache key of the schema: its absolute id or its content hash"""
+        schema_id = schema.get(self.id_key)
+        if isinstance(schema_id, str) and is_absolute(schema_id):
+            return schema_id
+        return hashlib.sha256(canonical_json(schema).encode()).hexdigest()
+
+    def get(self, schema: SchemaType) -> Draft4Validator:
+        """The compiled validator for the schema, compiled and cached when it was not seen before"""
+        key = self.key(schema)
+        with self._lock:
+            if (entry := self._entries.get(key)) is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # compiled outside of the lock, concurrent misses for the same schema may compile it twice
+        if self.regex_risk == "rewrite":
+            schema = deepcopy(schema)
+        check_schema_patterns(schema, self.regex_risk)
+        validator = Draft4Validator(**schema)
+        size = len(canonical_json(schema).encode())
+        if size > self.max_bytes:
+            logger.debug(f"Not caching {key}, its size ({size}) exceeds the limit of {self.max_bytes} bytes")
+            return validator
+
+        with self._lock:
+            if (previous := self._entries.pop(key, None)) is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (validator, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                evicted_key, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+                logger.debug(f"Evicted {evicted_key}")
+        return validator
+
+    def invalidate(self, schema_or_key: SchemaType | str | None = None):
+        """Remove a schema (by the schema itself or by its key) from the cache, or every schema when none is given"""
+        with self._lock:
+            if schema_or_key is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            key = schema_or_key if isinstance(schema_or_key, str) else self.key(schema_or_key)
+            if (entry := self._entries.pop(key, None)) is not None:
+                self._bytes -= entry[1]
+
+    def __contains__(self, schema_or_key: SchemaType | str) -> bool:
+        key = schema_or_key if isinstance(schema_or_key, str) else self.key(schema_or_key)
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def cache_info(self) -> ValidatorCacheInfo:
+        return ValidatorCacheInfo(self.hits, self.misses, self.evictions, len(self._entries), self._bytes)
+
+
+validator_cache = ValidatorCache()
+
+
+def get_validator(schema: SchemaType) -> Draft4Validator:
+    """Compiled validator for the schema from the process wide cache"""
+    return validator_cache.get(schema)
@@ -1,14 +1,17 @@
 import functools
+import hashlib
+import threading
 import time
 from http.client import HTTPConnection
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 from subprocess import PIPE, Popen
 from typing import Any
 
 import pydantic
 import pytest
-import requests
 from dataformats.jsonschema.draft_4 import DRAFT4_SCHEMA
+from dataformats.jsonschema.retrievers import HttpRetriever, default_retriever
 
 # from dataformats.jsonschema.pydantic_model import Draft4MetaSchema
 
@@ -86,9 +89,75 @@ def http_server_process(remotes_dir: Path):
 
 @pytest.fixture(autouse=True)
 def patch_requests_to_localhost_remotes_server(monkeypatch: pytest.MonkeyPatch):
+    """Give every test a fresh http retriever with a short timeout, so no responses are cached across tests"""
+    http_retriever = HttpRetriever(timeout=0.01)
     with monkeypatch.context() as m:
-        timeout_get = functools.partial(requests.get, timeout=0.01)
-        m.setattr("requests.get", timeout_get)
+        m.setitem(default_retriever.retrievers, "http", http_retriever)
+        m.setitem(default_retriever.retrievers, "https", http_retriever)
+        yield
+    http_retriever.session.close()
+
+
+class SchemaRequestHandler(SimpleHTTPRequestHandler):
+    """Static file handler that records requests and answers conditional requests based on an ETag"""
+
+    requested_paths: list[str]
+    not_modified_paths: list[str]
+    cache_control: str | None = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_head(self):
+        self.requested_paths.append(self.path)
+        path = Path(self.translate_path(self.path))
+        if not path.is_file():
+            return super().send_head()
+        etag = f'"{hashlib.sha256(path.read_bytes()).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.not_modified_paths.append(self.path)
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return None
+        body = path.open("rb")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(path.stat().st_size))
+        self.send_header("ETag", etag)
+        if self.cache_control:
+            self.send_header("Cache-Control", self.cache_control)
+        self.end_headers()
+        return body
+
+
+@pytest.fixture
+def schema_server(tmp_path: Path):
+    """
+    Serve a temporary directory over http from a thread on a free port. Yields the server, tests write their schemas to
+    `server.directory` and inspect `server.requested_paths`.
+    """
+    directory = tmp_path / "served"
+    directory.mkdir()
+    handler = type(
+        "Handler",
+        (SchemaRequestHandler,),
+        {
+            "requested_paths": [],
+            "not_modified_paths": [],
+            "__init__": functools.partialmethod(SchemaRequestHandler.__init__, directory=str(directory)),
+        },
+    )
+    server = ThreadingHTTPServer(("localhost", 0), handler)
+    server.directory = directory  # type: ignore[attr-defined]
+    server.requested_paths = handler.requested_paths  # type: ignore[attr-defined]
+    server.not_modified_paths = handler.not_modified_paths  # type: ignore[attr-defined]
+    server.base_uri = f"http://localhost:{server.server_port}"  # type: ignore[attr-defined]
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
 
 
 class SchemaTestSuiteFile(pydantic.BaseModel):
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from dataformats.jsonschema.async_pipeline import ValidationStage
+from dataformats.jsonschema.budget import ValidationBudget
+from dataformats.jsonschema.mixins.validations_mixin import Draft4Validator
+
+VALIDATOR = Draft4Validator(type="object", properties={"id": {"type": "integer"}})
+
+
+async def stream(instances, produced: list | None = None):
+    for instance in instances:
+        if produced is not None:
+            produced.append(instance)
+        yield instance
+        await asyncio.sleep(0)
+
+
+def collect(stage: ValidationStage, instances) -> list:
+    async def run():
+        return [result async for result in stage.run(stream(instances))]
+
+    return asyncio.run(run())
+
+
+def test_ordered_results():
+    instances = [{"id": index} if index % 3 else {"id": str(index)} for index in range(20)]
+    with ThreadPoolExecutor(4) as executor:
+        results = collect(ValidationStage(VALIDATOR, executor, max_in_flight=4), instances)
+    assert [result.index for result in results] == list(range(20))
+    assert [result.instance for result in results] == instances
+    assert [bool(result.errors) for result in results] == [index % 3 == 0 for index in range(20)]
+
+
+def test_results_as_completed():
+    release_first = threading.Event()
+
+    class SlowFirst(ValidationStage):
+        def _validate(self, index, instance):
+            if index == 0:
+                release_first.wait(5)
+            elif index == 3:
+                release_first.set()
+            return super()._validate(index, instance)
+
+    with ThreadPoolExecutor(4) as executor:
+        results = collect(SlowFirst(VALIDATOR, executor, max_in_flight=4, ordered=False), [{"id": 1}] * 6)
+    assert sorted(result.index for result in results) == list(range(6))
+    assert results[0].index != 0
+
+
+def test_backpressure():
+    produced: list = []
+    stage = ValidationStage(VALIDATOR, max_in_flight=3)
+    depths = []
+
+    async def run():
+        async for result in stage.run(stream([{"id": index} for index in range(10)], produced)):
+            depths.append(stage.queue_depth)
+            # the consumer is slow, the source is not read beyond the limit
+            assert len(produced) <= result.index + 1 + 3
+            await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert max(depths) <= 2 and stage.queue_depth == 0 and stage.in_flight == 0
+    with pytest.raises(ValueError, match="at least 1"):
+        ValidationStage(VALIDATOR, max_in_flight=0)
+
+
+def test_budget_exceeded():
+    stage = ValidationStage(VALIDATOR, budget=ValidationBudget(max_nodes=1))
+    [result] = collect(stage, [{"id": 1}])
+    assert result.exceeded is not None and result.errors == {"non lazy": [result.exceeded]}
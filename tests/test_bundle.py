@@ -0,0 +1,123 @@
+from pathlib import Path
+
+import pytest
+from dataformats.jsonschema.custom_types import SchemaType
+from dataformats.jsonschema.mixins.bundle import bundle, load_bundle, write_bundle
+from dataformats.jsonschema.mixins.dereference_mixin import dereference
+from dataformats.jsonschema.retrievers import MemoryRetriever
+
+
+@pytest.fixture
+def retriever() -> MemoryRetriever:
+    return MemoryRetriever(
+        {
+            "http://localhost/money.json": {
+                "definitions": {"amount": {"type": "number"}},
+                "properties": {"amount": {"$ref": "#/definitions/amount"}, "currency": {"$ref": "currency.json"}},
+            },
+            "http://localhost/currency.json": {"type": "string", "pattern": "^[A-Z]{3}$"},
+            "http://localhost/copy/currency.json": {"type": "string", "pattern": "^[A-Z]{3}$"},
+            "http://localhost/nested/address.json": {
+                "id": "http://localhost/nested/address.json",
+                "properties": {"country": {"id": "country.json", "type": "string"}},
+            },
+        }
+    )
+
+
+def test_bundle(retriever: MemoryRetriever):
+    schema: SchemaType = {
+        "id": "http://localhost/order.json",
+        "properties": {
+            "price": {"$ref": "money.json"},
+            "amount": {"$ref": "money.json#/definitions/amount"},
+            "local": {"$ref": "#/definitions/local"},
+        },
+        "definitions": {"local": {"type": "integer"}},
+    }
+    bundled = bundle(schema, retriever=retriever)
+
+    assert bundled["properties"] == {
+        "price": {"$ref": "#/definitions/money"},
+        "amount": {"$ref": "#/definitions/money/definitions/amount"},
+        "local": {"$ref": "#/definitions/local"},
+    }
+    assert bundled["definitions"]["money"]["properties"] == {  # type: ignore
+        "amount": {"$ref": "#/definitions/money/definitions/amount"},
+        "currency": {"$ref": "#/definitions/currency"},
+    }
+    assert bundled["definitions"]["currency"] == {"type": "string", "pattern": "^[A-Z]{3}$"}  # type: ignore
+    assert schema["properties"]["price"] == {"$ref": "money.json"}  # type: ignore
+
+
+def test_bundle_deduplicates_by_content(retriever: MemoryRetriever):
+    schema: SchemaType = {
+        "id": "http://localhost/order.json",
+        "items": [{"$ref": "currency.json"}, {"$ref": "copy/currency.json"}],
+    }
+    bundled = bundle(schema, retriever=retriever)
+    assert bundled["items"] == [{"$ref": "#/definitions/currency"}, {"$ref": "#/definitions/currency"}]
+    assert list(bundled["definitions"]) == ["currency"]  # type: ignore
+
+
+def test_bundle_keeps_identical_documents_with_relative_refs_apart():
+    retriever = MemoryRetriever(
+        {
+            "http://localhost/eu/price.json": {"properties": {"currency": {"$ref": "currency.json"}}},
+            "http://localhost/eu/currency.json": {"enum": ["EUR"]},
+            "http://localhost/us/price.json": {"properties": {"currency": {"$ref": "currency.json"}}},
+            "http://localhost/us/currency.json": {"enum": ["USD"]},
+        }
+    )
+    schema: SchemaType = {
+        "id": "http://localhost/order.json",
+        "items": [{"$ref": "eu/price.json"}, {"$ref": "us/price.json"}],
+    }
+    bundled = bundle(schema, retriever=retriever)
+    assert bundled["items"] == [{"$ref": "#/definitions/price"}, {"$ref": "#/definitions/price_2"}]
+    assert bundled["definitions"]["price_2"]["properties"]["currency"] == {  # type: ignore
+        "$ref": "#/definitions/currency_2"
+    }
+    assert bundled["definitions"]["currency_2"] == {"enum": ["USD"]}  # type: ignore
+
+
+def test_bundle_by_nested_id(retriever: MemoryRetriever):
+    schema: SchemaType = {
+        "id": "http://localhost/order.json",
+        "properties": {"address": {"$ref": "nested/address.json"}, "country": {"$ref": "nested/country.json"}},
+    }
+    bundled = bundle(schema, retriever=retriever)
+    assert bundled["properties"]["country"] == {"$ref": "#/definitions/address/properties/country"}  # type: ignore
+    assert bundled["definitions"]["address"] == {"properties": {"country": {"type": "string"}}}  # type: ignore
+
+
+def test_bundle_without_id():
+    schema: SchemaType = {"items": {"$ref": "#/definitions/a"}, "definitions": {"a": {"type": "integer"}}}
+    assert bundle(schema) == schema
+
+
+def test_bundle_plain_name_fragment():
+    schema: SchemaType = {"id": "http://localhost/order.json", "items": {"$ref": "#foo"}}
+    with pytest.raises(ValueError, match="json pointer fragments"):
+        bundle(schema)
+
+
+def test_bundle_escaped_keys(retriever: MemoryRetriever):
+    schema: SchemaType = {
+        "id": "http://localhost/order.json",
+        "definitions": {"a/b c": {"type": "integer"}},
+        "items": {"$ref": "#/definitions/a~1b%20c"},
+    }
+    assert bundle(schema, retriever=retriever)["items"] == {"$ref": "#/definitions/a~1b%20c"}
+
+
+def test_write_and_load_bundle(retriever: MemoryRetriever, tmp_path: Path):
+    schema: SchemaType = {"id": "http://localhost/order.json", "properties": {"price": {"$ref": "money.json"}}}
+    bundle_path = tmp_path / "bundle.json"
+    write_bundle(bundle_path, schema, retriever=retriever)
+    assert "\n" not in bundle_path.read_text()
+
+    loaded = load_bundle(bundle_path)
+    dereference(schema=loaded, download=False, retriever=MemoryRetriever())
+    currency = loaded["properties"]["price"]["properties"]["currency"]  # type: ignore
+    assert currency == {"type": "string", "pattern": "^[A-Z]{3}$"}
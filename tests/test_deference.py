@@ -4,6 +4,7 @@ import pytest
 import requests
 from dataformats.jsonschema.custom_types import SchemaType
 from dataformats.jsonschema.mixins.dereference_mixin import (
+    analyze_ref,
     dereference,
     replace_schema_in_place,
     retrieve_schema,
@@ -68,6 +69,23 @@ def test_replace_ref_with_target():
 #     assert c_ref[1] == [json_object, json_object["c"]]
 
 
+def test_analyze_ref():
+    assert analyze_ref("other.json#/definitions/a", "http://localhost/root.json") == (
+        "http://localhost/other.json",
+        "/definitions/a",
+    )
+    assert analyze_ref("#/definitions/a", "http://localhost/root.json") == ("http://localhost/root.json", "/definitions/a")
+    assert analyze_ref("#/definitions/a", None) == (None, "/definitions/a")
+    assert analyze_ref("HTTP://Localhost/absolute.json", None) == ("http://localhost/absolute.json", "")
+
+
+def test_analyze_ref_memoized():
+    analyze_ref("memoized.json", "http://localhost/root.json")
+    hits = analyze_ref.cache_info().hits
+    analyze_ref("memoized.json", "http://localhost/root.json")
+    assert analyze_ref.cache_info().hits == hits + 1
+
+
 def test_simple_inline_deref():
     json_object: SchemaType = {"definitions": {"target_key": "target_value"}, "b": {"$ref": "#/definitions"}}
     dereference(schema=json_object, download=False)
@@ -0,0 +1,62 @@
+import pytest
+from dataformats.jsonschema.format import (
+    format_registry,
+    is_date_time,
+    is_email,
+    is_hostname,
+    is_ipv4,
+    is_ipv6,
+    is_regex,
+    is_uri,
+)
+from dataformats.jsonschema.mixins.validations_mixin import Draft4Validator
+
+
+@pytest.mark.parametrize(
+    "checker, valid, invalid",
+    [
+        (is_date_time, "2023-05-01T12:30:00.5+02:00", "2023-02-29T12:30:00Z"),
+        (is_date_time, "1998-12-31T23:59:60Z", "1998-12-31T22:59:60Z"),
+        (is_date_time, "1998-12-31t15:59:60.123-08:00", "2023-05-01"),
+        (is_ipv4, "192.168.0.1", "192.168.0.01"),
+        (is_ipv6, "::ffff:192.168.0.1", "1::2::3"),
+        (is_ipv6, "2001:db8::8a2e:370:7334", "fe80::1%eth0"),
+        (is_hostname, "www.example.com", "-example.com"),
+        (is_email, "first.last@example.com", "first..last@example.com"),
+        (is_uri, "https://example.com/a?b=%20#c", "/relative/path"),
+        (is_regex, "^[a-z]+$", "^(abc"),
+    ],
+)
+def test_format_checkers(checker, valid: str, invalid: str):
+    assert checker(valid)
+    assert not checker(invalid)
+
+
+def test_validate_format():
+    validator = Draft4Validator(**{"format": "ipv4"})
+    assert not validator.validate("127.0.0.1")
+    assert not validator.validate(12)  # formats only apply to strings
+    assert "not a valid ipv4 string" in str(validator.validate("127.0.0")["non lazy"][0])
+
+
+def test_unknown_format():
+    assert not Draft4Validator(**{"format": "unknown"}).validate("anything")
+
+
+def test_register_format(monkeypatch: pytest.MonkeyPatch):
+    checked = []
+
+    def is_even_length(value: str) -> bool:
+        checked.append(value)
+        return len(value) % 2 == 0
+
+    monkeypatch.setattr(format_registry, "_checkers", dict(format_registry._checkers))
+    format_registry.register("even", is_even_length, cache_size=16)
+    validator = Draft4Validator(**{"items": {"format": "even"}})
+    assert not validator.validate(["ab", "ab", "abcd"])
+    assert validator.validate(["abc"])
+    assert checked == ["ab", "abcd", "abc"]
+
+    format_registry.unregister("even")
+    assert "even" not in format_registry
+    assert validator.validate(["abc"])  # bound when the schema was compiled
@@ -0,0 +1,81 @@
+import pytest
+from dataformats.jsonschema.incremental import JsonPatchError, ValidatedDocument, json_equal, parse_patch_pointer
+from dataformats.jsonschema.json_pointer import Pointer
+from dataformats.jsonschema.mixins.validations_mixin import Draft4Validator
+
+SCHEMA = {
+    "type": "object",
+    "required": ["name"],
+    "maxProperties": 3,
+    "properties": {
+        "name": {"type": "string"},
+        "ports": {"type": "array", "uniqueItems": True, "items": {"type": "integer"}},
+        "mode": {"oneOf": [{"enum": ["a", "b"]}, {"type": "string", "maxLength": 1}]},
+    },
+}
+
+
+def make_document() -> ValidatedDocument:
+    return ValidatedDocument(Draft4Validator(**SCHEMA), {"name": "svc", "ports": [80, 443], "mode": "c"})
+
+
+def test_only_touched_locations_are_revalidated():
+    document = make_document()
+    assert not document.errors
+    assert not document.apply([{"op": "replace", "path": "/ports/1", "value": 8080}])
+    assert document.revalidated == 3  # the root, /ports and /ports/1
+    assert document.apply([{"op": "replace", "path": "/ports/1", "value": "x"}])
+    assert document.document == {"name": "svc", "ports": [80, "x"], "mode": "c"}
+
+
+@pytest.mark.parametrize(
+    "patch",
+    [
+        [{"op": "remove", "path": "/name"}],  # required
+        [{"op": "add", "path": "/extra", "value": 1}],  # maxProperties
+        [{"op": "add", "path": "/ports/-", "value": 80}],  # uniqueItems
+        [{"op": "replace", "path": "/mode", "value": "a"}],  # oneOf, both match
+        [{"op": "move", "from": "/name", "path": "/other"}],
+    ],
+)
+def test_ancestors_are_revalidated(patch):
+    document = make_document()
+    assert document.apply(patch)
+    assert document.apply([{"op": "test", "path": "", "value": document.document}])  # nothing changed
+
+
+def test_array_items_shift():
+    document = ValidatedDocument(Draft4Validator(items=[{"type": "string"}, {"type": "integer"}]), ["a", 1])
+    assert document.apply([{"op": "add", "path": "/0", "value": 2}])
+    assert not document.apply([{"op": "remove", "path": "/0"}])
+    assert document.apply([{"op": "copy", "from": "/1", "path": "/0"}])
+
+
+def test_patch_is_atomic():
+    document = make_document()
+    patch = [
+        {"op": "remove", "path": "/name"},
+        {"op": "add", "path": "/ports/0", "value": 1},
+        {"op": "test", "path": "/mode", "value": "d"},
+    ]
+    with pytest.raises(JsonPatchError, match="Test of /mode failed"):
+        document.apply(patch)
+    assert list(document.document.items()) == [("name", "svc"), ("ports", [80, 443]), ("mode", "c")]
+
+    for invalid in [
+        [{"op": "remove", "path": "/missing"}],
+        [{"op": "add", "path": "/ports/3", "value": 1}],
+        [{"op": "add", "path": "/ports/01", "value": 1}],
+        [{"op": "move", "from": "/ports", "path": "/ports/0"}],
+        [{"op": "replace", "path": "name", "value": 1}],
+        [{"op": "unknown", "path": "/name"}],
+        {"op": "remove", "path": "/name"},
+    ]:
+        with pytest.raises(JsonPatchError):
+            document.apply(invalid)  # type: ignore[arg-type]
+    assert document.document == {"name": "svc", "ports": [80, 443], "mode": "c"}
+
+
+def test_patch_pointers():
+    assert parse_patch_pointer("/a~1b/~0/") == Pointer().extended_copy("a~1b").extended_copy("~0").extended_copy("")
+    assert json_equal({"a": [1, 2.0]}, {"a": [1.0, 2]}) and not json_equal([1], [True])
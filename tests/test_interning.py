@@ -0,0 +1,66 @@
+import pytest
+from dataformats.jsonschema.custom_types import SchemaType
+from dataformats.jsonschema.interning import SchemaInterner, SchemaRegistry
+
+
+def money() -> SchemaType:
+    return {"type": "object", "properties": {"amount": {"type": "number"}, "currency": {"type": "string"}}}
+
+
+def test_intern_identical_subschemas():
+    interner = SchemaInterner()
+    order = interner.intern({"properties": {"price": money(), "tax": money()}})
+    invoice = interner.intern({"properties": {"total": money()}, "required": ["total"]})
+
+    assert order["properties"]["price"] is order["properties"]["tax"]  # type: ignore
+    assert invoice["properties"]["total"] is order["properties"]["price"]  # type: ignore
+    assert order["properties"]["price"] == money()  # type: ignore
+
+
+def test_intern_distinguishes_types():
+    interner = SchemaInterner()
+    schema = interner.intern({"items": [{"minimum": 1}, {"minimum": 1.0}, {"minimum": True}, {"minimum": 1}]})
+    first, second, third, fourth = schema["items"]  # type: ignore
+    assert first is fourth
+    assert first is not second and first is not third
+
+
+def test_intern_key_order():
+    interner = SchemaInterner()
+    first = interner.intern({"type": "string", "maxLength": 3})
+    assert interner.intern({"maxLength": 3, "type": "string"}) is first
+    assert interner.schema_hash(first) is not None
+
+
+def test_shared_validators():
+    registry = SchemaRegistry()
+    order = registry.add("order", {"properties": {"price": money(), "tax": money()}})
+    invoice = registry.add("invoice", {"items": money()})
+
+    assert order.subvalidator(order["properties"]["price"]) is invoice.subvalidator(invoice["items"])
+    assert not registry.validate("order", {"price": {"amount": 1, "currency": "EUR"}})
+    assert registry.validate("invoice", [{"amount": "1"}])
+    assert len(registry) == 2 and "order" in registry
+
+
+def test_registry_duplicate_name():
+    registry = SchemaRegistry()
+    registry.add("order", money())
+    with pytest.raises(ValueError, match="already registered"):
+        registry.add("order", money())
+
+
+def test_intern_cyclic_schema():
+    interner = SchemaInterner()
+    tree: SchemaType = {"type": "object", "properties": {"leaf": money()}}
+    tree["properties"]["children"] = {"type": "array", "items": tree}  # type: ignore
+
+    canonical = interner.intern(tree)
+    assert canonical is tree
+    assert interner.schema_hash(tree) is None
+    assert tree["properties"]["leaf"] is interner.intern(money())  # type: ignore
+
+    validator = interner.validator(tree)
+    assert interner.validator(tree) is validator
+    assert not validator.validate({"children": [{"children": [], "leaf": {"amount": 1}}]})
+    assert validator.validate({"children": [{"children": "no array"}]})
@@ -1,6 +1,9 @@
+import copy
+import pickle
+
 import pytest
 from dataformats.jsonschema.custom_types import JsonType
-from dataformats.jsonschema.json_pointer import Pointer
+from dataformats.jsonschema.json_pointer import Pointer, PointerIndex, materialize
 
 
 def test_pointer_from_string():
@@ -96,8 +99,7 @@ def test_pointer_beyond_lead():
 
 
 def test_add_parts():
-    pointer = Pointer.from_string("/some/pointer")
-    pointer.add_part("added_part")
+    pointer = Pointer.from_string("/some/pointer").extended_copy("added_part")
     object: JsonType = {"some": {"pointer": {"added_part": "pointer_target"}}}
     assert "pointer_target" == pointer.follow_pointer(object)
 
@@ -109,6 +111,40 @@ def test_extended_copy():
     assert str(extended_pointer) == "/some/pointer/child"
 
 
+def test_extended_copy_shares_parent():
+    pointer = Pointer.from_string("/some/pointer")
+    extended_pointer = pointer.extended_copy("child")
+    assert extended_pointer.parent is pointer
+    assert pointer.parts == ["", "some", "pointer"]
+
+
+def test_root_is_shared():
+    assert Pointer() is Pointer.from_string("")
+
+
+def test_hash_equal_pointers():
+    built = Pointer().extended_copy("some").extended_copy("slash/part")
+    parsed = Pointer.from_string("/some/slash~1part")
+    assert built == parsed
+    assert hash(built) == hash(parsed)
+    assert {built: "value"}[parsed] == "value"
+
+
+def test_deep_pointer():
+    pointer = Pointer()
+    for _ in range(5000):
+        pointer = pointer.extended_copy("a")
+    assert len(pointer) == 5000
+    assert str(pointer) == "/a" * 5000
+    assert len(pointer.parts) == 5001
+
+
+def test_copy_and_pickle():
+    pointer = Pointer.from_string("/some/pointer")
+    assert copy.deepcopy(pointer) is pointer
+    assert pickle.loads(pickle.dumps(pointer)) == pointer
+
+
 def test_is_parent_of_true():
     parent = Pointer.from_string("/some/pointer")
     child = Pointer.from_string("/some/pointer/child")
@@ -168,3 +204,60 @@ def test_parent_empty():
     emptypointer = Pointer()
     with pytest.raises(ValueError):
         _ = emptypointer.parent
+
+
+def test_materialize():
+    location = ((Pointer("some"), "slash~1part"), "0")
+    assert materialize(location) == Pointer("some", "slash/part", "0")
+    assert materialize(Pointer("some")) == Pointer("some")
+
+
+def test_from_string_memoized():
+    assert Pointer.from_string("/memoized/pointer") is Pointer.from_string("/memoized/pointer")
+
+
+def test_follow_does_not_format_document():
+    class Unprintable(dict):
+        def __repr__(self):
+            raise AssertionError("the document should not be formatted")
+
+    document = Unprintable(path={"to": ["target"]})
+    assert Pointer.from_string("/path/to/0").follow_pointer(document) == "target"
+
+
+def test_joined():
+    assert Pointer("a").joined(Pointer.from_string("/b~1c/0")) == Pointer("a", "b/c", "0")
+
+
+def test_index_follow_pointer():
+    document: JsonType = {"path": {"to": ["nope", {"object": "target"}]}}
+    index = PointerIndex(document)
+    assert len(index) == 6
+    assert index.follow_pointer(Pointer.from_string("/path/to/1/object")) == "target"
+    assert index.follow_pointer(Pointer()) is document
+
+
+def test_index_follow_fail():
+    index = PointerIndex({"path": {"to": ["nope", {"object": "target"}]}})
+    with pytest.raises(ValueError, match="out of bound"):
+        index.follow_pointer(Pointer.from_string("/path/to/3/object"))
+
+
+def test_index_replace():
+    document: JsonType = {"a": {"$ref": "#/b"}, "b": {"c": {"d": "target"}}}
+    index = PointerIndex(document)
+    assert Pointer("a", "$ref") in index
+
+    document["a"] = document["b"]  # type: ignore[index]
+    index.replace(Pointer("a"), document["b"])  # type: ignore[index]
+
+    assert Pointer("a", "$ref") not in index
+    assert index.follow_pointer(Pointer("a", "c", "d")) == "target"
+    assert Pointer("a", "c") in index
+
+
+def test_index_recursive_document():
+    document: dict = {"a": {}}
+    document["a"]["self"] = document["a"]
+    index = PointerIndex(document)
+    assert index.follow_pointer(Pointer("a", "self", "self", "self")) is document["a"]
@@ -0,0 +1,109 @@
+import pytest
+from dataformats.jsonschema.budget import ValidationBudget, ValidationBudgetExceeded
+from dataformats.jsonschema.message_routing import MessageRouter, UnknownMessageType
+from dataformats.jsonschema.mixins.validations_mixin import flatten_errors
+
+
+def event_schema(*event_types: str, **properties) -> dict:
+    return {
+        "type": "object",
+        "required": ["type", *properties],
+        "properties": {"type": {"enum": list(event_types)}, **properties},
+    }
+
+
+def make_router() -> MessageRouter:
+    router = MessageRouter()
+    router.add(event_schema("order.created", "order.updated", order_id={"type": "integer"}))
+    router.add(event_schema("user.deleted", user_id={"type": "string"}))
+    router.add({"type": "object"}, message_types=["ping"])
+    return router
+
+
+def test_routes_by_discriminator():
+    router = make_router()
+    assert len(router) == 4 and len(router.registry) == 3
+    assert not router.validate({"type": "order.updated", "order_id": 1}).errors
+    result = router.validate({"type": "user.deleted", "user_id": 1})
+    assert result.message_type == "user.deleted" and [location for location, _ in flatten_errors(result.errors)] == [
+        "/user_id"
+    ]
+    with pytest.raises(ValueError, match="already registered"):
+        router.add({}, message_types=["ping"])
+    with pytest.raises(ValueError, match="could not be derived"):
+        router.add({"properties": {"type": {"type": "string"}}})
+
+
+def test_unknown_message_types():
+    router = make_router()
+    for message, message_type, error in [
+        ({"type": "user.created"}, "user.created", "No schema is registered for message type 'user.created'"),
+        ({"kind": "ping"}, None, "Message has no type"),
+        ([], None, "Message has no type"),
+        ({"type": ["ping"]}, None, "The type of a message should be a scalar, not ['ping']"),
+        ({"type": True}, True, "No schema is registered for message type True"),
+    ]:
+        result = router.validate(message)
+        [unknown_type] = result.errors["non lazy"]
+        assert result.message_type == message_type
+        assert isinstance(unknown_type, UnknownMessageType) and str(unknown_type) == error
+
+
+def test_booleans_are_not_numbers():
+    router = MessageRouter(discriminator="version")
+    router.add({"properties": {"number": {"type": "integer"}}}, message_types=[1])
+    router.add({"properties": {"flag": {"type": "boolean"}}}, message_types=[True])
+    with pytest.raises(ValueError, match=r"message type 1\.0 \(as 1\)"):
+        router.add({}, message_types=[1.0])
+    assert router.route({"version": 1.0})[1] is not router.route({"version": True})[1]
+    assert not router.validate({"version": True, "flag": False}).errors
+    assert router.validate({"version": 1, "flag": False}).message_type == 1
+    assert router.validate({"version": 1.0, "number": "1"}).errors
+    assert {message_type: stat[:2] for message_type, stat in router.stats().items()} == {
+        (bool, True): (1, 0),
+        1: (2, 1),
+    }
+
+
+def test_batch_and_stats():
+    router = make_router()
+    messages = [
+        {"type": "order.created", "order_id": 1},
+        {"type": "order.created", "order_id": "1"},
+        {"type": "ping"},
+        {"type": "unknown"},
+        {"type": "order.created", "order_id": 2},
+    ]
+    results = router.validate_batch(messages)
+    assert [bool(result.errors) for result in results] == [False, True, False, True, False]
+    router.validate({"type": "ping"})
+    stats = router.stats()
+    assert {message_type: stat[:2] for message_type, stat in stats.items()} == {
+        "order.created": (3, 1),
+        "ping": (2, 0),
+        None: (1, 1),
+    }
+    assert stats["order.created"].seconds > 0
+
+
+def test_budget_exceeded_per_message():
+    router = make_router()
+    router.budget = ValidationBudget(max_nodes=2)
+    results = router.validate_batch(
+        [{"type": "order.created", "order_id": 1}, {"type": "ping"}, {"type": "order.created", "order_id": 2}]
+    )
+    assert [type(error) for result in results for error in result.errors.get("non lazy", [])] == [
+        ValidationBudgetExceeded,
+        ValidationBudgetExceeded,
+    ]
+    assert not results[1].errors
+    assert {message_type: stat[:2] for message_type, stat in router.stats().items()} == {
+        "order.created": (2, 2),
+        "ping": (1, 0),
+    }
+
+
+def test_route_on_schema_ids():
+    router = MessageRouter(discriminator="$schema")
+    router.add({"id": "https://example.com/events/ping.json", "required": ["$schema"]})
+    assert not router.validate({"$schema": "https://example.com/events/ping.json"}).errors
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+import requests
+from dataformats.jsonschema.custom_types import SchemaType
+from dataformats.jsonschema.mixins.dereference_mixin import dereference
+from dataformats.jsonschema.mixins.prefetch import prefetch, remote_uris
+from dataformats.jsonschema.retrievers import HttpRetriever
+
+
+def test_remote_uris():
+    schema: SchemaType = {
+        "id": "http://localhost/root.json",
+        "definitions": {
+            "local": {"id": "local.json"},
+            "relative": {"$ref": "other.json#/definitions/a"},
+            "absolute": {"$ref": "https://example.com/absolute.json"},
+            "fragment_only": {"$ref": "#/definitions/local"},
+            "to_local_id": {"$ref": "local.json"},
+        },
+    }
+    assert remote_uris(schema) == {"http://localhost/other.json", "https://example.com/absolute.json"}
+
+
+def test_remote_uris_base_uri():
+    schema: SchemaType = {"items": {"$ref": "sibling.json"}}
+    assert remote_uris(schema) == set()
+    assert remote_uris(schema, base_uri="http://localhost/folder/root.json") == {"http://localhost/folder/sibling.json"}
+
+
+def test_prefetch_transitive_once(schema_server):
+    documents = {
+        "a.json": {"items": [{"$ref": "b.json"}, {"$ref": "c.json#/definitions/x"}]},
+        "b.json": {"items": {"$ref": "c.json#/definitions/y"}},
+        "c.json": {"definitions": {"x": {"type": "integer"}, "y": {"items": {"$ref": "a.json"}}}},
+    }
+    for name, document in documents.items():
+        (schema_server.directory / name).write_text(json.dumps(document))
+    schema: SchemaType = {"id": f"{schema_server.base_uri}/root.json", "not": {"$ref": "a.json"}}
+
+    prefetched = prefetch(schema, retriever=HttpRetriever(), max_workers=2)
+
+    assert sorted(schema_server.requested_paths) == ["/a.json", "/b.json", "/c.json"]
+    for name, document in documents.items():
+        assert prefetched.documents[f"{schema_server.base_uri}/{name}"] == document
+
+
+def test_prefetch_then_dereference(schema_server):
+    (schema_server.directory / "integer.json").write_text(json.dumps({"type": "integer"}))
+    schema: SchemaType = {"id": f"{schema_server.base_uri}/root.json", "items": {"$ref": "integer.json"}}
+
+    prefetched = prefetch(schema, retriever=HttpRetriever())
+    dereference(schema=schema, download=True, retriever=prefetched)
+
+    assert schema["items"] == {"type": "integer"}
+    assert schema_server.requested_paths == ["/integer.json"]
+
+
+def test_prefetch_failure(schema_server):
+    schema: SchemaType = {"id": f"{schema_server.base_uri}/root.json", "items": {"$ref": "missing.json"}}
+    with pytest.raises(requests.exceptions.HTTPError, match="404"):
+        prefetch(schema, retriever=HttpRetriever())
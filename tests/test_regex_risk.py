@@ -0,0 +1,130 @@
+import re
+
+import pytest
+from dataformats.jsonschema.custom_types import SchemaType
+from dataformats.jsonschema.interning import SchemaRegistry
+from dataformats.jsonschema.json_pointer import Pointer
+from dataformats.jsonschema.regex_risk import analyze_schema_patterns, harden_pattern, pattern_risks
+from dataformats.jsonschema.validator_cache import ValidatorCache
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [r"^(a+)+$", r"(\w+\s?)*$", r"^(a|aa)+$", r"(?:x|xy|y)*z", r"^([a-z0-9]+[-.]?)*@", r"(\d*)*"],
+)
+def test_risky_patterns(pattern: str):
+    assert pattern_risks(pattern)
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [r"^\d{4}-\d{2}-\d{2}$", r"^[A-Z]{3}$", r"(ab+)+", r"(ab|a)*c", r"(\w|\d)+", r"^[^@]+@[^@]+$", r"^(a++)+$"],
+)
+def test_safe_patterns(pattern: str):
+    assert not pattern_risks(pattern)
+
+
+def test_invalid_pattern():
+    assert pattern_risks("(a")[0].startswith("invalid pattern")
+
+
+@pytest.mark.parametrize(
+    "pattern, hardened",
+    [
+        (r"^(a+)+$", r"^a++$"),
+        (r"(a+)+b", r"a++b"),
+        (r"^[a-z]+é", r"^[a-z]++é"),
+        (r"^\w+é", r"^[\w]+é"),  # \w matches é, giving back characters can be needed
+        (r"^(?i)(a+)+$", r"^(?i)(a+)+$"),  # flags are not rewritten
+        (r"(x)\1+", r"(x)\1+"),
+    ],
+)
+def test_harden_pattern(pattern: str, hardened: str):
+    assert harden_pattern(pattern) == hardened
+
+
+def test_hardened_pattern_matches_the_same():
+    for pattern in (r"^(a+)+$", r"^(a*)*b?$", r"^\d+\n?$", r"^[ab]+[bc]", r"(\w*)+\s"):
+        original, hardened = re.compile(pattern), re.compile(harden_pattern(pattern))
+        for value in ("", "a", "aaab", "ab\n", "12\n", "bbc", "a b", "é "):
+            assert bool(original.search(value)) == bool(hardened.search(value)), (pattern, value)
+    assert not re.search(harden_pattern(r"^(a+)+$"), "a" * 5000 + "!")
+
+
+def test_analyze_schema_patterns():
+    schema: SchemaType = {
+        "properties": {
+            "pattern": {"pattern": "^(a+)+$"},
+            "name": {"type": "string", "pattern": r"^(\w+\s?)*$"},
+        },
+        "patternProperties": {"^(a|ab|b)+$": {}},
+        "enum": [{"pattern": "(a+)+"}],
+    }
+    risks = analyze_schema_patterns(schema)
+    assert sorted(str(risk.location) for risk in risks) == [
+        "/patternProperties/^(a|ab|b)+$",
+        "/properties/name/pattern",
+        "/properties/pattern/pattern",
+    ]
+
+    with pytest.raises(ValueError, match="catastrophic backtracking"):
+        analyze_schema_patterns(schema, reject=True)
+
+    risks = analyze_schema_patterns(schema, rewrite=True)
+    assert schema["properties"]["pattern"] == {"pattern": "^a++$"}  # type: ignore
+    assert [risk.location for risk in risks] == [
+        Pointer("patternProperties", "^(a|ab|b)+$"),
+        Pointer("properties", "name", "pattern"),
+    ]
+
+
+def test_rewrite_keeps_colliding_pattern_properties():
+    schema: SchemaType = {
+        "patternProperties": {
+            "^(a+)+$": {"type": "string", "patternProperties": {"^(b+)+$": {"pattern": "^(c+)+$"}}},
+            "^a++$": {"minLength": 1},
+        }
+    }
+    [risk] = analyze_schema_patterns(schema, rewrite=True)
+    assert risk.location == Pointer("patternProperties", "^(a+)+$")
+    assert "is already a key of the patternProperties" in risk.reasons[-1]
+    assert schema["patternProperties"] == {  # type: ignore
+        "^(a+)+$": {"type": "string", "patternProperties": {"^b++$": {"pattern": "^c++$"}}},
+        "^a++$": {"minLength": 1},
+    }
+
+
+def test_escaped_keys():
+    schema: SchemaType = {
+        "properties": {"a~1b": {"pattern": "^(a+)+$"}, "c/d~0": {"pattern": "^(b+)+$"}},
+        "patternProperties": {"^(e+)+/~$": {"patternProperties": {"^(f+)+~1$": {}}}},
+    }
+    risks = analyze_schema_patterns(schema)
+    assert sorted(str(risk.location) for risk in risks) == [
+        "/patternProperties/^(e+)+~1~0$",
+        "/patternProperties/^(e+)+~1~0$/patternProperties/^(f+)+~01$",
+        "/properties/a~01b/pattern",
+        "/properties/c~1d~00/pattern",
+    ]
+
+    assert analyze_schema_patterns(schema, rewrite=True) == []
+    assert schema == {
+        "properties": {"a~1b": {"pattern": "^a++$"}, "c/d~0": {"pattern": "^b++$"}},
+        "patternProperties": {r"^e++/\~$": {"patternProperties": {r"^f++\~1$": {}}}},
+    }
+
+
+def test_regex_risk_compile_option():
+    schema: SchemaType = {"properties": {"name": {"pattern": "^(a+)+$"}}}
+    with pytest.raises(ValueError, match="catastrophic backtracking"):
+        ValidatorCache(regex_risk="reject").get(schema)
+    with pytest.raises(ValueError, match="regex_risk should be one of"):
+        SchemaRegistry(regex_risk="ignore")  # type: ignore[arg-type]
+
+    validator = ValidatorCache(regex_risk="rewrite").get(schema)
+    assert validator["properties"]["name"]["pattern"] == "^a++$"
+    assert schema["properties"]["name"]["pattern"] == "^(a+)+$"  # type: ignore
+
+    registry = SchemaRegistry(regex_risk="rewrite")
+    assert registry.add("contract", schema)["properties"]["name"]["pattern"] == "^a++$"
+    assert not SchemaRegistry(regex_risk="warn").add("contract", {"pattern": "^(a+)+$"}).validate("a" * 10)
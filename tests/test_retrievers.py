@@ -0,0 +1,131 @@
+import json
+from pathlib import Path
+
+import pytest
+import requests
+from dataformats.jsonschema.mixins.dereference_mixin import retrieve_schema
+from dataformats.jsonschema.retrievers import (
+    FileRetriever,
+    HttpRetriever,
+    MemoryRetriever,
+    RetrievalError,
+    SchemeRetriever,
+)
+
+
+def test_memory_retriever():
+    retriever = MemoryRetriever({"http://example.com/integer.json": {"type": "integer"}})
+    assert retriever.retrieve("http://example.com/integer.json#/type") == {"type": "integer"}
+    assert "http://example.com/integer.json" in retriever
+
+
+def test_memory_retriever_returns_copies():
+    retriever = MemoryRetriever({"http://example.com/object.json": {"properties": {"a": {}}}})
+    retriever.retrieve("http://example.com/object.json")["properties"]["a"]["type"] = "string"
+    assert retriever.retrieve("http://example.com/object.json") == {"properties": {"a": {}}}
+
+
+def test_memory_retriever_unknown():
+    with pytest.raises(ValueError, match="No schema registered"):
+        MemoryRetriever().retrieve("http://example.com/unknown.json")
+
+
+def test_memory_retriever_fallback(tmp_path: Path):
+    schema_path = tmp_path / "string.json"
+    schema_path.write_text(json.dumps({"type": "string"}))
+    retriever = MemoryRetriever(fallback=FileRetriever())
+    assert retriever.retrieve(schema_path.as_uri()) == {"type": "string"}
+
+
+def test_file_retriever(tmp_path: Path):
+    schema_path = tmp_path / "integer.json"
+    schema_path.write_text(json.dumps({"type": "integer"}))
+    assert FileRetriever().retrieve(schema_path.as_uri()) == {"type": "integer"}
+
+
+def test_scheme_retriever_unsupported():
+    with pytest.raises(ValueError, match="unsupported"):
+        SchemeRetriever({"file": FileRetriever()}).retrieve("ftp://localhost/integer.json")
+
+
+def test_retrieve_schema_with_retriever():
+    retriever = MemoryRetriever({"http://example.com/integer.json": {"type": "integer"}})
+    assert retrieve_schema("http://example.com/integer.json", download=True, retriever=retriever) == {"type": "integer"}
+    assert retrieve_schema("http://example.com/integer.json", download=False, retriever=retriever) == {}
+
+
+def test_http_retriever(schema_server):
+    (schema_server.directory / "integer.json").write_text(json.dumps({"type": "integer"}))
+    retriever = HttpRetriever()
+    assert retriever.retrieve(f"{schema_server.base_uri}/integer.json") == {"type": "integer"}
+
+
+def test_http_retriever_not_found(schema_server):
+    with pytest.raises(requests.exceptions.HTTPError, match="404"):
+        HttpRetriever().retrieve(f"{schema_server.base_uri}/nonexisting.json")
+
+
+def test_http_retriever_conditional_request(schema_server, tmp_path: Path):
+    (schema_server.directory / "integer.json").write_text(json.dumps({"type": "integer"}))
+    uri = f"{schema_server.base_uri}/integer.json"
+
+    HttpRetriever(cache_dir=tmp_path / "cache").retrieve(uri)
+    # only the disk cache is shared, without cache-control the document is stale and has to be revalidated
+    assert HttpRetriever(cache_dir=tmp_path / "cache").retrieve(uri) == {"type": "integer"}
+    assert schema_server.requested_paths == ["/integer.json", "/integer.json"]
+    assert schema_server.not_modified_paths == ["/integer.json"]
+
+
+def test_http_retriever_fresh_cache(schema_server, tmp_path: Path):
+    schema_server.RequestHandlerClass.cache_control = "max-age=60"
+    (schema_server.directory / "integer.json").write_text(json.dumps({"type": "integer"}))
+    uri = f"{schema_server.base_uri}/integer.json"
+
+    HttpRetriever(cache_dir=tmp_path / "cache").retrieve(uri)
+    assert HttpRetriever(cache_dir=tmp_path / "cache").retrieve(uri) == {"type": "integer"}
+    assert schema_server.requested_paths == ["/integer.json"]
+
+
+def test_http_retriever_not_modified(schema_server):
+    (schema_server.directory / "integer.json").write_text(json.dumps({"type": "integer"}))
+    uri = f"{schema_server.base_uri}/integer.json"
+    retriever = HttpRetriever()
+    first = retriever.retrieve(uri)
+    first["type"] = "changed by dereferencing"
+    assert retriever.retrieve(uri) == {"type": "integer"}
+    assert schema_server.requested_paths == ["/integer.json", "/integer.json"]
+
+
+def test_http_retriever_no_store(schema_server, tmp_path: Path):
+    schema_server.RequestHandlerClass.cache_control = "no-store"
+    (schema_server.directory / "integer.json").write_text(json.dumps({"type": "integer"}))
+    retriever = HttpRetriever(cache_dir=tmp_path / "cache")
+    uri = f"{schema_server.base_uri}/integer.json"
+    assert retriever.retrieve(uri) == retriever.retrieve(uri) == {"type": "integer"}
+    assert not list((tmp_path / "cache").glob("*.json"))
+    # not kept in memory either, so the second request is not a conditional one
+    assert schema_server.requested_paths == ["/integer.json", "/integer.json"]
+    assert not schema_server.not_modified_paths
+
+
+def test_http_retriever_evicts_least_recently_used(schema_server):
+    for name in ["a", "b"]:
+        (schema_server.directory / f"{name}.json").write_text(json.dumps({"type": "integer"}))
+    retriever = HttpRetriever(max_entries=1)
+    for name in ["a", "a", "b", "a"]:
+        retriever.retrieve(f"{schema_server.base_uri}/{name}.json")
+    assert schema_server.not_modified_paths == ["/a.json"]
+    assert list(retriever._entries) == [f"{schema_server.base_uri}/a.json"]
+
+
+def test_http_retriever_not_modified_without_cached_copy():
+    response = requests.Response()
+    response.status_code = 304
+
+    class NotModifiedSession:
+        def get(self, uri, headers, timeout):
+            return response
+
+    retriever = HttpRetriever(session=NotModifiedSession())  # type: ignore[arg-type]
+    with pytest.raises(RetrievalError, match="without a cached copy"):
+        retriever.retrieve("http://localhost/integer.json")
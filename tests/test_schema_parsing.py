@@ -7,6 +7,7 @@ from dataformats.jsonschema.mixins.schema_parsing import (
     find_schemas,
     flatten_json,
     is_absolute,
+    join_relative_id,
     normalize,
     ref_map,
 )
@@ -75,6 +76,18 @@ def test_is_absolute():
     assert not is_absolute("../sibling.json#/defintions/a")
 
 
+def test_normalize_memoized():
+    uri = "HTTPs://www.ugLy.com/memoized.json"
+    normalize(uri)
+    hits = normalize.cache_info().hits
+    assert normalize(uri) == "https://www.ugly.com/memoized.json"
+    assert normalize.cache_info().hits == hits + 1
+
+
+def test_join_relative_id():
+    assert join_relative_id("https://nested.com/parent.json#fragment", "child.json") == "https://nested.com/child.json"
+
+
 def test_absolute_id_map():
     schema = {
         "id": "https://schemstore.com/schemas/example.json",
@@ -0,0 +1,174 @@
+from typing import Callable
+
+import pytest
+from dataformats.jsonschema.budget import ValidationBudget
+from dataformats.jsonschema.interning import SchemaRegistry
+from dataformats.jsonschema.mixins.validations_mixin import Draft4Validator, flatten_errors
+from dataformats.jsonschema.starlette_validation import (
+    RequestValidationMiddleware,
+    ResponseValidationMiddleware,
+    ResponseViolation,
+    RouteSchemas,
+    params_instance,
+)
+from dataformats.jsonschema.transforms import validate_coerced
+from starlette.applications import Starlette
+from starlette.datastructures import QueryParams
+from starlette.middleware import Middleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+ITEM_SCHEMA = {
+    "type": "object",
+    "required": ["name"],
+    "properties": {"name": {"type": "string"}, "tags": {"items": {"type": "string"}}},
+}
+
+
+async def create_item(request: Request):
+    body = await request.json()
+    assert body == request.state.validated_body
+    return JSONResponse(body, status_code=201)
+
+
+async def list_items(request: Request):
+    return JSONResponse([])
+
+
+def make_app(**options) -> Starlette:
+    routes = [Route("/items", create_item, methods=["POST"]), Route("/items", list_items, methods=["GET"])]
+    schemas = {"POST /items": ITEM_SCHEMA, "PUT /items/{item_id:int}": ITEM_SCHEMA}
+    return Starlette(routes=routes, middleware=[Middleware(RequestValidationMiddleware, schemas=schemas, **options)])
+
+
+def test_route_schemas():
+    registry = SchemaRegistry()
+    routes = RouteSchemas({"POST /items/{item_id:int}": {"type": "object"}, "/other": {}}, registry)
+    route, validator = routes.match("POST", "/items/3")  # type: ignore[misc]
+    assert route == "POST /items/{item_id:int}" and registry["request POST /items/{item_id:int}"] is validator.validator
+    assert routes.match("GET", "/items/3") is None and routes.match("POST", "/items/x") is None
+    assert routes.match("DELETE", "/other") is not None
+    with pytest.raises(ValueError, match="METHOD /path"):
+        RouteSchemas({"POST items": {}})
+
+
+def test_route_schemas_regex_risk():
+    schemas = {"POST /items": {"properties": {"name": {"pattern": "^(a+)+$"}}}}
+    with pytest.raises(ValueError, match="catastrophic backtracking"):
+        RouteSchemas(schemas, regex_risk="reject")
+    with pytest.raises(ValueError, match="configure it on the registry"):
+        RouteSchemas(schemas, SchemaRegistry(), regex_risk="reject")
+    with pytest.raises(ValueError, match="catastrophic backtracking"):
+        RequestValidationMiddleware(list_items, schemas, regex_risk="reject")
+
+
+def test_valid_request():
+    with TestClient(make_app()) as client:
+        response = client.post("/items", json={"name": "a", "tags": ["b"]})
+        assert response.status_code == 201 and response.json() == {"name": "a", "tags": ["b"]}
+        assert client.get("/items").status_code == 200
+
+
+def test_invalid_request():
+    with TestClient(make_app()) as client:
+        response = client.post("/items", json={"name": "a", "tags": [1]})
+        assert response.status_code == 422
+        error = {"location": "/tags/0", "message": "Type of value 1 is not one of ['string']"}
+        assert response.json()["errors"] == [error]
+
+        response = client.post("/items", content=b"{", headers={"content-type": "application/json"})
+        assert response.status_code == 400 and response.json()["detail"] == "Request body is not valid json"
+
+        assert client.post("/items", content=b"name=a").status_code == 415
+
+
+def test_body_limits():
+    with TestClient(make_app(max_body_size=30, budget=ValidationBudget(max_nodes=2))) as client:
+        assert client.post("/items", json={"name": "a" * 30}).status_code == 413
+        response = client.post("/items", json={"name": "a", "tags": ["b"]})
+        assert response.status_code == 422 and "maximum of 2 nodes" in response.json()["errors"][0]["message"]
+
+
+def test_large_body_in_threadpool(monkeypatch: pytest.MonkeyPatch):
+    calls = []
+
+    async def fake_run_in_threadpool(function, *args):
+        calls.append(function)
+        return function(*args)
+
+    monkeypatch.setattr("dataformats.jsonschema.starlette_validation.run_in_threadpool", fake_run_in_threadpool)
+    with TestClient(make_app(threadpool_threshold=100)) as client:
+        assert client.post("/items", json={"name": "a"}).status_code == 201
+        assert not calls
+        assert client.post("/items", json={"name": "a", "tags": ["b" * 100]}).status_code == 201
+        assert len(calls) == 1
+
+
+def make_response_app(on_violation: Callable, **options) -> Starlette:
+    async def get_item(request: Request):
+        return JSONResponse({"name": request.path_params["name"], "tags": [1]})
+
+    routes = [Route("/items", list_items), Route("/items/{name}", get_item)]
+    schemas = {"GET /items": {"type": "object"}, "GET /items/{name}": ITEM_SCHEMA}
+    middleware = Middleware(ResponseValidationMiddleware, schemas=schemas, on_violation=on_violation, **options)
+    return Starlette(routes=routes, middleware=[middleware])
+
+
+def test_response_violations():
+    violations: list[ResponseViolation] = []
+    with TestClient(make_response_app(violations.append, sample_rate=1)) as client:
+        assert client.get("/items/a").json() == {"name": "a", "tags": [1]}
+        assert client.get("/items").status_code == 200
+    assert [violation[:4] for violation in violations] == [
+        ("GET /items/{name}", "GET", "/items/a", 200),
+        ("GET /items", "GET", "/items", 200),
+    ]
+    assert violations[0].errors == [{"location": "/tags/0", "message": "Type of value 1 is not one of ['string']"}]
+
+
+def test_response_sample_rates():
+    violations: list[ResponseViolation] = []
+    app = make_response_app(violations.append, sample_rate=0, route_sample_rates={"GET /items": 1})
+    with TestClient(app) as client:
+        client.get("/items/a")
+        client.get("/items")
+    assert [violation.route for violation in violations] == ["GET /items"]
+
+    with pytest.raises(ValueError, match="between 0 and 1"):
+        ResponseValidationMiddleware(list_items, {}, violations.append, sample_rate=2)
+    with pytest.raises(ValueError, match="has no schema"):
+        ResponseValidationMiddleware(list_items, {}, violations.append, route_sample_rates={"GET /other": 1})
+
+
+def test_async_violation_callback():
+    violations: list[ResponseViolation] = []
+
+    async def report(violation: ResponseViolation):
+        violations.append(violation)
+        raise RuntimeError("reporting is down")
+
+    with TestClient(make_response_app(report, sample_rate=1)) as client:
+        assert client.get("/items/a").status_code == 200
+    assert len(violations) == 1
+
+
+def test_query_params():
+    schema = {
+        "properties": {
+            "page": {"type": "integer", "minimum": 1},
+            "ids": {"type": "array", "items": {"type": "integer"}},
+            "exact": {"type": "boolean"},
+            "q": {"type": "string"},
+        }
+    }
+    params = QueryParams("page=2&ids=3&ids=4&exact=true&q=5")
+    instance = params_instance(params.multi_items())
+    assert instance == {"page": "2", "ids": ["3", "4"], "exact": "true", "q": "5"}
+    coerced, errors = validate_coerced(instance, Draft4Validator(**schema))
+    assert not errors and coerced == {"page": 2, "ids": [3, 4], "exact": True, "q": "5"}
+
+    instance = params_instance(QueryParams("ids=3&page=0").multi_items())
+    coerced, errors = validate_coerced(instance, Draft4Validator(**schema))
+    assert coerced == {"ids": [3], "page": 0} and [location for location, _ in flatten_errors(errors)] == ["/page"]
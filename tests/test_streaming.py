@@ -0,0 +1,143 @@
+import json
+
+import pytest
+from dataformats.jsonschema.budget import ValidationBudget, ValidationBudgetExceeded
+from dataformats.jsonschema.json_pointer import Pointer
+from dataformats.jsonschema import streaming
+from dataformats.jsonschema.mixins.validations_mixin import Draft4Validator
+from dataformats.jsonschema.streaming import (
+    JsonSyntaxError,
+    StreamingValidator,
+    StreamValidationError,
+    decode_validated,
+    validate_file,
+)
+
+SCHEMA = {
+    "type": "object",
+    "additionalProperties": False,
+    "properties": {
+        "name": {"type": "string", "maxLength": 5},
+        "items": {"type": "array", "maxItems": 2, "items": {"allOf": [{"type": "integer"}, {"minimum": 0}]}},
+        "pair": {"items": [{"type": "string"}], "additionalItems": False},
+        "choice": {"oneOf": [{"type": "integer"}, {"minimum": 2}]},
+    },
+}
+
+
+@pytest.mark.parametrize(
+    "document",
+    [
+        b'{"name": "abc", "items": [1, 2], "pair": ["x"], "choice": 1}',
+        b"{}",
+        b' {"name" : "\\u00e9\\n" } ',
+        memoryview(b'{"items": []}'),
+    ],
+)
+def test_decode_valid(document):
+    assert decode_validated(document, Draft4Validator(**SCHEMA)) == json.loads(bytes(document))
+
+
+@pytest.mark.parametrize(
+    "document, pointer, offset, message",
+    [
+        (b"[1]", "", 0, r"Type of value is array, not one of \['object'\]"),
+        (b'{"other": 1}', "/other", 1, "Property other is not allowed"),
+        (b'{"name": "abcdef"}', "/name", 9, "Value is too long"),
+        (b'{"items": [1, 2, 3]}', "/items", 17, "Array has more than 2 items"),
+        (b'{"items": [1, -1]}', "/items/1", 14, "Value is smaller than the minimum"),
+        (b'{"pair": ["x", "y"]}', "/pair/1", 15, "more than the 1 items of the schema"),
+        (b'{"choice": 3}', "/choice", 11, "multiple schemas matched"),
+    ],
+)
+def test_decode_invalid(document: bytes, pointer: str, offset: int, message: str):
+    with pytest.raises(StreamValidationError, match=message) as exc_info:
+        decode_validated(document, Draft4Validator(**SCHEMA))
+    assert exc_info.value.pointer == Pointer.from_string(pointer)
+    assert exc_info.value.offset == offset
+    assert list(exc_info.value.errors) == [pointer]
+
+
+def test_rejects_before_decoding_the_rest():
+    # the rest of the document is not even valid json, it is never read
+    document = b'{"items": [1, 2, 3, ' + b"x" * 10_000
+    with pytest.raises(StreamValidationError, match="more than 2 items"):
+        decode_validated(document, Draft4Validator(**SCHEMA))
+
+
+def test_rejects_oversize_strings_before_decoding(monkeypatch: pytest.MonkeyPatch):
+    decoded = []
+    decode_string = streaming.decode_string
+    monkeypatch.setattr(
+        streaming, "decode_string", lambda data, *span: decoded.append(span) or decode_string(data, *span)
+    )
+    validator = Draft4Validator(**SCHEMA)
+    for document in [b'{"name": "' + "\u00e9".encode() * 6 + b'"}', b'{"name": "' + b"x" * 10_000_000 + b'"}']:
+        with pytest.raises(StreamValidationError, match="more than 5 characters") as exc_info:
+            decode_validated(document, validator)
+        assert str(exc_info.value.pointer) == "/name"
+    assert decoded == [(1, 7), (1, 7)]  # only the property names
+
+    # the length of strings with escapes is only known once they are decoded
+    monkeypatch.undo()
+    with pytest.raises(StreamValidationError, match="Value is too long"):
+        decode_validated(b'{"name": "\\u00e9\\u00e9\\u00e9\\u00e9\\u00e9\\u00e9"}', validator)
+    assert decode_validated('{"name": "ééééé"}'.encode(), validator) == {"name": "ééééé"}
+
+
+@pytest.mark.parametrize("document", [b"", b"[1,]", b'{"a" 1}', b"01", b"[1] 2", b'"\\x"', b"tru", b'"\x01"'])
+def test_syntax_errors(document: bytes):
+    with pytest.raises(JsonSyntaxError):
+        decode_validated(document, Draft4Validator())
+
+
+def test_node_sets_are_shared():
+    validator = StreamingValidator(Draft4Validator(**{"items": {"properties": {"a": {"type": "integer"}}}}))
+    validator.decode(b'[{"a": 1}, {"a": 2}, {"a": 3}]')
+    item_nodes, _ = validator.item_nodes(validator.root, 0)
+    assert validator.item_nodes(validator.root, 5)[0] is item_nodes
+    assert len(item_nodes.children) == 1
+
+
+def test_budget():
+    validator = StreamingValidator(Draft4Validator(**{"items": {"pattern": "^a+$"}}))
+    with pytest.raises(ValidationBudgetExceeded, match="maximum depth of 1"):
+        validator.decode(b"[[[]]]", ValidationBudget(max_instance_depth=1))
+    with pytest.raises(ValidationBudgetExceeded) as exc_info:
+        validator.decode(b'["aaaaaaaaaaa"]', ValidationBudget(max_pattern_input_length=10))
+    assert exc_info.value.limit == "max_pattern_input_length"
+    assert validator.decode(b'["aaaaaaaaaaa"]') == ["aaaaaaaaaaa"]
+
+
+def test_validate_file(tmp_path):
+    path = tmp_path / "export.json"
+    path.write_text('[{"name": "a"},\n {"name": "abcdef"},\n {"other": 1}, {"name": 2}]')
+    errors = validate_file(path, Draft4Validator(**{"items": SCHEMA}))
+    locations = [(str(error.pointer), error.offset) for error in errors]
+    assert locations == [("/1/name", 26), ("/2/other", 39), ("/3/name", 61)]
+    assert len(validate_file(path, Draft4Validator(**{"items": SCHEMA}), max_errors=2)) == 2
+
+    path.write_text('[{"name": "a"}, {"items": [1]}]')
+    assert validate_file(path, Draft4Validator(**{"items": SCHEMA})) == []
+
+
+def test_validate_file_keeps_only_checked_values(tmp_path):
+    path = tmp_path / "export.json"
+    path.write_text('[{"tags": ["a", "b"], "id": 1}, {"tags": ["a", "a"]}]')
+    schema = {"minItems": 1, "items": {"required": ["id"], "properties": {"tags": {"uniqueItems": True}}}}
+    validator = StreamingValidator(Draft4Validator(**schema))
+    errors = validator.validate_file(path)
+    assert [str(error.pointer) for error in errors] == ["/1/tags", "/1"]
+
+    # only the keys of the items and the length of the root are kept, the values of tags are needed for uniqueItems
+    item_nodes, _ = validator.item_nodes(validator.root, 0)
+    tags_nodes, _ = validator.property_nodes(item_nodes, "tags")
+    assert not validator.needs_value(validator.root, "array") and not validator.needs_value(item_nodes, "object")
+    assert validator.needs_value(tags_nodes, "array")
+
+
+def test_validate_empty_file(tmp_path):
+    path = tmp_path / "empty.json"
+    path.write_bytes(b"")
+    with pytest.raises(JsonSyntaxError):
+        validate_file(path, Draft4Validator())
@@ -0,0 +1,121 @@
+import pytest
+from dataformats.jsonschema.mixins.validations_mixin import Draft4Validator
+from dataformats.jsonschema.transforms import (
+    TransformingValidator,
+    coerce_string,
+    validate_coerced,
+    validate_projection,
+    validate_with_defaults,
+)
+
+ITEM = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "quantity": {"type": "integer", "default": 1},
+        "tags": {"type": "array", "items": {"type": "string"}, "default": []},
+    },
+    "allOf": [{"properties": {"unit": {"default": "piece"}}}],
+    "anyOf": [{"properties": {"ignored": {"default": True}}}],
+}
+SCHEMA = {"type": "object", "properties": {"items": {"type": "array", "items": ITEM}, "note": {"type": "string"}}}
+
+
+def test_fill_defaults():
+    instance = {"items": [{"name": "a", "quantity": 2, "tags": [], "unit": "kg"}, {"name": "b"}], "note": "n"}
+    filled, errors = validate_with_defaults(instance, Draft4Validator(**SCHEMA))
+    assert not errors
+    assert filled == {
+        "items": [
+            {"name": "a", "quantity": 2, "tags": [], "unit": "kg"},
+            {"name": "b", "quantity": 1, "tags": [], "unit": "piece"},
+        ],
+        "note": "n",
+    }
+    # the instance is not modified, unchanged values are shared
+    assert instance["items"][1] == {"name": "b"}
+    assert filled["items"] is not instance["items"] and filled["items"][0] is instance["items"][0]
+    # defaults are copied
+    assert filled["items"][1]["tags"] is not ITEM["properties"]["tags"]["default"]  # type: ignore[index]
+
+
+def test_unchanged_instances_are_shared():
+    validator = TransformingValidator(Draft4Validator(**SCHEMA))
+    instance = {"items": [{"name": "a", "quantity": 2, "tags": [], "unit": "kg"}], "note": "n"}
+    assert validator.validate(instance) == (instance, {})
+    assert validator.validate(instance)[0] is instance
+    assert validator.changing_transform(validator.validator.subvalidator(SCHEMA["properties"]["note"])) is None
+
+
+def test_errors_are_those_of_the_instance():
+    validator = Draft4Validator(**SCHEMA)
+    instance = {"items": [{"name": 1}, {"name": "b"}]}
+    filled, errors = validate_with_defaults(instance, validator)
+    assert str(errors) == str(validator.validate(instance))
+    assert filled["items"][1] == {"name": "b", "quantity": 1, "tags": [], "unit": "piece"}
+
+
+def test_strip_undeclared():
+    schema = {
+        "type": "object",
+        "properties": {"name": {"type": "string"}, "owner": {"properties": {"id": {}}}, "labels": {"type": "object"}},
+        "patternProperties": {"^x-": {"type": "string"}},
+        "allOf": [{"properties": {"version": {"type": "integer"}}}],
+    }
+    instance = {
+        "name": "a",
+        "secret": "s",
+        "x-trace": "t",
+        "version": 1,
+        "owner": {"id": 1, "email": "e"},
+        "labels": {"free": "form"},
+    }
+    projection, errors = validate_projection(instance, Draft4Validator(**schema))
+    assert not errors
+    assert projection == {"name": "a", "x-trace": "t", "version": 1, "owner": {"id": 1}, "labels": {"free": "form"}}
+    assert projection["labels"] is instance["labels"] and instance["owner"] == {"id": 1, "email": "e"}
+
+    declared = {"name": "a", "labels": {}}
+    assert validate_projection(declared, Draft4Validator(**schema))[0] is declared
+
+
+def test_defaults_and_projection():
+    validator = TransformingValidator(Draft4Validator(**SCHEMA), strip_undeclared=True)
+    filled, errors = validator.validate({"items": [{"name": "a", "color": "red"}], "other": 1})
+    assert not errors
+    assert filled == {"items": [{"name": "a", "quantity": 1, "tags": [], "unit": "piece"}]}
+
+
+@pytest.mark.parametrize(
+    "value, types, coerced",
+    [
+        ("12", ("integer",), 12),
+        ("-1.5e3", ("integer", "number"), -1500.0),
+        ("7", ("number",), 7),
+        ("1.5", ("integer",), "1.5"),
+        ("nan", ("number",), "nan"),
+        ("true", ("boolean",), True),
+        ("True", ("boolean",), "True"),
+        ("x", ("boolean", "array"), ["x"]),
+    ],
+)
+def test_coerce_string(value, types, coerced):
+    assert coerce_string(value, types) == coerced and type(coerce_string(value, types)) is type(coerced)
+
+
+def test_coerce_strings():
+    schema = {
+        "type": "object",
+        "properties": {
+            "limit": {"allOf": [{"type": "integer"}, {"maximum": 10}]},
+            "name": {"type": ["string", "integer"]},
+            "either": {"anyOf": [{"type": "integer"}, {"type": "boolean"}]},
+        },
+    }
+    instance = {"limit": "5", "name": "5", "either": "5"}
+    coerced, errors = validate_coerced(instance, Draft4Validator(**schema))
+    # applicators other than allOf do not coerce, they may not apply
+    assert coerced == {"limit": 5, "name": "5", "either": "5"} and errors
+    limit = Draft4Validator(**schema["properties"]["limit"])
+    coerced, errors = validate_coerced("11", limit)
+    assert coerced == 11 and errors and str(errors) == str(limit.validate(11))
@@ -1,6 +1,8 @@
 import pytest
 import requests
-from dataformats.jsonschema.mixins.validations_mixin import Draft4Validator
+from dataformats.jsonschema.budget import ValidationBudget, ValidationBudgetExceeded
+from dataformats.jsonschema.json_pointer import Pointer
+from dataformats.jsonschema.mixins.validations_mixin import Draft4Validator, ValidationDepthError
 
 
 def test_testclient():
@@ -45,3 +47,106 @@ def test_validate_WIP(patch_requests_to_localhost_remotes_server):
 
 def test_repr():
     repr(Draft4Validator("", ))
+
+
+def test_location_is_lazy(monkeypatch: pytest.MonkeyPatch):
+    materialized = []
+    monkeypatch.setattr(
+        "dataformats.jsonschema.mixins.validations_mixin.materialize", lambda location: materialized.append(location)
+    )
+    validator = Draft4Validator(**{"properties": {"a": {"items": {"type": "integer"}}}})
+    assert not validator.validate({"a": [1, 2, 3]})
+    assert not materialized
+
+
+def test_location_on_error():
+    validator = Draft4Validator(**{"properties": {"a": {"items": {"type": "integer"}}}})
+    errors = validator.validate({"a": [1, "x"]})
+    assert list(errors["non lazy"][0].errors) == ["/a"]
+    child = Draft4Validator(((Pointer("a"), "items"), "1"), type="integer")
+    assert child.pointer == Pointer("a", "items", "1")
+
+
+def test_subvalidators_are_compiled_once():
+    validator = Draft4Validator(**{"properties": {"a": {"items": {"type": "integer"}}}})
+    validator.validate({"a": [1, 2]})
+    child = validator.subvalidator(validator["properties"]["a"])
+    assert validator.subvalidator(validator["properties"]["a"]) is child
+    assert list(validator.validate({"a": ["x"]})["non lazy"][0].errors) == ["/a"]
+
+
+def test_compact_node():
+    validator = Draft4Validator(**{"type": "integer", "maximum": 3})
+    assert not hasattr(validator, "__dict__")
+    assert dict(validator) == {"type": "integer", "maximum": 3}
+    assert "minimum" not in validator and validator.get("minimum") is None
+    with pytest.raises(KeyError):
+        validator["minimum"]
+
+
+def test_checks_bound_at_compile_time():
+    validator = Draft4Validator(**{"type": "integer", "maximum": 3, "title": "small"})
+    assert [check.__name__ for check, _ in validator._plan.any] == ["check_type"]
+    assert [check.__name__ for check, _ in validator._plan.number] == ["check_maximum"]
+    assert not validator._plan.object and not validator._plan.string
+    assert Draft4Validator(maximum=5, type="number", title="other")._plan is validator._plan
+    assert validator.validate(4) and not validator.validate(2)
+
+
+def nested_lists(depth: int) -> list:
+    instance: list = []
+    for _ in range(depth):
+        instance = [instance]
+    return instance
+
+
+def test_deep_instance():
+    tree: dict = {"type": "array"}
+    tree["items"] = tree
+    validator = Draft4Validator(**tree)
+    assert not validator.validate(nested_lists(5000))
+    assert validator.validate([[[1]]])
+
+
+def test_max_depth():
+    tree: dict = {"type": "array"}
+    tree["items"] = tree
+    validator = Draft4Validator(**tree)
+    assert not validator.validate(nested_lists(50), max_depth=51)
+    with pytest.raises(ValidationDepthError, match="maximum depth of 50 at /0/0/0"):
+        validator.validate(nested_lists(50), max_depth=50)
+
+
+def test_budget_max_nodes():
+    validator = Draft4Validator(**{"items": {"anyOf": [{"type": "string"}, {"type": "integer"}]}})
+    assert not validator.validate([1, 2], budget=ValidationBudget(max_nodes=7))
+    with pytest.raises(ValidationBudgetExceeded, match="maximum of 7 nodes") as exc_info:
+        validator.validate([1, 2, 3], budget=ValidationBudget(max_nodes=7))
+    assert exc_info.value.limit == "max_nodes"
+
+
+def test_budget_max_instance_depth():
+    validator = Draft4Validator(**{"items": {"allOf": [{"items": {"not": {"type": "string"}}}]}})
+    assert not validator.validate([[1]], budget=ValidationBudget(max_instance_depth=2))
+    with pytest.raises(ValidationBudgetExceeded, match="maximum depth of 1 at /0/allOf/0/0"):
+        validator.validate([[1]], budget=ValidationBudget(max_instance_depth=1))
+
+
+def test_budget_pattern_input_length():
+    validator = Draft4Validator(**{"pattern": "^(a+)+$", "patternProperties": {"^x": {}}})
+    budget = ValidationBudget(max_pattern_input_length=10)
+    assert not validator.validate("aaa", budget=budget)
+    with pytest.raises(ValidationBudgetExceeded) as exc_info:
+        validator.validate("a" * 50 + "!", budget=budget)
+    assert exc_info.value.limit == "max_pattern_input_length"
+    with pytest.raises(ValidationBudgetExceeded):
+        validator.validate({"x" * 11: 1}, budget=budget)
+    assert validator.validate("a" * 11 + "!")  # no limit without a budget
+
+
+def test_budget_timeout():
+    validator = Draft4Validator(**{"items": {"type": "integer"}})
+    with pytest.raises(ValidationBudgetExceeded, match="timeout"):
+        validator.validate([1, 2], budget=ValidationBudget(timeout=-1))
+    assert not validator.validate([1, 2], budget=ValidationBudget(timeout=10))
+    assert issubclass(ValidationDepthError, ValidationBudgetExceeded)
@@ -0,0 +1,64 @@
+from dataformats.jsonschema.custom_types import SchemaType
+from dataformats.jsonschema.validator_cache import ValidatorCache, get_validator, validator_cache
+
+
+def test_cache_by_content():
+    cache = ValidatorCache()
+    validator = cache.get({"type": "integer", "minimum": 1})
+    assert cache.get({"minimum": 1, "type": "integer"}) is validator
+    assert cache.get({"type": "integer"}) is not validator
+    assert cache.cache_info()[:4] == (1, 2, 0, 2)
+
+
+def test_cache_by_absolute_id():
+    cache = ValidatorCache()
+    validator = cache.get({"id": "http://localhost/tenant.json", "type": "integer"})
+    assert cache.get({"id": "http://localhost/tenant.json", "type": "string"}) is validator
+    assert cache.key({"id": "relative.json"}) != "relative.json"
+
+
+def test_lru_eviction():
+    cache = ValidatorCache(max_entries=2)
+    first: SchemaType = {"type": "integer"}
+    validator = cache.get(first)
+    cache.get({"type": "string"})
+    cache.get(first)  # most recently used now
+    cache.get({"type": "array"})
+
+    assert first in cache and {"type": "string"} not in cache
+    assert cache.get(first) is validator
+    assert cache.evictions == 1
+
+
+def test_byte_limit():
+    cache = ValidatorCache(max_bytes=40)
+    cache.get({"type": "integer"})  # 18 bytes
+    cache.get({"type": "string"})  # 17 bytes
+    assert cache.cache_info().bytes == 35
+    cache.get({"type": "boolean"})
+    assert len(cache) == 2 and cache.cache_info().bytes == 35
+
+    too_large: SchemaType = {"enum": list(range(100))}
+    assert not cache.get(too_large).validate(1)
+    assert too_large not in cache
+
+
+def test_invalidate():
+    cache = ValidatorCache()
+    schema: SchemaType = {"id": "http://localhost/tenant.json", "type": "integer"}
+    validator = cache.get(schema)
+    cache.get({"type": "string"})
+
+    cache.invalidate("http://localhost/tenant.json")
+    assert schema not in cache
+    assert cache.get(schema) is not validator
+
+    cache.invalidate()
+    assert len(cache) == 0 and cache.cache_info().bytes == 0
+
+
+def test_process_wide_cache():
+    schema: SchemaType = {"type": "object", "required": ["test_process_wide_cache"]}
+    assert get_validator(schema) is get_validator(schema)
+    assert schema in validator_cache
+    validator_cache.invalidate(schema)